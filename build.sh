@@ -3,4 +3,5 @@ set -o errexit
 
 pip install -r requirements.txt
 python manage.py migrate
+python manage.py rebuild_tour_cards
 python manage.py collectstatic --no-input
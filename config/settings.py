@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 from pathlib import Path
 import os
 import dj_database_url
+from corsheaders.defaults import default_headers
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -46,10 +47,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'tours.middleware.RequestMetricsMiddleware',
+    'tours.middleware.ReadOnlyRequestMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'tours.middleware.AsyncWhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    'tours.middleware.RateLimitMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -88,14 +92,126 @@ if os.environ.get('DATABASE_URL'):
             conn_health_checks=True,
         )
     }
+    # Реплики только для чтения: DATABASE_REPLICA_URLS через запятую.
+    # Алиасы replica1, replica2, ... получают чтения GET-запросов
+    # (tours/routers.py); в тестах они - зеркала default
+    replica_urls = os.environ.get('DATABASE_REPLICA_URLS', '').split(',')
+    for number, url in enumerate(filter(None, map(str.strip, replica_urls)), 1):
+        DATABASES[f'replica{number}'] = {
+            **dj_database_url.parse(url, conn_max_age=600, conn_health_checks=True),
+            'TEST': {'MIRROR': 'default'},
+        }
 else:
     DATABASES = {
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
-            'NAME': BASE_DIR / 'db.sqlite3',
+            'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
         }
     }
 
+# Профиль SQLite для продакшена (SQLITE_TUNED=False - настройки Django по
+# умолчанию, для сравнения в manage.py bench_sqlite). WAL: читатели не ждут
+# писателя; synchronous=NORMAL в WAL не портит базу при сбое, а теряет
+# только последние транзакции при отключении питания. IMMEDIATE: запись
+# сразу берет блокировку и ждет ее timeout секунд, а не падает с
+# "database is locked" при попытке повысить блокировку чтения
+SQLITE_TUNED = os.environ.get('SQLITE_TUNED', 'True') == 'True'
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,  # в КиБ
+    'temp_store': 'MEMORY',
+}
+# Режим WAL записывается в заголовок файла, и db.sqlite3 из репозитория
+# после любого manage.py стал бы измененным. Поэтому для него WAL включается
+# только явно (SQLITE_WAL=True, как в render.yaml), для других файлов - всегда
+SQLITE_WAL = os.environ.get(
+    'SQLITE_WAL', str(Path(DATABASES['default']['NAME']) != BASE_DIR / 'db.sqlite3')
+) == 'True'
+if not SQLITE_WAL:
+    del SQLITE_PRAGMAS['journal_mode']
+
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3' and SQLITE_TUNED:
+    DATABASES['default']['OPTIONS'] = {
+        'timeout': 5,
+        'transaction_mode': 'IMMEDIATE',
+        'init_command': ';'.join(
+            f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()
+        ),
+    }
+    # Отдельные соединения только для чтения: GET не занимает соединение
+    # писателя и не может ничего записать. Режим журнала задает писатель
+    DATABASES['readonly'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': DATABASES['default']['NAME'],
+        'OPTIONS': {
+            'timeout': 5,
+            'init_command': ';'.join([
+                *(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()
+                  if name != 'journal_mode'),
+                'PRAGMA query_only=ON',
+            ]),
+        },
+        'TEST': {'MIRROR': 'default'},
+    }
+
+# Алиасы баз для чтения в GET-запросах (tours/routers.py)
+READ_DATABASES = [alias for alias in DATABASES if alias != 'default']
+# Сколько секунд после записи клиент читает из default: больше отставания
+# реплик. Соединения SQLite видят коммит сразу, им окно не нужно
+READ_YOUR_WRITES_SECONDS = int(os.environ.get(
+    'READ_YOUR_WRITES_SECONDS', 5 if os.environ.get('DATABASE_REPLICA_URLS') else 0
+))
+DATABASE_ROUTERS = ['tours.routers.ReadRouter']
+
+
+# Cache
+# Файловый кэш общий для всех воркеров gunicorn на одной машине,
+# при наличии REDIS_URL используется Redis
+
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('CACHE_LOCATION', BASE_DIR / '.cache'),
+            'OPTIONS': {
+                'MAX_ENTRIES': 10000,
+            },
+        }
+    }
+
+# Время жизни закэшированных ответов API (секунды), 0 - кэш выключен
+RESPONSE_CACHE_TIMEOUT = int(os.environ.get('RESPONSE_CACHE_TIMEOUT', 600))
+
+# Асинхронные вьюхи для чтения API (tours/async_views.py) - включать
+# при запуске под ASGI: gunicorn config.asgi -k uvicorn.workers.UvicornWorker
+ASYNC_READ_API = os.environ.get('ASYNC_READ_API', 'False') == 'True'
+
+# Метрики запросов в заголовке Server-Timing (tours/middleware.py) и журнал
+# запросов дольше SLOW_REQUEST_MS с SLOW_REQUEST_TOP_SQL самыми дорогими SQL
+REQUEST_METRICS = os.environ.get('REQUEST_METRICS', 'True') == 'True'
+SLOW_REQUEST_MS = int(os.environ.get('SLOW_REQUEST_MS', 500))
+SLOW_REQUEST_TOP_SQL = int(os.environ.get('SLOW_REQUEST_TOP_SQL', 5))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'tours.slow_requests': {'handlers': ['console'], 'level': 'WARNING'},
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -139,11 +255,52 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# WebP-копии изображений (tours/images.py): ширины, качество, процессов
+# в пуле генерации (0 - генерировать в процессе веб-сервера после коммита)
+# и ширина копии для карточек каталога и списка статей
+IMAGE_VARIANT_WIDTHS = (320, 640, 1024, 1600)
+IMAGE_VARIANT_QUALITY = int(os.environ.get('IMAGE_VARIANT_QUALITY', 80))
+IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', 1))
+CARD_IMAGE_WIDTH = 640
+
+# Сколько минут держатся места, удержанные при открытии оформления заявки
+# (/api/holds/). Истекшие удержания снимает manage.py release_expired_holds
+SEAT_HOLD_MINUTES = int(os.environ.get('SEAT_HOLD_MINUTES', 15))
+
+# Очередь заявок, лидов и отзывов с отложенной записью (tours/ingest.py):
+# ответ 202 сразу после проверки, запись в базу - manage.py drain_ingest_queue
+# --interval 1 отдельным процессом. Каталог очереди должен быть общим для
+# всех воркеров и переживать перезапуск
+INGEST_QUEUE = os.environ.get('INGEST_QUEUE', 'False') == 'True'
+INGEST_SPOOL_DIR = os.environ.get('INGEST_SPOOL_DIR', BASE_DIR / 'spool')
+INGEST_BATCH_SIZE = int(os.environ.get('INGEST_BATCH_SIZE', 200))
+
+# Ограничение частоты POST-запросов (tours/ratelimit.py): 'МЕТОД путь' ->
+# ведра на клиента и общее, (емкость, токенов в секунду). Ведра хранятся
+# в RATE_LIMIT_DB, общем для воркеров на машине. RATE_LIMIT_PROXY_COUNT -
+# сколько доверенных прокси добавляют X-Forwarded-For. На Render (там
+# задана переменная RENDER) - 1, иначе все клиенты делили бы одно ведро
+RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'True') == 'True'
+RATE_LIMIT_DB = os.environ.get('RATE_LIMIT_DB', BASE_DIR / '.ratelimit.sqlite3')
+RATE_LIMIT_PROXY_COUNT = int(os.environ.get(
+    'RATE_LIMIT_PROXY_COUNT', 1 if os.environ.get('RENDER') else 0
+))
+RATE_LIMITS = {
+    'POST /api/bookings/': {'client': (5, 5 / 60), 'global': (60, 2)},
+    'POST /api/holds/': {'client': (10, 10 / 60), 'global': (120, 5)},
+    'POST /api/leads/': {'client': (3, 1 / 60), 'global': (30, 1)},
+    'POST /api/reviews/': {'client': (3, 1 / 300), 'global': (30, 0.5)},
+}
+
 # REST Framework settings
 REST_FRAMEWORK = {
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'tours.pagination.PageNumberPagination',
     'PAGE_SIZE': 12,
 }
 
 CORS_ALLOW_ALL_ORIGINS = True
-CORS_ALLOW_CREDENTIALS = True
\ No newline at end of file
+CORS_ALLOW_CREDENTIALS = True
+# Срок чтения из основной базы после записи (tours/routers.py): фронтенд
+# берет его из ответа и присылает обратно
+CORS_EXPOSE_HEADERS = ['X-Primary-Until']
+CORS_ALLOW_HEADERS = (*default_headers, 'x-primary-until')
\ No newline at end of file
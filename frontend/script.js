@@ -1,49 +1,69 @@
 // API базовый URL - использует переменную окружения или локальный fallback
 const API_URL = window.API_URL || 'http://127.0.0.1:8001/api';
 
+// Запросы к API с cookie и сроком чтения из основной базы после записи
+// (X-Primary-Until, см. tours/routers.py): сторонние cookie браузер может
+// не прислать, поэтому срок хранится здесь и отправляется заголовком
+async function apiFetch(url, options = {}) {
+    const headers = new Headers(options.headers);
+    const primaryUntil = sessionStorage.getItem('primaryUntil');
+    if (primaryUntil && Number(primaryUntil) * 1000 > Date.now()) {
+        headers.set('X-Primary-Until', primaryUntil);
+    }
+    const response = await fetch(url, { ...options, headers, credentials: 'include' });
+    const until = response.headers.get('X-Primary-Until');
+    if (until) sessionStorage.setItem('primaryUntil', until);
+    return response;
+}
+
 // Глобальные переменные
-let currentPage = 1;
 let filters = {};
 
 // ============ ИНИЦИАЛИЗАЦИЯ ============
 document.addEventListener('DOMContentLoaded', () => {
     loadTours();
+    loadFacets();
     setupFilters();
     setupNavigation();
     animateOnScroll();
 });
 
 // ============ ЗАГРУЗКА ТУРОВ ============
-async function loadTours(page = 1) {
+// Курсорная пагинация: следующая порция по ссылке next из ответа,
+// стоимость запроса не зависит от того, сколько уже загружено
+async function loadTours(nextUrl = null) {
     const loader = document.getElementById('loader');
     const toursGrid = document.getElementById('toursGrid');
     const toursCount = document.getElementById('toursFoundCount');
     
     loader.style.display = 'block';
-    toursGrid.innerHTML = '';
+    if (!nextUrl) toursGrid.innerHTML = '';
     
     try {
-        // Формируем URL с фильтрами
-        let url = `${API_URL}/tours/?page=${page}`;
+        // Формируем URL с фильтрами (count=exact только для первой порции)
+        let url = nextUrl || `${API_URL}/tours/?pagination=cursor&count=exact`;
         
-        if (filters.min_price) url += `&min_price=${filters.min_price}`;
-        if (filters.max_price) url += `&max_price=${filters.max_price}`;
-        if (filters.duration) url += `&duration=${filters.duration}`;
-        if (filters.region) url += `&region=${filters.region}`;
-        if (filters.start_date) url += `&start_date=${filters.start_date}`;
+        if (!nextUrl) {
+            if (filters.min_price) url += `&min_price=${filters.min_price}`;
+            if (filters.max_price) url += `&max_price=${filters.max_price}`;
+            if (filters.duration) url += `&duration=${filters.duration}`;
+            if (filters.region) url += `&region=${filters.region}`;
+            if (filters.start_date) url += `&start_date=${filters.start_date}`;
+        }
         
-        const response = await fetch(url);
+        const response = await apiFetch(url);
         const data = await response.json();
         
         loader.style.display = 'none';
         
         if (data.results && data.results.length > 0) {
-            toursCount.textContent = data.count;
+            if (data.count !== undefined) toursCount.textContent = data.count;
             renderTours(data.results);
             renderPagination(data);
-        } else {
+        } else if (!nextUrl) {
             toursGrid.innerHTML = '<p style="text-align: center; grid-column: 1/-1; font-size: 1.2rem; color: var(--gray);">Туры не найдены. Попробуйте изменить фильтры.</p>';
             toursCount.textContent = '0';
+            renderPagination(data);
         }
     } catch (error) {
         loader.style.display = 'none';
@@ -56,7 +76,10 @@ async function loadTours(page = 1) {
 function renderTours(tours) {
     const toursGrid = document.getElementById('toursGrid');
     
-    tours.forEach((tour, index) => {
+    const offset = toursGrid.children.length;
+    
+    tours.forEach((tour, i) => {
+        const index = offset + i;
         const card = document.createElement('div');
         card.className = 'tour-card';
         card.onclick = () => openTour(tour.slug);
@@ -80,8 +103,8 @@ function renderTours(tours) {
             <div class="tour-content">
                 <h3 class="tour-title">${tour.title}</h3>
                 <div class="tour-rating">
-                    ${renderStars(5)}
-                    <span style="color: var(--gray);">(4.8)</span>
+                    ${renderStars(Math.round(tour.average_rating || 0))}
+                    <span style="color: var(--gray);">${tour.average_rating ? `(${tour.average_rating})` : 'Нет отзывов'}</span>
                 </div>
                 <div class="tour-meta">
                     <span><i class="fas fa-map-marker-alt"></i> ${tour.region}</span>
@@ -157,7 +180,44 @@ function setupFilters() {
         if (region) filters.region = region;
         
         // Загружаем с фильтрами
-        loadTours(1);
+        loadTours();
+        loadFacets();
+    });
+}
+
+// ============ СЧЕТЧИКИ ФИЛЬТРОВ ============
+// Один запрос /tours/facets/ с текущими фильтрами: у вариантов показываем
+// число туров, варианты без туров недоступны
+async function loadFacets() {
+    const params = new URLSearchParams(filters);
+    try {
+        const response = await apiFetch(`${API_URL}/tours/facets/?${params}`);
+        if (!response.ok) return;
+        const { facets } = await response.json();
+        
+        markOptions('filterDuration', option =>
+            countFor(facets.duration, row => String(row.value) === option.value));
+        markOptions('filterRegion', option =>
+            countFor(facets.region, row => row.label === option.value));
+        markOptions('filterBudget', option =>
+            countFor(facets.price, row => String(row.min_price ?? 0) === option.value.split('-')[0]));
+    } catch (error) {
+        console.error('Ошибка загрузки счетчиков фильтров:', error);
+    }
+}
+
+function countFor(rows, match) {
+    const row = rows.find(match);
+    return row ? row.count : 0;
+}
+
+function markOptions(selectId, getCount) {
+    document.querySelectorAll(`#${selectId} option`).forEach(option => {
+        if (!option.value) return;
+        const count = getCount(option);
+        if (option.dataset.label === undefined) option.dataset.label = option.textContent;
+        option.textContent = `${option.dataset.label} (${count})`;
+        option.disabled = count === 0 && !option.selected;
     });
 }
 
@@ -166,32 +226,14 @@ function renderPagination(data) {
     const pagination = document.getElementById('pagination');
     pagination.innerHTML = '';
     
-    if (!data.next && !data.previous) return;
+    if (!data.next) return;
     
-    const totalPages = Math.ceil(data.count / 12);
-    
-    if (data.previous) {
-        const prevBtn = document.createElement('button');
-        prevBtn.className = 'btn btn-secondary';
-        prevBtn.style.cssText = 'padding: 0.5rem 1rem; margin: 0.5rem;';
-        prevBtn.textContent = '← Предыдущая';
-        prevBtn.onclick = () => loadTours(currentPage - 1);
-        pagination.appendChild(prevBtn);
-    }
-    
-    const pageInfo = document.createElement('span');
-    pageInfo.style.cssText = 'margin: 0 1rem; font-weight: 600;';
-    pageInfo.textContent = `Страница ${currentPage} из ${totalPages}`;
-    pagination.appendChild(pageInfo);
-    
-    if (data.next) {
-        const nextBtn = document.createElement('button');
-        nextBtn.className = 'btn btn-secondary';
-        nextBtn.style.cssText = 'padding: 0.5rem 1rem; margin: 0.5rem;';
-        nextBtn.textContent = 'Следующая →';
-        nextBtn.onclick = () => loadTours(currentPage + 1);
-        pagination.appendChild(nextBtn);
-    }
+    const moreBtn = document.createElement('button');
+    moreBtn.className = 'btn btn-secondary';
+    moreBtn.style.cssText = 'padding: 0.5rem 1rem; margin: 0.5rem;';
+    moreBtn.textContent = 'Показать еще';
+    moreBtn.onclick = () => loadTours(data.next);
+    pagination.appendChild(moreBtn);
 }
 
 // ============ НАВИГАЦИЯ ============
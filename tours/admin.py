@@ -1,11 +1,66 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.utils import timezone
 from django.utils.html import format_html
+from .cache import bump_generation
+from .export import FORMATS, export_response
+from .pagination import EstimatedCountPaginator
 from .models import (
     TourOperator, Tour, TourPhoto, TourDate, 
-    Booking, Review, FAQ, BlogPost, Lead
+    Booking, Review, FAQ, BlogPost, Lead, Region, RegionAlias, SeatsUnavailable
 )
 
 
+class LargeTableMixin:
+    """
+    Список большой таблицы: без полного COUNT(*) на каждой странице.
+
+    Число строк считается с ограничением (EstimatedCountPaginator), а
+    общее число без фильтров ("показать все") не запрашивается.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class ExportMixin:
+    """
+    Потоковая выгрузка CSV/JSONL: ссылки над списком (с текущими
+    фильтрами и поиском) и действия для выбранных строк.
+    """
+    change_list_template = 'admin/tours/export_change_list.html'
+
+    def get_urls(self):
+        from django.urls import path
+        info = self.opts.app_label, self.opts.model_name
+        return [
+            path('export/', self.admin_site.admin_view(self.export_view),
+                 name='%s_%s_export' % info),
+        ] + super().get_urls()
+
+    def export_view(self, request):
+        from django.core.exceptions import PermissionDenied
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        # format - не фильтр списка, убираем до построения ChangeList
+        request.GET = request.GET.copy()
+        fmt = request.GET.pop('format', ['csv'])[0]
+        queryset = self.get_changelist_instance(request).get_queryset(request)
+        return export_response(queryset, fmt)
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        for fmt in FORMATS:
+            name = f'export_{fmt}'
+            actions[name] = (
+                self.export_action(fmt), name, f'Выгрузить выбранные в {fmt.upper()}'
+            )
+        return actions
+
+    def export_action(self, fmt):
+        def action(modeladmin, request, queryset):
+            return export_response(queryset, fmt)
+        return action
+
+
 @admin.register(TourOperator)
 class TourOperatorAdmin(admin.ModelAdmin):
     list_display = ['name', 'phone', 'email', 'is_active', 'created_at']
@@ -29,8 +84,9 @@ class TourDateInline(admin.TabularInline):
 
 @admin.register(Tour)
 class TourAdmin(admin.ModelAdmin):
-    list_display = ['title', 'tour_type', 'price_base', 'duration_days', 'region', 'is_active', 'created_at']
-    list_filter = ['tour_type', 'is_active', 'region', 'tour_operator']
+    list_display = ['title', 'tour_type', 'price_base', 'duration_days', 'main_region', 'is_active', 'created_at']
+    list_filter = ['tour_type', 'is_active', 'main_region', 'tour_operator']
+    list_select_related = ['main_region']
     search_fields = ['title', 'description_short', 'description_full']
     list_editable = ['is_active']
     prepopulated_fields = {'slug': ('title',)}
@@ -39,7 +95,7 @@ class TourAdmin(admin.ModelAdmin):
     
     fieldsets = (
         ('Основная информация', {
-            'fields': ('title', 'slug', 'tour_type', 'tour_operator', 'region')
+            'fields': ('title', 'slug', 'tour_type', 'tour_operator', 'region', 'main_region')
         }),
         ('Описание', {
             'fields': ('description_short', 'description_full', 'program_by_days')
@@ -55,24 +111,42 @@ class TourAdmin(admin.ModelAdmin):
     actions = ['activate_tours', 'deactivate_tours']
     
     def activate_tours(self, request, queryset):
-        queryset.update(is_active=True)
+        queryset.update(is_active=True, updated_at=timezone.now())
+        # update() не вызывает сигналы - сбрасываем кэш API вручную
+        bump_generation(Tour)
     activate_tours.short_description = "Активировать выбранные туры"
     
     def deactivate_tours(self, request, queryset):
-        queryset.update(is_active=False)
+        queryset.update(is_active=False, updated_at=timezone.now())
+        bump_generation(Tour)
     deactivate_tours.short_description = "Деактивировать выбранные туры"
 
 
+class RegionAliasInline(admin.TabularInline):
+    model = RegionAlias
+    extra = 1
+
+
+@admin.register(Region)
+class RegionAdmin(admin.ModelAdmin):
+    list_display = ['name', 'slug', 'display_order']
+    list_editable = ['display_order']
+    search_fields = ['name', 'aliases__alias']
+    inlines = [RegionAliasInline]
+
+
 @admin.register(TourPhoto)
 class TourPhotoAdmin(admin.ModelAdmin):
     list_display = ['tour', 'photo', 'display_order', 'is_cover', 'created_at']
+    list_select_related = ['tour']
     list_filter = ['is_cover', 'tour']
     list_editable = ['display_order', 'is_cover']
 
 
 @admin.register(TourDate)
-class TourDateAdmin(admin.ModelAdmin):
+class TourDateAdmin(LargeTableMixin, admin.ModelAdmin):
     list_display = ['tour', 'start_date', 'end_date', 'seats_info', 'status_colored', 'created_at']
+    list_select_related = ['tour']
     list_filter = ['status', 'start_date']
     search_fields = ['tour__title']
     readonly_fields = ['end_date']
@@ -112,9 +186,10 @@ class TourDateAdmin(admin.ModelAdmin):
 
 
 @admin.register(Booking)
-class BookingAdmin(admin.ModelAdmin):
+class BookingAdmin(LargeTableMixin, ExportMixin, admin.ModelAdmin):
     list_display = ['id', 'tour_info', 'client_name', 'client_phone', 'people_count', 
                     'total_price', 'status_colored', 'source', 'created_at']
+    list_select_related = ['tour_date__tour']
     list_filter = ['status', 'source', 'created_at']
     search_fields = ['client_name', 'client_phone', 'client_email']
     readonly_fields = ['total_price', 'created_at', 'updated_at']
@@ -157,17 +232,22 @@ class BookingAdmin(admin.ModelAdmin):
     status_colored.short_description = 'Статус'
     
     def confirm_bookings(self, request, queryset):
-        queryset.update(status='confirmed')
+        # Отмененные заявки при подтверждении снова занимают места
+        try:
+            queryset.set_status('confirmed')
+        except SeatsUnavailable as exc:
+            self.message_user(request, str(exc), messages.ERROR)
     confirm_bookings.short_description = "Подтвердить выбранные бронирования"
     
     def cancel_bookings(self, request, queryset):
-        queryset.update(status='cancelled')
+        queryset.set_status('cancelled')
     cancel_bookings.short_description = "Отменить выбранные бронирования"
 
 
 @admin.register(Review)
-class ReviewAdmin(admin.ModelAdmin):
+class ReviewAdmin(LargeTableMixin, admin.ModelAdmin):
     list_display = ['client_name', 'tour', 'rating_stars', 'moderation_status_colored', 'created_at']
+    list_select_related = ['tour']
     list_filter = ['moderation_status', 'rating', 'created_at']
     search_fields = ['client_name', 'client_city', 'text']
     readonly_fields = ['created_at']
@@ -193,11 +273,11 @@ class ReviewAdmin(admin.ModelAdmin):
     moderation_status_colored.short_description = 'Модерация'
     
     def approve_reviews(self, request, queryset):
-        queryset.update(moderation_status='approved')
+        queryset.moderate('approved')
     approve_reviews.short_description = "Одобрить выбранные отзывы"
     
     def reject_reviews(self, request, queryset):
-        queryset.update(moderation_status='rejected')
+        queryset.moderate('rejected')
     reject_reviews.short_description = "Отклонить выбранные отзывы"
 
 
@@ -236,7 +316,7 @@ class BlogPostAdmin(admin.ModelAdmin):
 
 
 @admin.register(Lead)
-class LeadAdmin(admin.ModelAdmin):
+class LeadAdmin(LargeTableMixin, ExportMixin, admin.ModelAdmin):
     list_display = ['id', 'name', 'phone', 'source', 'status_colored', 'created_at']
     list_filter = ['status', 'source', 'created_at']
     search_fields = ['name', 'phone', 'email', 'message']
@@ -3,3 +3,9 @@ from django.apps import AppConfig
 
 class ToursConfig(AppConfig):
     name = 'tours'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from . import signals  # noqa: F401
+        from .metrics import install_execute_wrapper
+        connection_created.connect(install_execute_wrapper)
@@ -0,0 +1,186 @@
+"""
+Асинхронные read-only эндпоинты для запуска под ASGI (uvicorn).
+
+Повторяют list/retrieve вьюсетов из views.py - те же queryset, фильтры,
+пагинация, сериализаторы, кэш ответов и ETag, - но ожидание базы и кэша
+не занимает воркер: строки читаются асинхронным ORM, ответ в кэш
+пишется асинхронным API кэша Django.
+
+Сериализаторы туров могут сами читать связанные данные (запасной путь
+устаревшей карточки, даты и отзывы детальной страницы), а валидаторы
+ETag - составные агрегаты, поэтому они выполняются через sync_to_async,
+как и сам асинхронный ORM Django.
+
+Включаются настройкой ASYNC_READ_API (см. urls.py), запись (POST) по тем же
+адресам передается обычным вьюсетам.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.http import Http404, HttpResponse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.response import Response
+
+from .cache import CachedResponseMixin, can_store_reads, record
+from .conditional import ConditionalGetMixin
+
+
+class AsyncReadView(View):
+    """Асинхронный list или retrieve read-only вьюсета"""
+    viewset_class = None
+    basename = None
+    action = 'list'
+    sync_view = None
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # Как и вьюхи DRF: CSRF проверяет SessionAuthentication
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        if request.method.lower() not in ('get', 'head') and self.sync_view:
+            return await sync_to_async(self.sync_view)(request, *args, **kwargs)
+        return await super().dispatch(request, *args, **kwargs)
+
+    async def get(self, request, *args, **kwargs):
+        viewset = self.viewset_class(
+            action_map={'get': self.action},
+            basename=self.basename,
+            detail=self.action == 'retrieve',
+        )
+        viewset.args, viewset.kwargs = args, kwargs
+        viewset.headers = viewset.default_response_headers
+        viewset.format_kwarg = None
+        request = viewset.initialize_request(request, *args, **kwargs)
+        viewset.request = request
+        try:
+            negotiated = viewset.perform_content_negotiation(request)
+            request.accepted_renderer, request.accepted_media_type = negotiated
+            viewset.check_permissions(request)
+            response = await self.cached(viewset, request)
+        except Exception as exc:
+            response = viewset.handle_exception(exc)
+        response = viewset.finalize_response(request, response)
+        return self.prerender(request, response)
+
+    def prerender(self, request, response):
+        """JSON рендерим сразу: иначе Django вызовет render() через поток.
+
+        Браузерный API (HTML) оставляем ленивым - он читает request.user.
+        """
+        if not isinstance(response, Response) or request.accepted_renderer.format != 'json':
+            return response
+        response.render()
+        rendered = HttpResponse(response.content, status=response.status_code)
+        for header, value in response.items():
+            rendered[header] = value
+        return rendered
+
+    async def cached(self, viewset, request):
+        """Асинхронный вариант CachedResponseMixin.cached_response"""
+        timeout = settings.RESPONSE_CACHE_TIMEOUT
+        if not isinstance(viewset, CachedResponseMixin) or not timeout:
+            return await self.conditional(viewset, request)
+
+        name = viewset.get_cache_name()
+        # Асинхронный API кэша Django - обертки над sync_to_async: поколения
+        # и ответ читаем за один переход в поток, а не за три
+        key, cached = await sync_to_async(self.cache_lookup)(viewset, request)
+        if cached is not None:
+            record(name, 'hit')
+            return viewset.cached_hit_response(request, cached)
+
+        record(name, 'miss')
+        response = await self.conditional(viewset, request)
+        if response.status_code == 200 and await sync_to_async(can_store_reads)():
+            await cache.aset(key, viewset.cache_payload(response), timeout)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def cache_lookup(self, viewset, request):
+        key = viewset.get_response_cache_key(request)
+        return key, cache.get(key)
+
+    async def conditional(self, viewset, request):
+        """Асинхронный вариант ConditionalGetMixin.conditional_response"""
+        if not isinstance(viewset, ConditionalGetMixin):
+            return await self.handle(viewset, request)
+
+        if self.action == 'retrieve':
+            get_validators = viewset.get_detail_validators
+        else:
+            get_validators = viewset.get_list_validators
+        validators = await sync_to_async(get_validators)(request)
+        if validators is None:
+            return await self.handle(viewset, request)
+
+        etag, timestamp, not_modified = viewset.check_validators(request, validators)
+        if not_modified is not None:
+            return not_modified
+        response = await self.handle(viewset, request)
+        viewset.set_validator_headers(response, etag, timestamp)
+        return response
+
+    async def handle(self, viewset, request):
+        if self.action == 'retrieve':
+            return await self.retrieve(viewset, request)
+        return await self.list(viewset, request)
+
+    async def list(self, viewset, request):
+        queryset = viewset.filter_queryset(viewset.get_queryset())
+        paginator = viewset.paginator
+        rows = None
+        if paginator is not None:
+            rows = await paginator.apaginate_queryset(queryset, request, view=viewset)
+        if rows is not None and hasattr(viewset, 'prepare_page'):
+            # Как в paginate_queryset вьюсета: обходим его, значит, и хук
+            await sync_to_async(viewset.prepare_page)(rows)
+        if rows is None:
+            rows = [row async for row in queryset]
+            return Response(await self.serialize(viewset, rows, many=True))
+        data = await self.serialize(viewset, rows, many=True)
+        return paginator.get_paginated_response(data)
+
+    async def retrieve(self, viewset, request):
+        queryset = viewset.filter_queryset(viewset.get_queryset())
+        lookup_url_kwarg = viewset.lookup_url_kwarg or viewset.lookup_field
+        lookup = {viewset.lookup_field: viewset.kwargs[lookup_url_kwarg]}
+        try:
+            instance = await queryset.aget(**lookup)
+        except (queryset.model.DoesNotExist, DjangoValidationError, TypeError, ValueError):
+            raise Http404
+        return Response(await self.serialize(viewset, instance))
+
+    async def serialize(self, viewset, instance, many=False):
+        serializer = viewset.get_serializer(instance, many=many)
+        return await sync_to_async(lambda: serializer.data)()
+
+
+class AsyncReviewListView(AsyncReadView):
+    """Лента отзывов и превью по нескольким турам (?tour_ids=)"""
+
+    async def list(self, viewset, request):
+        tour_ids = request.query_params.get('tour_ids')
+        if not tour_ids:
+            return await super().list(viewset, request)
+        queryset = viewset.get_preview_queryset(
+            request, viewset.parse_ids('tour_ids', tour_ids)
+        )
+        reviews = [review async for review in queryset]
+        return Response(viewset.get_preview_data(reviews))
+
+
+def async_view(viewset_class, basename, action, view_class=AsyncReadView):
+    """Асинхронная вьюха для action; остальные методы - обычному вьюсету"""
+    actions = {'get': action}
+    if action == 'list' and hasattr(viewset_class, 'create'):
+        actions['post'] = 'create'
+    sync_view = viewset_class.as_view(
+        actions, basename=basename, detail=action == 'retrieve'
+    )
+    return view_class.as_view(
+        viewset_class=viewset_class, basename=basename, action=action,
+        sync_view=sync_view,
+    )
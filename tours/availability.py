@@ -0,0 +1,138 @@
+"""
+Календарь доступности тура по месяцам.
+
+Дни месяца считаются одним сгруппированным запросом по TourDate для
+всех недостающих в кэше месяцев. Месяц тура кэшируется отдельно, ключ
+содержит поколение 'calendar.<tour_id>.<YYYY-MM>' (см. cache.py): его
+меняют сигналы дат и бронирований только для затронутого месяца.
+"""
+from datetime import date
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max, Min, Q, Sum
+from django.utils import timezone
+
+from .cache import bump_generation, can_store_reads, get_generations
+
+
+CALENDAR_KEY = 'calendar:{tour_id}:{month}:{generation}'
+MAX_MONTHS = 12
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def next_month(month):
+    if month.month == 12:
+        return month.replace(year=month.year + 1, month=1)
+    return month.replace(month=month.month + 1)
+
+
+def parse_month(value):
+    """'2026-10' -> date(2026, 10, 1); ValueError при неверном формате"""
+    year, month = value.split('-')
+    return date(int(year), int(month), 1)
+
+
+def month_range(first, last):
+    months = []
+    month = first
+    while month <= last:
+        months.append(month)
+        month = next_month(month)
+    return months
+
+
+def calendar_label(tour_id, day):
+    return f'calendar.{tour_id}.{day:%Y-%m}'
+
+
+def invalidate(*tour_days):
+    """Сбросить кэш календаря для пар (tour_id, день)"""
+    labels = {
+        calendar_label(tour_id, day)
+        for tour_id, day in tour_days if tour_id is not None and day is not None
+    }
+    if labels:
+        bump_generation(*sorted(labels))
+
+
+def day_status(row):
+    if row['available']:
+        return 'available'
+    if row['cancelled'] == row['departures']:
+        return 'cancelled'
+    return 'full'
+
+
+def query_months(tour_id, months):
+    """{месяц: [дни]} одним запросом, сгруппированным по дню начала"""
+    from .models import TourDate
+
+    rows = TourDate.objects.filter(
+        tour_id=tour_id,
+        start_date__gte=months[0],
+        start_date__lt=next_month(months[-1]),
+    ).values('start_date').annotate(
+        departures=Count('pk'),
+        available=Count('pk', filter=Q(status='available', available_seats__gt=0)),
+        cancelled=Count('pk', filter=Q(status='cancelled')),
+        seats_left=Sum('available_seats', filter=Q(status='available'), default=0),
+        # (tour, start_date) уникальны: в дне одна дата тура
+        tour_date=Min('pk'),
+        end_date=Max('end_date'),
+    ).order_by('start_date')
+
+    result = {month: [] for month in months}
+    for row in rows:
+        month = month_start(row['start_date'])
+        if month not in result:
+            continue
+        result[month].append({
+            'date': row['start_date'].isoformat(),
+            'end_date': row['end_date'].isoformat() if row['end_date'] else None,
+            'tour_date': row['tour_date'],
+            'departures': row['departures'],
+            'seats_left': row['seats_left'],
+            'status': day_status(row),
+        })
+    return result
+
+
+def get_calendar(tour_id, months):
+    """[{'month': 'YYYY-MM', 'days': [...]}] для подряд идущих месяцев"""
+    timeout = settings.RESPONSE_CACHE_TIMEOUT
+    keys = {}
+    cached = {}
+    if timeout:
+        generations = get_generations([calendar_label(tour_id, month) for month in months])
+        keys = {
+            month: CALENDAR_KEY.format(
+                tour_id=tour_id, month=f'{month:%Y-%m}', generation=generation
+            )
+            for month, generation in zip(months, generations)
+        }
+        found = cache.get_many(keys.values())
+        cached = {month: found[key] for month, key in keys.items() if key in found}
+
+    missing = [month for month in months if month not in cached]
+    if missing:
+        fresh = query_months(tour_id, missing)
+        if timeout and can_store_reads():
+            cache.set_many({keys[month]: days for month, days in fresh.items()}, timeout)
+        cached.update(fresh)
+
+    # Прошедшие дни помечаются при ответе: кэш месяца живет дольше суток
+    today = timezone.now().date().isoformat()
+    return [
+        {
+            'month': f'{month:%Y-%m}',
+            'days': [
+                dict(day, status='past') if day['date'] < today else day
+                for day in cached[month]
+            ],
+        }
+        for month in months
+    ]
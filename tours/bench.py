@@ -0,0 +1,100 @@
+"""
+Утилиты нагрузочных замеров API: параллельные HTTP-запросы и перцентили.
+
+Используются командами bench_asgi и bench_api. Нагрузку дают потоки
+с urllib - без внешних зависимостей, чтобы замер можно было запустить
+на любом сервере.
+"""
+import threading
+import time
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+
+def percentile(values, q):
+    """Перцентиль q (0-100) по методу ближайшего ранга"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(latencies, errors, elapsed):
+    """Сводка замера; задержки в миллисекундах"""
+    latencies_ms = [latency * 1000 for latency in latencies]
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'seconds': round(elapsed, 3),
+        'rps': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'p50_ms': _round(percentile(latencies_ms, 50)),
+        'p95_ms': _round(percentile(latencies_ms, 95)),
+        'p99_ms': _round(percentile(latencies_ms, 99)),
+        'max_ms': _round(max(latencies_ms) if latencies_ms else None),
+    }
+
+
+def _round(value):
+    return round(value, 2) if value is not None else None
+
+
+def fetch(url, timeout=30, headers=None):
+    """GET url, возвращает код ответа (0 - ошибка соединения)"""
+    try:
+        with urlopen(Request(url, headers=headers or {}), timeout=timeout) as response:
+            response.read()
+            return response.status
+    except HTTPError as exc:
+        return exc.code
+    except (URLError, OSError):
+        return 0
+
+
+def wait_for(url, timeout=30):
+    """Дождаться, пока сервер начнет отвечать"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if fetch(url, timeout=2):
+            return True
+        time.sleep(0.2)
+    return False
+
+
+def run_load(urls, concurrency=16, duration=10.0, timeout=30, headers=None):
+    """
+    concurrency потоков по кругу запрашивают urls в течение duration секунд.
+    Ошибкой считается любой ответ, кроме 2xx и 304.
+    """
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    start = threading.Barrier(concurrency + 1)
+    stop_at = [0.0]
+
+    def worker(offset):
+        position = offset
+        local, failed = [], 0
+        start.wait()
+        while time.perf_counter() < stop_at[0]:
+            url = urls[position % len(urls)]
+            position += 1
+            began = time.perf_counter()
+            code = fetch(url, timeout, headers)
+            if 200 <= code < 300 or code == 304:
+                local.append(time.perf_counter() - began)
+            else:
+                failed += 1
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    began = time.perf_counter()
+    stop_at[0] = began + duration
+    start.wait()
+    for thread in threads:
+        thread.join()
+    return summarize(latencies, errors[0], time.perf_counter() - began)
@@ -0,0 +1,208 @@
+"""
+Кэш ответов read-only API с инвалидацией по поколениям.
+
+Для каждой модели в кэше хранится счетчик поколения. Ключ ответа содержит
+текущие поколения всех моделей, от которых зависит вьюха, поэтому любая
+запись в модель (сигналы или явный bump_generation в массовых действиях
+админки) делает старые ответы недостижимыми - удалять их не нужно,
+они вытесняются по таймауту.
+
+С репликами ответ, собранный сразу после записи, мог прочитать
+устаревшие данные и попасть в кэш под новым поколением. Поэтому
+READ_YOUR_WRITES_SECONDS после любой записи ответы, прочитанные из
+реплик, не кэшируются.
+"""
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+from rest_framework.response import Response
+
+from .metrics import record_cache
+from .routers import replica_lag_possible
+
+
+GENERATION_KEY = 'gen:{label}'
+RESPONSE_KEY = 'resp:{name}:{generations}:{digest}'
+STATS_KEY = 'stats:{name}:{outcome}'
+RECENT_WRITE_KEY = 'gen:recent-write'
+
+# Заголовки-валидаторы сохраняются вместе с ответом (см. conditional.py)
+CACHED_HEADERS = ('ETag', 'Last-Modified')
+
+# Счетчики попаданий копятся в процессе и сбрасываются в общий кэш пачками,
+# чтобы не писать в кэш на каждый запрос
+STATS_FLUSH_EVERY = 50
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def model_label(model):
+    if isinstance(model, str):
+        return model
+    return model._meta.label_lower
+
+
+def _bump(labels):
+    for label in labels:
+        key = GENERATION_KEY.format(label=label)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Счетчика нет (первый запуск или вытеснен): начинаем с
+            # отметки времени, чтобы не совпасть со старыми ключами
+            cache.set(key, time.time_ns(), None)
+    if settings.READ_YOUR_WRITES_SECONDS:
+        cache.set(RECENT_WRITE_KEY, 1, settings.READ_YOUR_WRITES_SECONDS)
+
+
+def bump_generation(*models):
+    """Инвалидировать кэшированные ответы, зависящие от моделей.
+
+    Поколение меняется сразу и еще раз после коммита: иначе параллельный
+    запрос мог бы закэшировать данные до коммита под новым поколением.
+    """
+    labels = [model_label(model) for model in models]
+    _bump(labels)
+    transaction.on_commit(lambda: _bump(labels), robust=True)
+
+
+def can_store_reads():
+    """Можно ли кэшировать прочитанное в этом запросе (см. docstring модуля)"""
+    return not (replica_lag_possible() and cache.get(RECENT_WRITE_KEY))
+
+
+def get_generations(models):
+    labels = [model_label(model) for model in models]
+    keys = [GENERATION_KEY.format(label=label) for label in labels]
+    values = cache.get_many(keys)
+    missing = [key for key in keys if key not in values]
+    for key in missing:
+        values[key] = time.time_ns()
+        cache.add(key, values[key], None)
+    if missing:
+        # Другой процесс мог успеть создать счетчик раньше нас
+        values.update(cache.get_many(missing))
+    return [values[key] for key in keys]
+
+
+def record(name, outcome):
+    """Учесть попадание/промах кэша (outcome: 'hit' или 'miss')"""
+    record_cache(outcome)
+    with _stats_lock:
+        key = (name, outcome)
+        _stats[key] = _stats.get(key, 0) + 1
+        if sum(_stats.values()) < STATS_FLUSH_EVERY:
+            return
+        pending = dict(_stats)
+        _stats.clear()
+    flush_stats(pending)
+
+
+def flush_stats(pending=None):
+    if pending is None:
+        with _stats_lock:
+            pending = dict(_stats)
+            _stats.clear()
+    for (name, outcome), count in pending.items():
+        key = STATS_KEY.format(name=name, outcome=outcome)
+        try:
+            cache.incr(key, count)
+        except ValueError:
+            cache.set(key, count, None)
+
+
+def get_stats(names):
+    """{имя вьюхи: (попадания, промахи)} по данным общего кэша"""
+    keys = {
+        (name, outcome): STATS_KEY.format(name=name, outcome=outcome)
+        for name in names for outcome in ('hit', 'miss')
+    }
+    values = cache.get_many(keys.values())
+    return {
+        name: (values.get(keys[(name, 'hit')], 0), values.get(keys[(name, 'miss')], 0))
+        for name in names
+    }
+
+
+class CachedResponseMixin:
+    """
+    Кэширует ответы list/retrieve read-only вьюсета.
+
+    cache_models - модели, изменение которых меняет ответ вьюхи.
+    Ключ: путь, отсортированные параметры запроса, хост и поколения моделей.
+    """
+    cache_models = ()
+    # Ответ зависит от "сегодня" (ближайшие даты): день входит в ключ,
+    # иначе после полуночи до RESPONSE_CACHE_TIMEOUT отдавались бы прошедшие
+    cache_by_day = False
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def get_cache_name(self):
+        return f'{self.basename}-{self.action}'
+
+    def get_response_cache_key(self, request, generations=None):
+        if generations is None:
+            generations = get_generations(self.cache_models)
+        params = sorted(request.query_params.lists())
+        raw = f'{request.get_host()}|{request.path}|{params}'
+        if self.cache_by_day:
+            # Тот же "сегодня", что у сериализаторов и ETag (conditional.py)
+            raw += f'|{timezone.now().date()}'
+        generations = '.'.join(str(g) for g in generations)
+        return RESPONSE_KEY.format(
+            name=self.get_cache_name(),
+            generations=hashlib.md5(generations.encode()).hexdigest(),
+            digest=hashlib.md5(raw.encode()).hexdigest(),
+        )
+
+    def cached_hit_response(self, request, cached):
+        """Ответ из кэша: 304, если валидаторы клиента совпали"""
+        data, headers = cached
+        not_modified = get_conditional_response(
+            request,
+            etag=headers.get('ETag'),
+            last_modified=parse_http_date_safe(headers.get('Last-Modified', '')),
+        )
+        response = Response(data) if not_modified is None else not_modified
+        for header, value in headers.items():
+            response[header] = value
+        response['X-Cache'] = 'HIT'
+        return response
+
+    def cache_payload(self, response):
+        headers = {
+            header: response[header]
+            for header in CACHED_HEADERS if header in response
+        }
+        return response.data, headers
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        timeout = settings.RESPONSE_CACHE_TIMEOUT
+        if not timeout:
+            return handler(request, *args, **kwargs)
+
+        name = self.get_cache_name()
+        key = self.get_response_cache_key(request)
+        cached = cache.get(key)
+        if cached is not None:
+            record(name, 'hit')
+            return self.cached_hit_response(request, cached)
+
+        record(name, 'miss')
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200 and can_store_reads():
+            cache.set(key, self.cache_payload(response), timeout)
+        response['X-Cache'] = 'MISS'
+        return response
@@ -0,0 +1,80 @@
+"""
+Условные GET-запросы (ETag / Last-Modified / 304).
+
+Валидаторы считаются одним легким агрегатным запросом до сериализации:
+если клиент или CDN уже имеет актуальную версию, ответ 304 отдается
+без выборки и сериализации данных.
+"""
+import hashlib
+
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def make_etag(*parts):
+    raw = '|'.join(str(part) for part in parts)
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def latest(*values):
+    values = [value for value in values if value is not None]
+    return max(values) if values else None
+
+
+class ConditionalGetMixin:
+    """
+    Добавляет ETag и Last-Modified к list/retrieve и отвечает 304.
+
+    Вьюсет реализует get_list_validators(request) и
+    get_detail_validators(request): каждый возвращает
+    (части ETag, время последнего изменения) или None, если объекта нет.
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            self.get_list_validators, super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            self.get_detail_validators, super().retrieve, request, *args, **kwargs
+        )
+
+    def get_list_validators(self, request):
+        return None
+
+    def get_detail_validators(self, request):
+        return None
+
+    def conditional_response(self, get_validators, handler, request, *args, **kwargs):
+        validators = get_validators(request)
+        if validators is None:
+            return handler(request, *args, **kwargs)
+
+        etag, timestamp, not_modified = self.check_validators(request, validators)
+        if not_modified is not None:
+            return not_modified
+
+        response = handler(request, *args, **kwargs)
+        self.set_validator_headers(response, etag, timestamp)
+        return response
+
+    def check_validators(self, request, validators):
+        """(ETag, время изменения, ответ 304 или None)"""
+        parts, last_modified = validators
+        # Дата входит в ETag: выдача зависит от "сегодня" (ближайшие даты)
+        etag = quote_etag(make_etag(
+            request.get_full_path(), timezone.now().date(), *parts
+        ))
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        not_modified = get_conditional_response(
+            request, etag=etag, last_modified=timestamp
+        )
+        return etag, timestamp, not_modified
+
+    def set_validator_headers(self, response, etag, timestamp):
+        if response.status_code == 200:
+            response['ETag'] = etag
+            if timestamp is not None:
+                response['Last-Modified'] = http_date(timestamp)
@@ -0,0 +1,148 @@
+"""
+Потоковая выгрузка бронирований и лидов в CSV и JSON Lines.
+
+Строки читаются через values_list(...).iterator() пачками (на PostgreSQL -
+серверным курсором), связанные тур и дата берутся JOIN'ом в том же
+запросе. Ответ отдается построчно, поэтому память не зависит от числа
+строк, а первые байты уходят клиенту сразу.
+"""
+import csv
+import re
+from datetime import datetime
+
+from django.core.exceptions import FieldDoesNotExist
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models.constants import LOOKUP_SEP
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+
+CHUNK_SIZE = 2000
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+# Колонки выгрузки: путь поля для values_list и заголовок для CSV
+EXPORT_COLUMNS = {
+    'tours.booking': [
+        ('id', 'Номер'),
+        ('created_at', 'Создана'),
+        ('status', 'Статус'),
+        ('source', 'Источник'),
+        ('tour_date__tour__title', 'Тур'),
+        ('tour_date__start_date', 'Дата начала'),
+        ('tour_date__end_date', 'Дата окончания'),
+        ('client_name', 'Имя клиента'),
+        ('client_phone', 'Телефон'),
+        ('client_email', 'Email'),
+        ('people_count', 'Человек'),
+        ('total_price', 'Стоимость'),
+        ('comment', 'Комментарий'),
+    ],
+    'tours.lead': [
+        ('id', 'Номер'),
+        ('created_at', 'Создан'),
+        ('status', 'Статус'),
+        ('source', 'Источник'),
+        ('name', 'Имя'),
+        ('phone', 'Телефон'),
+        ('email', 'Email'),
+        ('message', 'Сообщение'),
+    ],
+}
+
+
+# Ячейки, которые Excel и LibreOffice считают формулой
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+# Телефон '+7 (900) 111-22-33' и числа со знаком: без функций и ссылок
+# формула безвредна, а апостроф испортил бы основную колонку выгрузки
+SIGNED_NUMBER_RE = re.compile(r'[+-][\d\s().-]+')
+
+
+def neutralize(value):
+    """Текст из публичных форм не должен выполняться как формула (CSV injection)"""
+    if (isinstance(value, str) and value.startswith(FORMULA_PREFIXES)
+            and not SIGNED_NUMBER_RE.fullmatch(value)):
+        return "'" + value
+    return value
+
+
+class Echo:
+    """Файлоподобный объект для csv.writer: возвращает строку вместо записи"""
+
+    def write(self, value):
+        return value
+
+
+def get_columns(model):
+    return EXPORT_COLUMNS[model._meta.label_lower]
+
+
+def resolve_field(model, path):
+    field = None
+    for name in path.split(LOOKUP_SEP):
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return None
+        model = field.related_model or model
+    return field
+
+
+def export_rows(queryset, chunk_size=CHUNK_SIZE):
+    """Кортежи значений колонок, пачками по chunk_size строк"""
+    paths = [path for path, title in get_columns(queryset.model)]
+    return queryset.order_by('pk').values_list(*paths).iterator(chunk_size=chunk_size)
+
+
+def csv_lines(queryset, chunk_size=CHUNK_SIZE):
+    """Строки CSV: значения с вариантами выбора - подписями, время - местное"""
+    columns = get_columns(queryset.model)
+    choices = []
+    for path, title in columns:
+        field = resolve_field(queryset.model, path)
+        choices.append(dict(field.flatchoices) if field and field.choices else None)
+
+    writer = csv.writer(Echo())
+    # BOM - чтобы Excel распознал UTF-8
+    yield '\ufeff' + writer.writerow([title for path, title in columns])
+    for row in export_rows(queryset, chunk_size):
+        values = []
+        for value, labels in zip(row, choices):
+            if labels is not None:
+                value = labels.get(value, value)
+            elif isinstance(value, datetime):
+                value = timezone.localtime(value).strftime('%Y-%m-%d %H:%M:%S')
+            values.append(neutralize(value))
+        yield writer.writerow(values)
+
+
+def jsonl_lines(queryset, chunk_size=CHUNK_SIZE):
+    """Строки JSON Lines с исходными значениями полей"""
+    paths = [path for path, title in get_columns(queryset.model)]
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    for row in export_rows(queryset, chunk_size):
+        yield encoder.encode(dict(zip(paths, row))) + '\n'
+
+
+def export_lines(queryset, fmt, chunk_size=CHUNK_SIZE):
+    if fmt == 'jsonl':
+        return jsonl_lines(queryset, chunk_size)
+    return csv_lines(queryset, chunk_size)
+
+
+def export_response(queryset, fmt='csv'):
+    if fmt not in FORMATS:
+        fmt = 'csv'
+    filename = '{}-{}.{}'.format(
+        queryset.model._meta.model_name,
+        timezone.localtime().strftime('%Y%m%d-%H%M'),
+        fmt,
+    )
+    response = StreamingHttpResponse(
+        export_lines(queryset, fmt), content_type=FORMATS[fmt]
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,172 @@
+"""
+Счетчики для панели фильтров каталога (фасеты).
+
+Для каждого фасета применяются все выбранные фильтры, кроме его
+собственных: так видно, сколько туров даст выбор другого значения.
+Каждый фасет - один сгруппированный запрос (регион - два: основной и
+дополнительные регионы туров), плюс один запрос за списком регионов
+(регионы без туров тоже показываются, с нулем).
+
+Ответ кэшируется по нормализованному набору фильтров: параметры
+пагинации и сортировки не учитываются, пустые отбрасываются, регион и
+поиск приводятся к одному написанию.
+"""
+import hashlib
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, Count, IntegerField, Value, When
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .cache import can_store_reads, get_generations
+from .filters import TourFilter
+from .regions import normalize
+from .search import search_tours
+
+
+FACETS_KEY = 'facets:{generations}:{digest}'
+
+# Параметры, которые фасет не применяет к своим же счетчикам
+FACET_PARAMS = {
+    'tour_type': ('tour_type',),
+    'region': ('region',),
+    'duration': ('duration',),
+    'price': ('min_price', 'max_price'),
+}
+SEARCH_PARAM = 'search'
+
+# Границы ценовых диапазонов (как в фильтре бюджета на сайте):
+# [0, 30000), [30000, 50000), [50000, 70000), [70000, ...)
+PRICE_EDGES = (30000, 50000, 70000)
+
+
+def normalize_params(query_params):
+    """Только параметры фильтров, без пустых, в едином написании"""
+    params = {}
+    for name in (*TourFilter.base_filters, SEARCH_PARAM):
+        value = query_params.get(name, '').strip()
+        if not value:
+            continue
+        if name in ('region', SEARCH_PARAM):
+            value = normalize(value)
+        params[name] = value
+    return params
+
+
+def price_buckets():
+    """[(min_price, max_price)] с границами для фильтра (max включительно)"""
+    bounds = (None, *PRICE_EDGES, None)
+    cent = Decimal('0.01')
+    return [
+        (low, high - cent if high is not None else None)
+        for low, high in zip(bounds, bounds[1:])
+    ]
+
+
+def filtered(queryset, params, exclude=()):
+    data = {name: value for name, value in params.items() if name not in exclude}
+    filterset = TourFilter(data, queryset=queryset)
+    if not filterset.is_valid():
+        raise ValidationError(filterset.errors)
+    queryset = filterset.qs
+    if data.get(SEARCH_PARAM):
+        queryset = search_tours(queryset, data[SEARCH_PARAM])
+    return queryset.order_by()
+
+
+def grouped(queryset, field):
+    return {
+        row[field]: row['count']
+        for row in queryset.values(field).annotate(count=Count('pk'))
+    }
+
+
+def region_counts(queryset):
+    """Туры по региону - по тем же связям, что и фильтр (Region.tour_filter):
+    основной регион и дополнительные из TourRegion, они не пересекаются"""
+    from .models import TourRegion
+
+    counts = grouped(queryset, 'main_region_id')
+    extra = grouped(
+        TourRegion.objects.filter(tour_id__in=queryset.values('pk')), 'region_id'
+    )
+    for region_id, count in extra.items():
+        counts[region_id] = counts.get(region_id, 0) + count
+    return counts
+
+
+def compute(queryset, params):
+    from .models import Region, Tour
+
+    counts = {
+        'tour_type': grouped(
+            filtered(queryset, params, FACET_PARAMS['tour_type']), 'tour_type'
+        ),
+        'region': region_counts(filtered(queryset, params, FACET_PARAMS['region'])),
+        'duration': grouped(
+            filtered(queryset, params, FACET_PARAMS['duration']), 'duration_days'
+        ),
+    }
+    buckets = price_buckets()
+    bucket = Case(
+        *[When(price_base__lt=edge, then=Value(index)) for index, edge in enumerate(PRICE_EDGES)],
+        default=Value(len(PRICE_EDGES)),
+        output_field=IntegerField(),
+    )
+    counts['price'] = grouped(
+        filtered(queryset, params, FACET_PARAMS['price']).annotate(bucket=bucket), 'bucket'
+    )
+
+    # Итог - счетчик выбранного типа (фасет типа не применяет только его)
+    selected_type = params.get('tour_type')
+    if selected_type:
+        total = counts['tour_type'].get(selected_type, 0)
+    else:
+        total = sum(counts['tour_type'].values())
+
+    return {
+        'total': total,
+        'facets': {
+            'tour_type': [
+                {'value': value, 'label': label, 'count': counts['tour_type'].get(value, 0)}
+                for value, label in Tour.TOUR_TYPE_CHOICES
+            ],
+            'region': [
+                {'value': pk, 'slug': slug, 'label': name,
+                 'count': counts['region'].get(pk, 0)}
+                for pk, slug, name in Region.objects.values_list('pk', 'slug', 'name')
+            ],
+            'duration': [
+                {'value': days, 'count': count}
+                for days, count in sorted(counts['duration'].items())
+            ],
+            'price': [
+                {'min_price': low, 'max_price': high, 'count': counts['price'].get(index, 0)}
+                for index, (low, high) in enumerate(buckets)
+            ],
+        },
+    }
+
+
+def get_facets(queryset, query_params, cache_models):
+    params = normalize_params(query_params)
+    timeout = settings.RESPONSE_CACHE_TIMEOUT
+    if not timeout:
+        return compute(queryset, params)
+
+    generations = '.'.join(str(g) for g in get_generations(cache_models))
+    key = FACETS_KEY.format(
+        generations=hashlib.md5(generations.encode()).hexdigest(),
+        # has_dates и даты в фильтрах считаются от "сегодня"
+        digest=hashlib.md5(
+            repr((sorted(params.items()), timezone.now().date())).encode()
+        ).hexdigest(),
+    )
+    data = cache.get(key)
+    if data is None:
+        data = compute(queryset, params)
+        if can_store_reads():
+            cache.set(key, data, timeout)
+    return data
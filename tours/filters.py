@@ -1,5 +1,10 @@
 import django_filters
-from .models import Tour
+from django.db.models import Exists, OuterRef
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+from .models import Region, Tour, TourDate
+from .pagination import KeysetPagination
+from .search import search_tours
 
 
 class TourFilter(django_filters.FilterSet):
@@ -9,19 +14,68 @@ class TourFilter(django_filters.FilterSet):
     max_price = django_filters.NumberFilter(field_name='price_base', lookup_expr='lte')
     duration = django_filters.NumberFilter(field_name='duration_days')
     tour_type = django_filters.ChoiceFilter(choices=Tour.TOUR_TYPE_CHOICES)
-    region = django_filters.CharFilter(lookup_expr='icontains')
+    # id, slug, название или вариант написания -> равенство по main_region_id
+    # или вхождение в текст региона (дополнительные регионы тура)
+    region = django_filters.CharFilter(method='filter_region')
     
-    # Фильтр по датам - туры с датами в указанном диапазоне
-    start_date = django_filters.DateFilter(
-        field_name='dates__start_date', 
+    # Фильтры по карточке тура (TourCard) - без JOIN на даты и отзывы
+    min_rating = django_filters.NumberFilter(
+        field_name='rating',
         lookup_expr='gte'
     )
-    end_date = django_filters.DateFilter(
-        field_name='dates__start_date', 
-        lookup_expr='lte'
+    has_dates = django_filters.BooleanFilter(
+        field_name='card__nearest_date',
+        lookup_expr='isnull',
+        exclude=True
     )
     
+    # Фильтр по датам - туры с доступной датой (есть места) в диапазоне.
+    # Оба конца проверяются одним EXISTS по одной и той же дате, без JOIN:
+    # строки туров не размножаются (см. filter_queryset)
+    start_date = django_filters.DateFilter(method='filter_date_range')
+    end_date = django_filters.DateFilter(method='filter_date_range')
+    
     class Meta:
         model = Tour
         fields = ['min_price', 'max_price', 'duration', 'tour_type', 'region', 
-                  'start_date', 'end_date']
+                  'min_rating', 'has_dates', 'start_date', 'end_date']
+    
+    def filter_region(self, queryset, name, value):
+        return queryset.filter(Region.tour_filter(value))
+    
+    def filter_date_range(self, queryset, name, value):
+        return queryset
+    
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        start = self.form.cleaned_data.get('start_date')
+        end = self.form.cleaned_data.get('end_date')
+        if start or end:
+            dates = TourDate.bookable(start, end).filter(tour=OuterRef('pk'))
+            queryset = queryset.filter(Exists(dates))
+        return queryset
+
+
+class TourSearchFilter(BaseFilterBackend):
+    """
+    Полнотекстовый поиск ?search= с учетом словоформ и ранжированием.
+    Без явного ?ordering= результаты сортируются по релевантности,
+    поэтому бэкенд должен стоять после OrderingFilter.
+    """
+    search_param = 'search'
+    ordering_param = 'ordering'
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+        queryset = search_tours(queryset, query)
+        if not request.query_params.get(self.ordering_param):
+            if isinstance(getattr(view, 'paginator', None), KeysetPagination):
+                # Курсор хранит значение поля сортировки, ранг поиска - не поле
+                raise ValidationError({self.search_param: [
+                    'Пагинация курсором работает только с ?ordering=. '
+                    'Результаты по релевантности листаются страницами (?page=)'
+                ]})
+            queryset = queryset.order_by('-search_rank', '-created_at')
+        return queryset
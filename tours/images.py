@@ -0,0 +1,187 @@
+"""
+Уменьшенные WebP-копии фотографий туров и обложек блога.
+
+Копии разных ширин (IMAGE_VARIANT_WIDTHS) создаются после коммита в пуле
+процессов, а не в запросе админки: ресайз - чистый CPU, и в потоке он
+держал бы GIL воркера. Результат - JSON-поле модели:
+{'source': имя оригинала, 'widths': {'320': имя копии, ...}}. Копии с
+другим source устарели (оригинал заменили) и не отдаются.
+
+Имена копий выводятся из имени оригинала, поэтому повторная генерация
+перезаписывает те же файлы (manage.py generate_image_variants).
+"""
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+
+logger = logging.getLogger(__name__)
+
+# Модель -> (поле изображения, поле с копиями)
+IMAGE_FIELDS = {
+    'tours.tourphoto': ('photo', 'variants'),
+    'tours.blogpost': ('cover_image', 'cover_variants'),
+}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def variant_name(name, width):
+    root, _ext = os.path.splitext(name)
+    return f'variants/{root}-{width}.webp'
+
+
+def is_current(variants, name):
+    return bool(name) and bool(variants) and variants.get('source') == name
+
+
+def render_variants(name, widths=None):
+    """Сохранить копии оригинала name, вернуть значение поля с копиями"""
+    from PIL import Image, ImageOps
+
+    widths = sorted(widths or settings.IMAGE_VARIANT_WIDTHS)
+    with default_storage.open(name) as source:
+        image = Image.open(source)
+        # JPEG можно сразу декодировать в меньшем масштабе
+        image.draft('RGB', (widths[-1], widths[-1]))
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    has_alpha = image.mode in ('RGBA', 'LA') or 'transparency' in image.info
+    image = image.convert('RGBA' if has_alpha else 'RGB')
+
+    # Копии не шире оригинала; узкий оригинал - одна копия его ширины
+    targets = [width for width in widths if width < image.width] or [image.width]
+    result = {}
+    for width in targets:
+        height = max(1, round(image.height * width / image.width))
+        resized = image if width == image.width else image.resize(
+            (width, height), Image.Resampling.LANCZOS, reducing_gap=3.0
+        )
+        buffer = BytesIO()
+        resized.save(buffer, 'WEBP', quality=settings.IMAGE_VARIANT_QUALITY, method=4)
+        path = variant_name(name, width)
+        default_storage.delete(path)
+        result[str(width)] = default_storage.save(path, ContentFile(buffer.getvalue()))
+    return {'source': name, 'widths': result}
+
+
+def generate_variants(label, pk, force=False):
+    """Создать копии для объекта; True, если поле с копиями обновлено"""
+    from .cache import bump_generation
+    from .models import TourCard
+
+    model = apps.get_model(label)
+    image_field, variants_field = IMAGE_FIELDS[label]
+    row = model.objects.filter(pk=pk).values(image_field, variants_field).first()
+    if row is None or not row[image_field]:
+        return False
+    name = row[image_field]
+    if not force and is_current(row[variants_field], name):
+        return False
+    try:
+        variants = render_variants(name)
+    except (OSError, ValueError) as exc:
+        logger.warning('Не удалось создать копии %s: %s', name, exc)
+        return False
+    # Оригинал могли заменить, пока шел ресайз - тогда копии не сохраняем.
+    # updated_at меняем, чтобы сменились ETag ответов с этим изображением
+    now = timezone.now()
+    updated = model.objects.filter(pk=pk, **{image_field: name}).update(
+        **{variants_field: variants, 'updated_at': now}
+    )
+    if not updated:
+        return False
+    if label == 'tours.tourphoto':
+        TourCard.objects.filter(cover_photo_id=pk).update(updated_at=now)
+        bump_generation(model, TourCard)
+    else:
+        bump_generation(model)
+    return True
+
+
+def _init_worker():
+    import django
+    django.setup()
+
+
+def get_pool(reset=False):
+    global _pool
+    with _pool_lock:
+        if reset and _pool is not None:
+            _pool.shutdown(wait=False)
+            _pool = None
+        if _pool is None:
+            # spawn: fork процесса с открытыми соединениями к базе небезопасен
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.IMAGE_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+            )
+        return _pool
+
+
+def _log_failure(future):
+    exc = future.exception()
+    if exc is not None:
+        logger.error('Ошибка генерации копий изображения', exc_info=exc)
+
+
+def submit(label, pk, force=False):
+    """Сгенерировать копии в пуле; при IMAGE_WORKERS=0 - в этом процессе"""
+    if not settings.IMAGE_WORKERS:
+        return generate_variants(label, pk, force)
+    try:
+        future = get_pool().submit(generate_variants, label, pk, force)
+    except BrokenProcessPool:
+        # Процесс пула упал (например, убит по памяти) - пул пересоздаем
+        future = get_pool(reset=True).submit(generate_variants, label, pk, force)
+    future.add_done_callback(_log_failure)
+    return future
+
+
+def schedule_variants(instance):
+    """После коммита поставить в очередь генерацию устаревших копий"""
+    label, pk = instance._meta.label_lower, instance.pk
+    image_field, variants_field = IMAGE_FIELDS[label]
+    name = getattr(instance, image_field).name
+    if name and not is_current(getattr(instance, variants_field), name):
+        transaction.on_commit(lambda: submit(label, pk), robust=True)
+
+
+def variant_urls(variants, name):
+    """[(ширина, URL)] актуальных копий по возрастанию ширины"""
+    if not is_current(variants, name):
+        return []
+    return sorted(
+        (int(width), default_storage.url(path))
+        for width, path in variants['widths'].items()
+    )
+
+
+def build_srcset(request, variants, name):
+    """Значение srcset: 'URL 320w, URL 640w', пустая строка без копий"""
+    return ', '.join(
+        f'{request.build_absolute_uri(url) if request else url} {width}w'
+        for width, url in variant_urls(variants, name)
+    )
+
+
+def best_url(variants, name, width):
+    """URL наименьшей копии не уже width (или самой широкой), иначе None"""
+    urls = variant_urls(variants, name)
+    for variant_width, url in urls:
+        if variant_width >= width:
+            return url
+    return urls[-1][1] if urls else None
@@ -0,0 +1,226 @@
+"""
+Очередь заявок с отложенной записью в базу (INGEST_QUEUE).
+
+Проверенные сериализатором заявки, лиды и отзывы записываются файлом в
+каталог INGEST_SPOOL_DIR, и ответ уходит сразу: воркеры веб-сервера не
+ждут блокировку записи SQLite. Команда drain_ingest_queue забирает файлы
+пачками и пишет их в базу одной транзакцией на пачку: лиды и отзывы -
+bulk_create, заявки - по одной со списанием мест условным UPDATE. Если
+пачка не записалась из-за одной записи (например, тур удалили, пока
+заявка ждала в очереди), пачка пишется повторно по одной записи, и
+сломанная уходит в rejected/.
+
+Доставка "хотя бы один раз": файл удаляется только после коммита, а
+повторная доставка не создает дублей - у записей уникальный ingest_id.
+
+Каталоги очереди:
+    incoming/    - ожидают записи, имя '<время>-<ingest_id>.json'
+    processing/  - забраны воркером (переименование атомарно)
+    rejected/    - заявки, которые не удалось записать, с причиной
+"""
+import json
+import os
+import time
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import DataError, IntegrityError, models, transaction
+
+
+INCOMING = 'incoming'
+PROCESSING = 'processing'
+REJECTED = 'rejected'
+
+# Файлы в processing/ дольше этого срока остались от упавшего воркера
+STALE_SECONDS = 300
+
+# Ошибки самой записи: повтор их не исправит. Остальные (например,
+# "database is locked") пробрасываются, и файлы остаются в processing/
+ITEM_ERRORS = (IntegrityError, DataError, ObjectDoesNotExist, TypeError, ValueError)
+
+
+def spool_dir(name):
+    path = Path(settings.INGEST_SPOOL_DIR) / name
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def get_models():
+    from .models import Booking, Lead, Review
+    return {'booking': Booking, 'lead': Lead, 'review': Review}
+
+
+def to_json(validated_data):
+    """Данные сериализатора в JSON: объекты связей - их pk в поле *_id"""
+    data = {}
+    for name, value in validated_data.items():
+        if isinstance(value, models.Model):
+            data[f'{name}_id'] = value.pk
+        elif isinstance(value, uuid.UUID):
+            data[name] = str(value)
+        else:
+            data[name] = value
+    return data
+
+
+def write_file(path, payload):
+    """Записать файл целиком: через временный файл, fsync и rename"""
+    tmp = path.with_suffix('.tmp')
+    with open(tmp, 'w', encoding='utf-8') as file:
+        json.dump(payload, file, ensure_ascii=False)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp, path)
+
+
+def enqueue(kind, validated_data):
+    """Поставить проверенные данные в очередь, вернуть ingest_id"""
+    ingest_id = uuid.uuid4().hex
+    write_file(spool_dir(INCOMING) / f'{time.time_ns()}-{ingest_id}.json', {
+        'id': ingest_id,
+        'kind': kind,
+        'data': to_json(validated_data),
+    })
+    return ingest_id
+
+
+def find(ingest_id):
+    """Состояние заявки в очереди: 'queued', ('rejected', ошибки) или None"""
+    for name in (INCOMING, PROCESSING):
+        if any(spool_dir(name).glob(f'*-{ingest_id}.json')):
+            return 'queued', None
+    path = spool_dir(REJECTED) / f'{ingest_id}.json'
+    if path.exists():
+        return 'rejected', json.loads(path.read_text(encoding='utf-8')).get('errors')
+    return None
+
+
+def recover(stale_seconds=STALE_SECONDS):
+    """Вернуть в incoming/ файлы, брошенные упавшим воркером"""
+    incoming = spool_dir(INCOMING)
+    deadline = time.time() - stale_seconds
+    for path in spool_dir(PROCESSING).glob('*.json'):
+        try:
+            if path.stat().st_mtime < deadline:
+                os.replace(path, incoming / path.name)
+        except FileNotFoundError:
+            pass
+
+
+def claim(batch_size):
+    """Забрать до batch_size файлов в порядке поступления"""
+    processing = spool_dir(PROCESSING)
+    claimed = []
+    for path in sorted(spool_dir(INCOMING).glob('*.json')):
+        target = processing / path.name
+        try:
+            # Параллельный воркер мог забрать файл первым
+            os.replace(path, target)
+        except FileNotFoundError:
+            continue
+        # mtime - время захвата, по нему recover() находит брошенные файлы
+        os.utime(target)
+        claimed.append(target)
+        if len(claimed) >= batch_size:
+            break
+    return claimed
+
+
+def reject(item, errors):
+    write_file(spool_dir(REJECTED) / f'{item["id"]}.json', dict(item, errors=errors))
+
+
+def write_bulk(model, items):
+    """Лиды и отзывы одним INSERT; уже записанные ingest_id пропускаются"""
+    objs = [model(ingest_id=item['id'], **item['data']) for item in items]
+    model.objects.bulk_create(objs, ignore_conflicts=True)
+
+
+def write_bookings(items):
+    """Заявки по одной: места списываются условным UPDATE в Booking.save.
+
+    Возвращает [(item, ошибки)] для заявок, на которые мест не хватило.
+    """
+    from .models import Booking, SeatsUnavailable
+
+    done = set(Booking.objects.filter(
+        ingest_id__in=[item['id'] for item in items]
+    ).values_list('ingest_id', flat=True))
+    rejected = []
+    for item in items:
+        if uuid.UUID(item['id']) in done:
+            continue
+        data = dict(item['data'])
+        hold_token = data.pop('hold_token', None)
+        booking = Booking(ingest_id=item['id'], **data)
+        booking.hold_token = hold_token
+        try:
+            # Savepoint: отказ по одной заявке не откатывает пачку
+            with transaction.atomic():
+                booking.save()
+        except SeatsUnavailable:
+            rejected.append((item, {
+                'people_count': ['Недостаточно мест. Места только что забронировали']
+            }))
+        except IntegrityError:
+            # Заявку уже записал другой воркер; иначе ошибка в самой заявке
+            if not Booking.objects.filter(ingest_id=item['id']).exists():
+                raise
+    return rejected
+
+
+def write(groups):
+    """Записать группы {вид: [записи]} одной транзакцией, вернуть отклоненные"""
+    kinds = get_models()
+    with transaction.atomic():
+        write_bulk(kinds['lead'], groups.get('lead', []))
+        write_bulk(kinds['review'], groups.get('review', []))
+        return write_bookings(groups.get('booking', []))
+
+
+def write_each(groups):
+    """Записать по одной транзакции на запись; сломанные - в отклоненные.
+
+    Ошибки внешних ключей SQLite и PostgreSQL проверяют при коммите,
+    поэтому каждой записи нужна своя транзакция, а не savepoint.
+    """
+    rejected = []
+    for kind, items in groups.items():
+        for item in items:
+            try:
+                rejected += write({kind: [item]})
+            except ITEM_ERRORS as exc:
+                rejected.append((item, {'non_field_errors': [f'Не удалось записать: {exc}']}))
+    return rejected
+
+
+def drain(batch_size=None):
+    """Записать пачку из очереди, вернуть (записано, отклонено)"""
+    batch_size = batch_size or settings.INGEST_BATCH_SIZE
+    claimed = claim(batch_size)
+    if not claimed:
+        return 0, 0
+
+    groups = {kind: [] for kind in get_models()}
+    rejected = []
+    for path in claimed:
+        try:
+            item = json.loads(path.read_text(encoding='utf-8'))
+            groups[item['kind']].append(item)
+        except (ValueError, KeyError) as exc:
+            rejected.append(({'id': path.stem.split('-')[-1], 'file': path.name},
+                             {'non_field_errors': [f'Поврежденный файл: {exc}']}))
+
+    try:
+        rejected += write(groups)
+    except ITEM_ERRORS:
+        # Одна сломанная запись не должна навсегда блокировать пачку
+        rejected += write_each(groups)
+
+    for item, errors in rejected:
+        reject(item, errors)
+    for path in claimed:
+        path.unlink(missing_ok=True)
+    return len(claimed) - len(rejected), len(rejected)
@@ -0,0 +1,233 @@
+import json
+import platform
+import subprocess
+import time
+from contextlib import ExitStack
+from datetime import datetime
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.test import Client, override_settings
+
+from tours.bench import summarize
+from tours.models import Tour, TourDate, Booking, Review, BlogPost
+from tours.urls import router
+
+
+# Дополнительные варианты запросов к спискам (по basename роутера)
+LIST_VARIANTS = {
+    'tour': [
+        '?page=2',
+        '?pagination=cursor',
+        '?pagination=cursor&ordering=-rating',
+        '?search=винный тур',
+        '?min_price=10000&max_price=60000&has_dates=true',
+        '?region=Кахетия&ordering=price_base',
+    ],
+    'review': ['?pagination=cursor'],
+    'blog': ['?pagination=cursor'],
+}
+
+
+def write_payloads():
+    """Тела POST-запросов; запросы выполняются в откатываемой транзакции"""
+    tour_date = TourDate.objects.filter(
+        status='available', available_seats__gt=0
+    ).order_by('pk').first()
+    tour = Tour.objects.filter(is_active=True).order_by('pk').first()
+    payloads = {
+        'lead': {'name': 'Bench', 'phone': '+79000000000', 'source': 'contact_form'},
+    }
+    if tour_date:
+        payloads['booking'] = {
+            'tour_date': tour_date.pk, 'client_name': 'Bench',
+            'client_phone': '+79000000000', 'client_email': 'bench@example.com',
+            'people_count': 1,
+        }
+    if tour:
+        payloads['review'] = {
+            'tour': tour.pk, 'client_name': 'Bench', 'rating': 5, 'text': 'Bench',
+        }
+    return payloads
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный замер всех маршрутов API (tours/urls.py) в процессе, без '
+        'HTTP-сервера: p50/p95/p99, запросов в секунду и число SQL-запросов. '
+        'Результат в JSON, --compare сравнивает с предыдущим замером'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50,
+                            help='Замеряемых запросов на маршрут')
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--cache', action='store_true',
+                            help='Не выключать кэш ответов API')
+        parser.add_argument('--only', nargs='+', help='Только маршруты с этими basename')
+        parser.add_argument('--output', '-o', help='Файл для JSON с результатами')
+        parser.add_argument('--compare', help='JSON предыдущего замера для сравнения')
+
+    def handle(self, *args, **options):
+        timeout = settings.RESPONSE_CACHE_TIMEOUT if options['cache'] else 0
+        self.client = Client()
+        # Замеряются маршруты, а не ограничитель частоты POST-запросов
+        with override_settings(RESPONSE_CACHE_TIMEOUT=timeout, RATE_LIMIT_ENABLED=False):
+            results = [
+                self.measure(scenario, options)
+                for scenario in self.scenarios(options['only'])
+            ]
+
+        report = {'meta': self.meta(options), 'results': results}
+        for result in results:
+            self.stdout.write(
+                f'{result["name"]:<45} {result["status"]:>3} '
+                f'p50 {result["p50_ms"]:>8} мс  p95 {result["p95_ms"]:>8} мс  '
+                f'p99 {result["p99_ms"]:>8} мс  {result["rps"]:>7} запр/с  '
+                f'SQL {result["queries"]}'
+            )
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(report, output, ensure_ascii=False, indent=2)
+        if options['compare']:
+            self.compare(options['compare'], results)
+
+    def scenarios(self, only):
+        """(имя, метод, путь, тело) для каждого маршрута роутера"""
+        payloads = write_payloads()
+        for prefix, viewset, basename in router.registry:
+            if only and basename not in only:
+                continue
+            for route in router.get_routes(viewset):
+                for method, action in route.mapping.items():
+                    if not hasattr(viewset, action):
+                        continue
+                    path = self.route_path(prefix, route, viewset, action)
+                    if path is None:
+                        continue
+                    name = f'{basename}-{action}'
+                    if method == 'get':
+                        yield name, method, path, None
+                        if action == 'list':
+                            for variant in LIST_VARIANTS.get(basename, []):
+                                yield f'{name} {variant}', method, path + variant, None
+                    elif basename in payloads:
+                        yield name, method, path, payloads[basename]
+
+    def route_path(self, prefix, route, viewset, action):
+        url_path = ''
+        if '(?P<' in (getattr(getattr(viewset, action), 'url_path', None) or ''):
+            # Параметр в пути действия (статус заявки из очереди) -
+            # образца для подстановки нет
+            return None
+        if route.detail or '{url_path}' in route.url:
+            extra = getattr(getattr(viewset, action), 'url_path', None)
+            if extra:
+                url_path = f'{extra}/'
+        path = f'/api/{prefix}/'
+        if route.detail:
+            lookup = self.sample_lookup(viewset)
+            if lookup is None:
+                return None
+            path += f'{lookup}/'
+        return path + url_path
+
+    def sample_lookup(self, viewset):
+        field = viewset.lookup_field
+        queryset = getattr(viewset, 'queryset', None)
+        if queryset is None:
+            return None
+        return queryset.order_by('pk').values_list(field, flat=True).first()
+
+    def request(self, method, path, payload):
+        if method == 'get':
+            return self.client.get(path)
+        # Запись откатывается, чтобы замер не менял данные
+        with transaction.atomic():
+            response = self.client.generic(
+                method.upper(), path, json.dumps(payload),
+                content_type='application/json',
+            )
+            transaction.set_rollback(True)
+        return response
+
+    def measure(self, scenario, options):
+        name, method, path, payload = scenario
+        for _ in range(options['warmup']):
+            self.request(method, path, payload)
+
+        # CaptureQueriesContext не подходит: request_started очищает лог запросов.
+        # Счетчик на всех алиасах: GET читает из READ_DATABASES (tours/routers.py)
+        queries = []
+        with ExitStack() as stack:
+            for alias_connection in connections.all():
+                stack.enter_context(alias_connection.execute_wrapper(
+                    lambda execute, sql, *args: queries.append(sql) or execute(sql, *args)
+                ))
+            response = self.request(method, path, payload)
+
+        latencies, errors = [], 0
+        for _ in range(options['requests']):
+            began = time.perf_counter()
+            code = self.request(method, path, payload).status_code
+            latencies.append(time.perf_counter() - began)
+            if code >= 400:
+                errors += 1
+        stats = summarize(latencies, errors, sum(latencies))
+        return {
+            'name': name, 'method': method.upper(), 'path': path,
+            'status': response.status_code, 'queries': len(queries), **stats,
+        }
+
+    def meta(self, options):
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+        return {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'commit': commit,
+            'django': django.get_version(),
+            'python': platform.python_version(),
+            'database': connection.vendor,
+            'response_cache': options['cache'],
+            'requests_per_route': options['requests'],
+            'rows': {
+                model._meta.model_name: model.objects.count()
+                for model in (Tour, TourDate, Review, Booking, BlogPost)
+            },
+        }
+
+    def compare(self, path, results):
+        try:
+            with open(path, encoding='utf-8') as source:
+                previous = {row['name']: row for row in json.load(source)['results']}
+        except (OSError, ValueError, KeyError) as exc:
+            raise CommandError(f'Не удалось прочитать {path}: {exc}')
+
+        self.stdout.write(f'\nСравнение с {path}:')
+        for result in results:
+            before = previous.get(result['name'])
+            if before is None:
+                self.stdout.write(f'{result["name"]:<45} новый маршрут')
+                continue
+            change = self.change(before['p95_ms'], result['p95_ms'])
+            queries = result['queries'] - before['queries']
+            line = (
+                f'{result["name"]:<45} p95 {before["p95_ms"]} -> {result["p95_ms"]} мс '
+                f'({change}), SQL {before["queries"]} -> {result["queries"]}'
+            )
+            regression = queries > 0 or (
+                before['p95_ms'] and result['p95_ms'] > before['p95_ms'] * 1.2
+            )
+            self.stdout.write(self.style.WARNING(line) if regression else line)
+
+    def change(self, before, after):
+        if not before or after is None:
+            return '-'
+        return f'{(after - before) / before * 100:+.0f}%'
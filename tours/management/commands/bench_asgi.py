@@ -0,0 +1,101 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from tours.bench import run_load, wait_for
+from tours.models import Tour
+
+
+SERVERS = {
+    'wsgi': {
+        'args': ['config.wsgi'],
+        'env': {'ASYNC_READ_API': 'False'},
+    },
+    'asgi': {
+        'args': ['config.asgi', '-k', 'uvicorn.workers.UvicornWorker'],
+        'env': {'ASYNC_READ_API': 'True'},
+    },
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность API под gunicorn с WSGI и под '
+        'gunicorn с uvicorn-воркерами (ASGI, асинхронные вьюхи) при одинаковом '
+        'числе воркеров. Нужны установленные gunicorn и uvicorn'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--concurrency', type=int, default=32,
+                            help='Параллельных клиентов')
+        parser.add_argument('--duration', type=float, default=10.0,
+                            help='Секунд нагрузки на каждый сервер')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--no-cache', action='store_true',
+                            help='Выключить кэш ответов (RESPONSE_CACHE_TIMEOUT=0)')
+        parser.add_argument('--servers', nargs='+', choices=SERVERS,
+                            default=list(SERVERS))
+        parser.add_argument('--paths', nargs='+', help='Пути API для нагрузки')
+        parser.add_argument('--json', action='store_true', help='Вывод в JSON')
+
+    def handle(self, *args, **options):
+        if not shutil.which('gunicorn'):
+            raise CommandError('gunicorn не установлен')
+        base = f'http://127.0.0.1:{options["port"]}'
+        urls = [base + path for path in options['paths'] or self.default_paths()]
+
+        results = {}
+        for name in options['servers']:
+            process = self.start(name, options)
+            try:
+                if not wait_for(urls[0]):
+                    raise CommandError(f'{name}: сервер не запустился')
+                results[name] = run_load(
+                    urls, options['concurrency'], options['duration']
+                )
+            finally:
+                process.terminate()
+                process.wait(timeout=30)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(
+            f'Воркеров: {options["workers"]}, клиентов: {options["concurrency"]}, '
+            f'кэш: {"выкл" if options["no_cache"] else "вкл"}'
+        )
+        for name, stats in results.items():
+            self.stdout.write(
+                f'{name}: {stats["rps"]} запр/с, p50 {stats["p50_ms"]} мс, '
+                f'p95 {stats["p95_ms"]} мс, p99 {stats["p99_ms"]} мс, '
+                f'ошибок {stats["errors"]}'
+            )
+
+    def default_paths(self):
+        slug = Tour.objects.filter(is_active=True).values_list('slug', flat=True).first()
+        paths = ['/api/tours/', '/api/tours/?pagination=cursor', '/api/faq/',
+                 '/api/blog/', '/api/tour-operators/', '/api/reviews/']
+        if slug:
+            paths.append(f'/api/tours/{slug}/')
+        return paths
+
+    def start(self, name, options):
+        server = SERVERS[name]
+        env = dict(os.environ, **server['env'])
+        if options['no_cache']:
+            env['RESPONSE_CACHE_TIMEOUT'] = '0'
+        command = [
+            'gunicorn', *server['args'],
+            '--workers', str(options['workers']),
+            '--bind', f'127.0.0.1:{options["port"]}',
+            '--log-level', 'warning',
+        ]
+        return subprocess.Popen(
+            command, cwd=settings.BASE_DIR, env=env, stdout=sys.stderr
+        )
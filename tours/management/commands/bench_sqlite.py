@@ -0,0 +1,151 @@
+import json
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from tours.bench import summarize
+
+
+PROFILES = {
+    # Настройки SQLite Django по умолчанию: журнал отката, без ожидания блокировки
+    'default': {'SQLITE_TUNED': 'False'},
+    # Профиль из config/settings.py: WAL, прагмы и соединения для чтения
+    'tuned': {'SQLITE_TUNED': 'True'},
+}
+
+READ_PATHS = [
+    '/api/tours/',
+    '/api/tours/?page=2',
+    '/api/tours/?tour_type=bus_group&ordering=price_base',
+    '/api/reviews/',
+    '/api/faq/',
+]
+
+
+def run_worker(kind, env, start_at, stop_at, results):
+    """Процесс нагрузки: читатель (GET каталога) или писатель (заявки)"""
+    os.environ.update(env)
+    import django
+    django.setup()
+
+    latencies, errors = [], 0
+    if kind == 'reader':
+        from django.test import Client
+        client = Client()
+        step = lambda position: client.get(READ_PATHS[position % len(READ_PATHS)]).status_code < 400
+    else:
+        from django.db import OperationalError
+        from tours.models import Booking, SeatsUnavailable, TourDate
+        date_ids = list(TourDate.bookable().values_list('pk', flat=True))
+        if not date_ids:
+            results.put((kind, [], 0))
+            return
+
+        def step(position):
+            try:
+                Booking.objects.create(
+                    tour_date_id=date_ids[position % len(date_ids)],
+                    client_name='Bench', client_phone='+79000000000',
+                    client_email='bench@example.com', people_count=1,
+                )
+            except SeatsUnavailable:
+                pass
+            except OperationalError:
+                # "database is locked": писатель не дождался блокировки
+                return False
+            return True
+
+    # Первый запрос до старта: подключение и импорты не входят в замер
+    step(os.getpid())
+    time.sleep(max(0.0, start_at - time.time()))
+    position = os.getpid()
+    while time.time() < stop_at:
+        position += 1
+        began = time.perf_counter()
+        if step(position):
+            latencies.append(time.perf_counter() - began)
+        else:
+            errors += 1
+    results.put((kind, latencies, errors))
+
+
+class Command(BaseCommand):
+    help = (
+        'Замер SQLite под конкурентной нагрузкой: процессы-читатели '
+        'запрашивают каталог, пока процессы-писатели создают заявки. '
+        'Сравнивает настройки Django по умолчанию и профиль SQLITE_TUNED. '
+        'Работает на копии текущей базы'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--duration', type=float, default=5.0,
+                            help='Секунд нагрузки на каждый профиль')
+        parser.add_argument('--profiles', nargs='+', choices=PROFILES, default=list(PROFILES))
+        parser.add_argument('--output', '-o', help='Файл для JSON с результатами')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Замер только для SQLite (без DATABASE_URL)')
+        source = connection.settings_dict['NAME']
+
+        report = {}
+        with tempfile.TemporaryDirectory() as directory:
+            for profile in options['profiles']:
+                path = os.path.join(directory, f'{profile}.sqlite3')
+                self.copy(source, path)
+                report[profile] = self.measure(path, PROFILES[profile], options)
+                for kind, stats in report[profile].items():
+                    self.stdout.write(
+                        f'{profile:<8} {kind:<7} {stats["rps"] or 0:>8} в с  '
+                        f'p50 {stats["p50_ms"]} мс  p95 {stats["p95_ms"]} мс  '
+                        f'p99 {stats["p99_ms"]} мс  ошибок {stats["errors"]}'
+                    )
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(report, output, ensure_ascii=False, indent=2)
+
+    def copy(self, source, path):
+        """Согласованная копия базы; журнал - как у новой базы (DELETE)"""
+        with sqlite3.connect(source) as src, sqlite3.connect(path) as dst:
+            src.backup(dst)
+            dst.execute('PRAGMA journal_mode=DELETE')
+
+    def measure(self, path, profile_env, options):
+        env = {
+            **profile_env,
+            'SQLITE_PATH': path,
+            'RESPONSE_CACHE_TIMEOUT': '0',
+            'RATE_LIMIT_ENABLED': 'False',
+            'REQUEST_METRICS': 'False',
+        }
+        context = multiprocessing.get_context('spawn')
+        results = context.Queue()
+        # Запуск процессов и django.setup() занимают пару секунд
+        start_at = time.time() + 3
+        stop_at = start_at + options['duration']
+        kinds = ['reader'] * options['readers'] + ['writer'] * options['writers']
+        processes = [
+            context.Process(target=run_worker, args=(kind, env, start_at, stop_at, results))
+            for kind in kinds
+        ]
+        for process in processes:
+            process.start()
+        collected = {'reader': ([], 0), 'writer': ([], 0)}
+        for _ in processes:
+            kind, latencies, errors = results.get()
+            total, failed = collected[kind]
+            collected[kind] = (total + latencies, failed + errors)
+        for process in processes:
+            process.join()
+        return {
+            kind: summarize(latencies, errors, options['duration'])
+            for kind, (latencies, errors) in collected.items()
+            if kind in kinds
+        }
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from tours.cache import CachedResponseMixin, get_stats
+from tours.urls import router
+
+
+class Command(BaseCommand):
+    help = 'Показывает долю попаданий в кэш ответов API по вьюхам'
+
+    def handle(self, *args, **options):
+        names = [
+            f'{basename}-{action}'
+            for _, viewset, basename in router.registry
+            if issubclass(viewset, CachedResponseMixin)
+            for action in ('list', 'retrieve')
+        ]
+        total_hits = total_misses = 0
+        for name, (hits, misses) in get_stats(names).items():
+            total_hits += hits
+            total_misses += misses
+            self.stdout.write(f'{name:<28} {self.format(hits, misses)}')
+        self.stdout.write(self.style.SUCCESS(
+            f'{"Всего":<28} {self.format(total_hits, total_misses)}'
+        ))
+
+    def format(self, hits, misses):
+        requests = hits + misses
+        ratio = hits / requests * 100 if requests else 0
+        return f'попаданий {hits:>8}, промахов {misses:>8}, hit rate {ratio:5.1f}%'
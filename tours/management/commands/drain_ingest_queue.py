@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from tours import ingest
+
+
+class Command(BaseCommand):
+    help = (
+        'Записывает в базу заявки, лиды и отзывы из очереди INGEST_SPOOL_DIR '
+        'пачками по транзакции. Запускайте постоянно с --interval, '
+        'если включен INGEST_QUEUE'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Заявок в транзакции (по умолчанию INGEST_BATCH_SIZE)')
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Проверять очередь каждые N секунд (0 - разобрать и выйти)')
+
+    def handle(self, *args, **options):
+        ingest.recover()
+        interval = options['interval']
+        while True:
+            written, rejected = ingest.drain(options['batch_size'])
+            if written or rejected:
+                self.stdout.write(f'Записано: {written}, отклонено: {rejected}')
+                # Пока в очереди есть файлы, разбираем без паузы
+                continue
+            if not interval:
+                self.stdout.write(self.style.SUCCESS('Очередь пуста'))
+                return
+            connection.close()
+            time.sleep(interval)
+            ingest.recover()
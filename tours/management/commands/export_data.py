@@ -0,0 +1,56 @@
+from datetime import datetime, time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from tours.export import CHUNK_SIZE, FORMATS, export_lines
+from tours.models import Booking, Lead
+
+
+MODELS = {'bookings': Booking, 'leads': Lead}
+
+
+class Command(BaseCommand):
+    help = 'Потоковая выгрузка бронирований или лидов в CSV / JSON Lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', choices=MODELS, help='Что выгружать')
+        parser.add_argument('--format', choices=FORMATS, default='csv')
+        parser.add_argument('--output', '-o', help='Файл (по умолчанию stdout)')
+        parser.add_argument('--status', help='Только с этим статусом')
+        parser.add_argument('--since', help='Созданные с даты (ГГГГ-ММ-ДД)')
+        parser.add_argument('--until', help='Созданные до даты включительно')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help='Строк за одно чтение из базы')
+
+    def handle(self, *args, **options):
+        queryset = MODELS[options['model']].objects.all()
+        if options['status']:
+            queryset = queryset.filter(status=options['status'])
+        if options['since']:
+            queryset = queryset.filter(created_at__gte=self.parse_date(options['since']))
+        if options['until']:
+            queryset = queryset.filter(
+                created_at__lte=self.parse_date(options['until'], time.max)
+            )
+
+        lines = export_lines(queryset, options['format'], options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                count = 0
+                for line in lines:
+                    output.write(line)
+                    count += 1
+            if options['format'] == 'csv':
+                count -= 1  # заголовок
+            self.stderr.write(self.style.SUCCESS(f'Выгружено строк: {count}'))
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
+
+    def parse_date(self, value, at=time.min):
+        try:
+            day = datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError(f'Неверная дата: {value}')
+        return timezone.make_aware(datetime.combine(day, at))
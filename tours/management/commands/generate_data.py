@@ -0,0 +1,229 @@
+import random
+import time
+from collections import Counter
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from tours.cache import bump_generation
+from tours.models import (
+    TourOperator, Tour, TourDate, Booking, Review, TourCard, SearchTerm, Region
+)
+from tours.search import rebuild_index
+
+
+# Объем данных на единицу --scale; --scale 100 - 100 тыс. туров,
+# ~1 млн дат, ~5 млн отзывов, ~1 млн бронирований
+TOURS_PER_SCALE = 1000
+OPERATORS_PER_SCALE = 10
+DATES_PER_TOUR = (5, 15)
+REVIEWS_PER_TOUR = (0, 100)
+BOOKINGS_PER_DATE = (0, 2)
+DATE_RANGE = range(-60, 366)
+
+REGIONS = ['Тбилиси', 'Кахетия', 'Казбеги', 'Батуми', 'Имеретия', 'Сванетия',
+           'Аджария', 'Мцхета', 'Боржоми', 'Рача', 'Гурия', 'Самцхе-Джавахети']
+THEMES = ['винный тур', 'горный поход', 'гастрономический тур', 'экскурсия',
+          'путешествие', 'выходные', 'фототур', 'треккинг', 'знакомство']
+ADJECTIVES = ['Древняя', 'Солнечная', 'Горная', 'Винная', 'Незабываемая',
+              'Тайная', 'Классическая', 'Большая', 'Уютная', 'Легендарная']
+SIGHTS = ['крепость Нарикала', 'монастырь Джвари', 'Алазанская долина',
+          'серные бани', 'Гергетская Троица', 'пещерный город Уплисцихе',
+          'ботанический сад', 'каньон Мартвили', 'озеро Рица', 'город Сигнахи']
+NAMES = ['Анна', 'Иван', 'Мария', 'Петр', 'Ольга', 'Дмитрий', 'Елена', 'Сергей',
+         'Наталья', 'Алексей', 'Татьяна', 'Михаил']
+CITIES = ['Москва', 'Санкт-Петербург', 'Казань', 'Краснодар', 'Екатеринбург',
+          'Новосибирск', 'Ростов-на-Дону', 'Сочи']
+REVIEW_TEXTS = ['Отличный тур, все понравилось!', 'Гид - профессионал своего дела.',
+                'Хорошая организация, но мало свободного времени.',
+                'Вино и кухня - выше всяких похвал.', 'Дорога утомила, но виды того стоят.']
+
+RATING_WEIGHTS = [5, 5, 15, 35, 40]
+MODERATION_WEIGHTS = {'approved': 85, 'pending': 10, 'rejected': 5}
+
+
+class Command(BaseCommand):
+    help = (
+        'Генерирует синтетические данные заданного объема для нагрузочных '
+        'замеров (bulk_create пачками, воспроизводимо при одинаковом --seed). '
+        'Существующие данные не удаляются без --clear'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=1.0,
+                            help=f'Множитель объема: 1 = {TOURS_PER_SCALE} туров')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Туров за один проход (со всеми датами и отзывами)')
+        parser.add_argument('--batch-size', type=int, default=2000,
+                            help='Строк в одном INSERT')
+        parser.add_argument('--clear', action='store_true',
+                            help='Удалить туры, бронирования и отзывы перед генерацией')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.today = timezone.now().date()
+        total_tours = max(1, round(TOURS_PER_SCALE * options['scale']))
+        began = time.perf_counter()
+
+        if options['clear']:
+            self.clear()
+
+        operators = self.create_operators(
+            max(1, round(OPERATORS_PER_SCALE * options['scale']))
+        )
+        self.regions = [Region.objects.get_or_create(name=name)[0] for name in REGIONS]
+        start = Tour.objects.count()
+        self.created = Counter()
+        for offset in range(0, total_tours, options['chunk_size']):
+            size = min(options['chunk_size'], total_tours - offset)
+            with transaction.atomic():
+                self.create_chunk(operators, start + offset, size)
+            self.stdout.write(
+                f'Туров: {offset + size}/{total_tours} '
+                f'({time.perf_counter() - began:.0f} с)'
+            )
+
+        # bulk_create не вызывает сигналы: денормализованные данные - целиком
+        self.stdout.write('Пересчет карточек и поискового индекса...')
+        TourCard.refresh(batch_size=self.batch_size)
+        rebuild_index(batch_size=self.batch_size)
+        bump_generation(TourOperator, Tour, TourDate, Review, TourCard, Region)
+
+        summary = ', '.join(f'{name}: {count}' for name, count in self.created.items())
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано за {time.perf_counter() - began:.1f} с - {summary}'
+        ))
+
+    def clear(self):
+        self.stdout.write('Очистка туров, бронирований и отзывов...')
+        Booking.objects.all().delete()
+        for model in (Review, SearchTerm, TourCard, TourDate):
+            model.objects.all().delete()
+        Tour.objects.all().delete()
+
+    def create_operators(self, count):
+        existing = list(TourOperator.objects.filter(name__startswith='Оператор №'))
+        operators = [
+            TourOperator(name=f'Оператор №{number}', phone='+7 900 000-00-00',
+                         email=f'operator{number}@example.com')
+            for number in range(len(existing) + 1, count + 1)
+        ]
+        TourOperator.objects.bulk_create(operators, batch_size=self.batch_size)
+        return (existing + operators)[:count]
+
+    def create_chunk(self, operators, number, size):
+        rng = self.rng
+        tours, review_plans = [], []
+        for n in range(number, number + size):
+            reviews = [self.plan_review() for _ in range(rng.randint(*REVIEWS_PER_TOUR))]
+            tours.append(self.make_tour(n, rng.choice(operators), reviews))
+            review_plans.append(reviews)
+        Tour.objects.bulk_create(tours, batch_size=self.batch_size)
+
+        dates, booking_plans = [], []
+        for tour in tours:
+            # Даты тура уникальны (tour, start_date)
+            for days in rng.sample(DATE_RANGE, rng.randint(*DATES_PER_TOUR)):
+                date, bookings = self.make_date(tour, self.today + timedelta(days=days))
+                dates.append(date)
+                booking_plans.append(bookings)
+        TourDate.objects.bulk_create(dates, batch_size=self.batch_size)
+
+        bookings = [
+            self.make_booking(date, people)
+            for date, plan in zip(dates, booking_plans) for people in plan
+        ]
+        Booking.objects.bulk_create(bookings, batch_size=self.batch_size)
+
+        reviews = [
+            Review(tour=tour, client_name=rng.choice(NAMES), client_city=rng.choice(CITIES),
+                   rating=rating, text=rng.choice(REVIEW_TEXTS), moderation_status=status)
+            for tour, plan in zip(tours, review_plans) for rating, status in plan
+        ]
+        Review.objects.bulk_create(reviews, batch_size=self.batch_size)
+
+        self.created.update({
+            'туров': len(tours), 'дат': len(dates),
+            'бронирований': len(bookings), 'отзывов': len(reviews),
+        })
+
+    def plan_review(self):
+        rating = self.rng.choices(range(1, 6), RATING_WEIGHTS)[0]
+        status = self.rng.choices(list(MODERATION_WEIGHTS), MODERATION_WEIGHTS.values())[0]
+        return rating, status
+
+    def make_tour(self, n, operator, reviews):
+        rng = self.rng
+        region = rng.choice(self.regions)
+        theme = rng.choice(THEMES)
+        sights = rng.sample(SIGHTS, 3)
+        duration = rng.randint(1, 10)
+        # Статистика отзывов считается здесь же: bulk_create не вызывает сигналы
+        histogram = Counter(rating for rating, status in reviews if status == 'approved')
+        count = sum(histogram.values())
+        total = sum(rating * times for rating, times in histogram.items())
+        return Tour(
+            title=f'{rng.choice(ADJECTIVES)} {region}: {theme} ({duration} дн.)',
+            slug=f'tour-{n}-{rng.getrandbits(32):08x}',
+            description_short=f'{theme.capitalize()} по региону {region}: {sights[0]}',
+            description_full=(
+                f'{theme.capitalize()} по региону {region}. В программе '
+                f'{", ".join(sights)}. Дегустации, местная кухня и лучшие виды.'
+            ),
+            price_base=Decimal(rng.randrange(5000, 150000, 500)),
+            duration_days=duration,
+            tour_type=rng.choice([choice for choice, label in Tour.TOUR_TYPE_CHOICES]),
+            max_people=rng.choice([8, 12, 20, 30]),
+            tour_operator=operator,
+            region=region.name,
+            main_region=region,
+            included='Проживание, трансферы, экскурсии',
+            not_included='Перелет, страховка',
+            program_by_days=[
+                {'day': day, 'title': f'День {day}', 'description': rng.choice(SIGHTS)}
+                for day in range(1, duration + 1)
+            ],
+            rating=round(Decimal(total) / count, 2) if count else Decimal(0),
+            rating_count=count,
+            rating_sum=total,
+            **{f'rating_{star}': histogram[star] for star in range(1, 6)},
+            is_active=rng.random() > 0.05,
+        )
+
+    def make_date(self, tour, start):
+        rng = self.rng
+        total = rng.choice([10, 15, 20, 25, 30])
+        left = total
+        bookings = []
+        for _ in range(rng.randint(*BOOKINGS_PER_DATE)):
+            people = min(rng.randint(1, 4), left)
+            if people:
+                bookings.append(people)
+                left -= people
+        date = TourDate(
+            tour=tour,
+            start_date=start,
+            end_date=start + timedelta(days=tour.duration_days - 1),
+            total_seats=total,
+            available_seats=left,
+            status='full' if left == 0 else 'available',
+        )
+        return date, bookings
+
+    def make_booking(self, date, people):
+        rng = self.rng
+        return Booking(
+            tour_date=date,
+            client_name=rng.choice(NAMES),
+            client_phone=f'+79{rng.randrange(10 ** 9):09d}',
+            client_email=f'client{rng.randrange(10 ** 6)}@example.com',
+            people_count=people,
+            total_price=date.tour.price_base * people,
+            source=rng.choice([choice for choice, label in Booking.SOURCE_CHOICES]),
+            status=rng.choice(['new', 'confirmed', 'confirmed', 'completed']),
+        )
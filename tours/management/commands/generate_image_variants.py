@@ -0,0 +1,55 @@
+from concurrent.futures import as_completed
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from tours.images import IMAGE_FIELDS, generate_variants, get_pool, is_current
+
+
+class Command(BaseCommand):
+    help = (
+        'Создает WebP-копии фотографий туров и обложек блога, которых нет '
+        'или которые устарели. Повторный запуск ничего не делает; --force '
+        'пересоздает все копии (например, после смены IMAGE_VARIANT_WIDTHS)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help='Пересоздать и актуальные копии')
+        parser.add_argument('--models', nargs='+', choices=IMAGE_FIELDS,
+                            default=list(IMAGE_FIELDS))
+
+    def handle(self, *args, **options):
+        jobs = [
+            (label, pk)
+            for label in options['models']
+            for pk in self.pending(label, options['force'])
+        ]
+        if not jobs:
+            self.stdout.write(self.style.SUCCESS('Все копии актуальны'))
+            return
+
+        self.stdout.write(f'Изображений к обработке: {len(jobs)}')
+        if settings.IMAGE_WORKERS:
+            pool = get_pool()
+            futures = [pool.submit(generate_variants, label, pk, options['force'])
+                       for label, pk in jobs]
+            results = [future.result() for future in as_completed(futures)]
+        else:
+            results = [generate_variants(label, pk, options['force'])
+                       for label, pk in jobs]
+        done = sum(results)
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано копий для {done} изображений, пропущено {len(jobs) - done}'
+        ))
+
+    def pending(self, label, force):
+        model = apps.get_model(label)
+        image_field, variants_field = IMAGE_FIELDS[label]
+        rows = model.objects.exclude(**{image_field: ''}).exclude(
+            **{f'{image_field}__isnull': True}
+        ).values_list('pk', image_field, variants_field)
+        for pk, name, variants in rows.iterator():
+            if force or not is_current(variants, name):
+                yield pk
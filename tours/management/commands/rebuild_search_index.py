@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from tours.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает поисковый индекс туров (SQLite; на PostgreSQL не нужен)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Размер пачки для записи индекса'
+        )
+
+    def handle(self, *args, **options):
+        count = rebuild_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Проиндексировано туров: {count}'))
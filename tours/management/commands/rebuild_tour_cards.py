@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from tours.models import TourCard
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает карточки туров для каталога. Ближайшая дата '
+        'сдвигается со временем: --stale --interval 3600 постоянно '
+        'пересчитывает карточки с прошедшей датой (процесс cards в Procfile)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Размер пачки для записи карточек'
+        )
+        parser.add_argument(
+            '--stale', action='store_true',
+            help='Только карточки без ближайшей даты в будущем и туры без карточек'
+        )
+        parser.add_argument(
+            '--interval', type=int, default=0,
+            help='Повторять каждые N секунд (0 - один проход)'
+        )
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        while True:
+            tour_ids = list(TourCard.stale_tour_ids()) if options['stale'] else None
+            count = 0
+            if tour_ids is None or tour_ids:
+                count = TourCard.refresh(tour_ids, batch_size=options['batch_size'])
+            # Карточки удаленных туров удаляются каскадно, лишних строк нет
+            if count or not interval:
+                self.stdout.write(self.style.SUCCESS(f'Обновлено карточек: {count}'))
+            if not interval:
+                return
+            # Между проходами соединение не держим
+            connection.close()
+            time.sleep(interval)
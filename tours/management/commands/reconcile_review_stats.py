@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from tours.cache import bump_generation
+from tours.models import Tour, TourCard
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверяет статистику отзывов туров (средняя, количество, гистограмма) '
+        'с одобренными отзывами и исправляет расхождения'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Размер пачки для чтения и записи туров'
+        )
+
+    def handle(self, *args, **options):
+        fixed = Tour.reconcile_ratings(batch_size=options['batch_size'])
+        if fixed:
+            TourCard.refresh(fixed, batch_size=options['batch_size'])
+            bump_generation(Tour)
+        self.stdout.write(self.style.SUCCESS(f'Исправлено туров: {len(fixed)}'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from tours.models import TourDate
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверяет свободные места и статус дат туров с активными заявками '
+        'и удержаниями мест и исправляет расхождения. Один проход SQL - '
+        'можно запускать по cron каждые несколько минут'
+    )
+
+    def handle(self, *args, **options):
+        fixed = TourDate.reconcile_seats()
+        self.stdout.write(self.style.SUCCESS(f'Исправлено дат: {len(fixed)}'))
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from tours.models import SeatHold
+
+
+class Command(BaseCommand):
+    help = (
+        'Возвращает на даты места истекших удержаний (/api/holds/). '
+        'Запускайте по cron раз в минуту или постоянно с --interval'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=int, default=0,
+            help='Повторять каждые N секунд (0 - один проход)'
+        )
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        while True:
+            released = SeatHold.objects.expired().release()
+            if released or not interval:
+                self.stdout.write(self.style.SUCCESS(f'Снято удержаний: {released}'))
+            if not interval:
+                return
+            # Между проходами соединение не держим
+            connection.close()
+            time.sleep(interval)
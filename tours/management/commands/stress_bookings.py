@@ -0,0 +1,123 @@
+import threading
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, OperationalError
+from django.db.models import Sum
+from django.utils import timezone
+
+from tours.models import TourOperator, Tour, TourDate, Booking, SeatsUnavailable
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочная проверка бронирования: несколько потоков одновременно '
+        'бронируют одну дату. Проверяет отсутствие овербукинга и считает '
+        'бронирований в секунду на текущей базе (SQLite или PostgreSQL)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help='Число потоков')
+        parser.add_argument('--attempts', type=int, default=50,
+                            help='Попыток бронирования на поток')
+        parser.add_argument('--seats', type=int, default=200, help='Мест на дате')
+        parser.add_argument('--people', type=int, default=1, help='Человек в заявке')
+        parser.add_argument('--keep', action='store_true',
+                            help='Не удалять созданные тестовые данные')
+
+    def handle(self, *args, **options):
+        tour_date = self.create_fixture(options['seats'])
+        stats = {'booked': 0, 'sold_out': 0, 'locked': 0}
+        lock = threading.Lock()
+        start = threading.Barrier(options['threads'])
+
+        def worker(number):
+            start.wait()
+            try:
+                for attempt in range(options['attempts']):
+                    try:
+                        Booking.objects.create(
+                            tour_date_id=tour_date.pk,
+                            client_name=f'Stress {number}-{attempt}',
+                            client_phone='+79000000000',
+                            client_email='stress@example.com',
+                            people_count=options['people'],
+                        )
+                        result = 'booked'
+                    except SeatsUnavailable:
+                        result = 'sold_out'
+                    except OperationalError:
+                        # SQLite: "database is locked" при конкурентной записи
+                        result = 'locked'
+                    with lock:
+                        stats[result] += 1
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=worker, args=(number,))
+            for number in range(options['threads'])
+        ]
+        began = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - began
+
+        tour_date.refresh_from_db()
+        booked_people = Booking.objects.filter(tour_date=tour_date).aggregate(
+            total=Sum('people_count')
+        )['total'] or 0
+        oversold = max(0, booked_people - tour_date.total_seats)
+        consistent = tour_date.available_seats == tour_date.total_seats - booked_people
+
+        self.stdout.write(f'База: {connection.vendor}, потоков: {options["threads"]}')
+        self.stdout.write(
+            f'Успешно: {stats["booked"]}, мест нет: {stats["sold_out"]}, '
+            f'блокировки: {stats["locked"]}'
+        )
+        self.stdout.write(
+            f'Забронировано мест: {booked_people} из {tour_date.total_seats}, '
+            f'осталось: {tour_date.available_seats} ({tour_date.status})'
+        )
+        self.stdout.write(f'Бронирований в секунду: {stats["booked"] / elapsed:.1f}')
+
+        if not options['keep']:
+            self.delete_fixture(tour_date)
+
+        if oversold or not consistent:
+            self.stderr.write(self.style.ERROR(
+                f'Овербукинг: {oversold}, счетчик мест согласован: {consistent}'
+            ))
+            raise SystemExit(1)
+        self.stdout.write(self.style.SUCCESS('Овербукинга нет'))
+
+    def create_fixture(self, seats):
+        operator = TourOperator.objects.create(name='Stress test operator')
+        tour = Tour.objects.create(
+            title='Stress test tour',
+            description_short='stress',
+            description_full='stress',
+            price_base=1000,
+            duration_days=1,
+            tour_type='bus_group',
+            included='-',
+            not_included='-',
+            tour_operator=operator,
+            is_active=False,
+        )
+        return TourDate.objects.create(
+            tour=tour,
+            start_date=timezone.now().date() + timedelta(days=365),
+            total_seats=seats,
+            available_seats=seats,
+        )
+
+    def delete_fixture(self, tour_date):
+        tour = tour_date.tour
+        operator = tour.tour_operator
+        Booking.objects.filter(tour_date=tour_date).delete()
+        tour.delete()
+        operator.delete()
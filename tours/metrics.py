@@ -0,0 +1,137 @@
+"""
+Метрики запроса: SQL, время базы, сериализация и кэш ответов.
+
+Текущие метрики хранятся в contextvar: sync_to_async копирует контекст
+в поток, поэтому запросы асинхронных вьюх тоже учитываются. Обертка
+execute ставится на каждое соединение один раз (сигнал connection_created)
+и вне запроса сводится к чтению contextvar.
+
+Тексты SQL копятся как есть (параметры Django передает отдельно),
+нормализуются только при записи медленного запроса.
+"""
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+
+_current = ContextVar('request_metrics', default=None)
+
+SQL_STRING = re.compile(r"'(?:[^']|'')*'")
+SQL_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+SQL_IN_LIST = re.compile(r'\bIN\s*\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)', re.IGNORECASE)
+SQL_SPACES = re.compile(r'\s+')
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        # sql -> [число выполнений, суммарное время]
+        self.statements = {}
+        # имя -> [суммарное время, активен ли замер]
+        self.timings = {}
+        self.cache = {}
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def add_query(self, sql, duration):
+        self.queries += 1
+        self.db_time += duration
+        statement = self.statements.get(sql)
+        if statement is None:
+            self.statements[sql] = [1, duration]
+        else:
+            statement[0] += 1
+            statement[1] += duration
+
+    def top_statements(self, limit):
+        """Самые дорогие запросы, одинаковые после нормализации - вместе"""
+        merged = {}
+        for sql, (count, duration) in self.statements.items():
+            row = merged.setdefault(normalize_sql(sql), [0, 0.0])
+            row[0] += count
+            row[1] += duration
+        rows = sorted(merged.items(), key=lambda item: item[1][1], reverse=True)
+        return [
+            {'sql': sql, 'count': count, 'ms': round(duration * 1000, 2)}
+            for sql, (count, duration) in rows[:limit]
+        ]
+
+    def server_timing(self):
+        """Значение заголовка Server-Timing"""
+        parts = [f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} SQL"']
+        for name, (duration, _active) in self.timings.items():
+            parts.append(f'{name};dur={duration * 1000:.1f}')
+        for outcome, count in self.cache.items():
+            parts.append(f'cache-{outcome};desc="{count}"')
+        parts.append(f'total;dur={self.elapsed * 1000:.1f}')
+        return ', '.join(parts)
+
+
+def normalize_sql(sql):
+    """Литералы - в '?', списки IN (...) любой длины - в один вид"""
+    sql = SQL_STRING.sub('?', sql)
+    sql = SQL_NUMBER.sub('?', sql)
+    sql = SQL_IN_LIST.sub('IN (...)', sql)
+    return SQL_SPACES.sub(' ', sql).strip()
+
+
+def start():
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def stop(token):
+    _current.reset(token)
+
+
+def execute_wrapper(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    began = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.add_query(sql, time.perf_counter() - began)
+
+
+def install_execute_wrapper(sender, connection, **kwargs):
+    """Приемник connection_created; повторное подключение обертку не дублирует"""
+    if execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(execute_wrapper)
+
+
+def record_cache(outcome):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.cache[outcome] = metrics.cache.get(outcome, 0) + 1
+
+
+@contextmanager
+def timer(name):
+    """Замер участка; вложенные замеры с тем же именем не считаются дважды"""
+    metrics = _current.get()
+    timing = metrics.timings.setdefault(name, [0.0, False]) if metrics else None
+    if timing is None or timing[1]:
+        yield
+        return
+    timing[1] = True
+    began = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing[0] += time.perf_counter() - began
+        timing[1] = False
+
+
+class TimedSerializerMixin:
+    """Время to_representation учитывается в метрике serialize"""
+
+    def to_representation(self, instance):
+        with timer('serialize'):
+            return super().to_representation(instance)
@@ -0,0 +1,180 @@
+import json
+import logging
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import JsonResponse
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from . import metrics, ratelimit
+from .routers import read_only_request, reads_from_replica, stick_to_primary
+
+
+slow_logger = logging.getLogger('tours.slow_requests')
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise, который не выбивает ASGI-запросы из event loop.
+
+    Обычный WhiteNoiseMiddleware только синхронный: под ASGI Django из-за
+    него гоняет каждый запрос через поток (sync_to_async/async_to_sync).
+    Поиск файла - это обращение к словарю в памяти, поэтому его можно
+    выполнять прямо в event loop.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = self.find_file(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
+
+
+class ReadOnlyRequestMiddleware:
+    """
+    Чтения в GET/HEAD-запросах - на READ_DATABASES (см. routers.py).
+
+    После успешной записи клиент на время читает из основной базы.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = read_only_request.set(reads_from_replica(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            read_only_request.reset(token)
+        stick_to_primary(request, response)
+        return response
+
+    async def __acall__(self, request):
+        token = read_only_request.set(reads_from_replica(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            read_only_request.reset(token)
+        stick_to_primary(request, response)
+        return response
+
+
+class RequestMetricsMiddleware:
+    """
+    Метрики запроса в заголовке Server-Timing и журнал медленных запросов.
+
+    Учитываются число SQL-запросов и время базы, время сериализации и
+    попадания в кэш ответов (см. metrics.py). Запросы дольше
+    SLOW_REQUEST_MS пишутся в журнал tours.slow_requests одной JSON-строкой
+    с самыми дорогими SQL. Включается настройкой REQUEST_METRICS.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.REQUEST_METRICS:
+            return self.get_response(request)
+        current, token = metrics.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.stop(token)
+        return self.finish(request, response, current)
+
+    async def __acall__(self, request):
+        if not settings.REQUEST_METRICS:
+            return await self.get_response(request)
+        current, token = metrics.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.stop(token)
+        return self.finish(request, response, current)
+
+    def finish(self, request, response, current):
+        response['Server-Timing'] = current.server_timing()
+        elapsed = current.elapsed * 1000
+        if elapsed >= settings.SLOW_REQUEST_MS:
+            slow_logger.warning(json.dumps({
+                'event': 'slow_request',
+                'method': request.method,
+                'path': request.get_full_path(),
+                'status': response.status_code,
+                'ms': round(elapsed, 1),
+                'queries': current.queries,
+                'db_ms': round(current.db_time * 1000, 1),
+                'timings_ms': {
+                    name: round(duration * 1000, 1)
+                    for name, (duration, _active) in current.timings.items()
+                },
+                'cache': current.cache,
+                'top_sql': current.top_statements(settings.SLOW_REQUEST_TOP_SQL),
+            }, ensure_ascii=False))
+        return response
+
+
+class RateLimitMiddleware:
+    """
+    Ответ 429 с Retry-After для маршрутов из RATE_LIMITS (см. ratelimit.py).
+
+    Проверка идет до разбора тела и вьюхи DRF: отказ стоит одного
+    обращения к файлу ведер. Стоит после CorsMiddleware, чтобы браузер
+    увидел 429, а не ошибку CORS. Включается настройкой RATE_LIMIT_ENABLED.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.reject(request) or self.get_response(request)
+
+    async def __acall__(self, request):
+        # Обращение к локальному файлу с коротким таймаутом - прямо в event loop
+        return self.reject(request) or await self.get_response(request)
+
+    def reject(self, request):
+        if not settings.RATE_LIMIT_ENABLED:
+            return None
+        retry_after = ratelimit.check(request)
+        if retry_after is None:
+            return None
+        response = JsonResponse(
+            {'detail': f'Слишком много запросов. Повторите через {retry_after} с.'},
+            status=429,
+        )
+        response['Retry-After'] = str(retry_after)
+        return response
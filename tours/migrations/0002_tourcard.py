@@ -0,0 +1,31 @@
+# Generated by Django 6.0.1 on 2026-10-18 07:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tours', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TourCard',
+            fields=[
+                ('tour', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='card', serialize=False, to='tours.tour', verbose_name='Тур')),
+                ('seats_left', models.PositiveIntegerField(default=0, verbose_name='Свободных мест')),
+                ('rating_avg', models.DecimalField(blank=True, decimal_places=1, max_digits=2, null=True, verbose_name='Средняя оценка')),
+                ('reviews_count', models.PositiveIntegerField(default=0, verbose_name='Количество отзывов')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлена')),
+                ('cover_photo', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='tours.tourphoto', verbose_name='Обложка')),
+                ('nearest_date', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='tours.tourdate', verbose_name='Ближайшая дата')),
+            ],
+            options={
+                'verbose_name': 'Карточка тура',
+                'verbose_name_plural': 'Карточки туров',
+                'indexes': [models.Index(fields=['rating_avg'], name='tours_tourc_rating__7253ac_idx')],
+            },
+        ),
+    ]
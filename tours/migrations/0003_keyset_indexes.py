@@ -0,0 +1,21 @@
+# Generated by Django 6.0.1 on 2026-10-18 07:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tours', '0002_tourcard'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='blogpost',
+            index=models.Index(fields=['is_published', 'published_at'], name='tours_blogp_is_publ_ee2a82_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tour',
+            index=models.Index(fields=['created_at'], name='tours_tour_created_3044fa_idx'),
+        ),
+    ]
@@ -0,0 +1,161 @@
+# Generated by Django 6.0.1 on 2026-10-18 07:56
+
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Копия tours/search.py на момент миграции: история миграций не должна
+# зависеть от последующих правок кода приложения
+PG_SEARCH_VECTOR = (
+    "setweight(to_tsvector('russian'::regconfig, coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('russian'::regconfig, coalesce(region, '')), 'B') || "
+    "setweight(to_tsvector('russian'::regconfig, coalesce(description_short, '')), 'C') || "
+    "setweight(to_tsvector('russian'::regconfig, coalesce(description_full, '')), 'D')"
+)
+
+# Веса полей при ранжировании
+FIELD_WEIGHTS = {
+    'title': 4.0,
+    'region': 3.0,
+    'description_short': 2.0,
+    'description_full': 1.0,
+}
+
+MAX_TERM_LENGTH = 64
+
+STOP_WORDS = {
+    'и', 'в', 'во', 'не', 'на', 'с', 'со', 'по', 'к', 'ко', 'у', 'о', 'об',
+    'от', 'до', 'за', 'из', 'для', 'а', 'но', 'или', 'что', 'как', 'это',
+    'же', 'ли', 'бы', 'то', 'вы', 'мы', 'он', 'она', 'они', 'все', 'вас',
+}
+
+WORD_RE = re.compile(r'[0-9a-zа-я]+')
+
+# Стеммер Snowball для русского языка
+RV_RE = re.compile(r'^(.*?[аеиоуыэюя])(.*)$')
+PERFECTIVE_GERUND_RE = re.compile(
+    r'((ив|ивши|ившись|ыв|ывши|ывшись)|((?<=[ая])(в|вши|вшись)))$'
+)
+REFLEXIVE_RE = re.compile(r'(с[яь])$')
+ADJECTIVE_RE = re.compile(
+    r'(ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|их|ых|'
+    r'ую|юю|ая|яя|ою|ею)$'
+)
+PARTICIPLE_RE = re.compile(r'((ивш|ывш|ующ)|((?<=[ая])(ем|нн|вш|ющ|щ)))$')
+VERB_RE = re.compile(
+    r'((ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло|ено|'
+    r'ят|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю)|'
+    r'((?<=[ая])(ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно)))$'
+)
+NOUN_RE = re.compile(
+    r'(а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием|ем|'
+    r'ам|ом|о|у|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я)$'
+)
+DERIVATIONAL_RE = re.compile(r'.*[^аеиоуыэюя]+[аеиоуыэюя].*ость?$')
+DERIVATIONAL_SUFFIX_RE = re.compile(r'ость?$')
+SUPERLATIVE_RE = re.compile(r'(ейше|ейш)$')
+
+
+def stem(word):
+    """Основа русского слова (Snowball). Латиница возвращается как есть."""
+    match = RV_RE.match(word)
+    if not match:
+        return word
+    prefix, rv = match.groups()
+
+    result = PERFECTIVE_GERUND_RE.sub('', rv, 1)
+    if result == rv:
+        rv = REFLEXIVE_RE.sub('', rv, 1)
+        result = ADJECTIVE_RE.sub('', rv, 1)
+        if result != rv:
+            rv = PARTICIPLE_RE.sub('', result, 1)
+        else:
+            result = VERB_RE.sub('', rv, 1)
+            rv = NOUN_RE.sub('', rv, 1) if result == rv else result
+    else:
+        rv = result
+
+    if rv.endswith('и'):
+        rv = rv[:-1]
+    if DERIVATIONAL_RE.match(rv):
+        rv = DERIVATIONAL_SUFFIX_RE.sub('', rv, 1)
+
+    if rv.endswith('ь'):
+        rv = rv[:-1]
+    else:
+        rv = SUPERLATIVE_RE.sub('', rv, 1)
+        if rv.endswith('нн'):
+            rv = rv[:-1]
+    return prefix + rv
+
+
+def tokenize(text):
+    """Слова текста в нижнем регистре, без стоп-слов"""
+    text = (text or '').lower().replace('ё', 'е')
+    return [word for word in WORD_RE.findall(text) if word not in STOP_WORDS]
+
+
+def terms(text):
+    """Множество основ слов текста"""
+    return {stem(word)[:MAX_TERM_LENGTH] for word in tokenize(text)}
+
+
+def tour_document(tour):
+    """Вес каждой основы в документе тура.
+
+    Учитывается только наличие слова в поле, а не частота, чтобы длинное
+    описание не вытесняло совпадения в названии.
+    """
+    weights = {}
+    for field, weight in FIELD_WEIGHTS.items():
+        for term in terms(getattr(tour, field)):
+            weights[term] = weights.get(term, 0.0) + weight
+    return weights
+
+
+def build_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            f'CREATE INDEX tours_tour_search_gin ON tours_tour USING GIN (({PG_SEARCH_VECTOR}))'
+        )
+        return
+    Tour = apps.get_model('tours', 'Tour')
+    SearchTerm = apps.get_model('tours', 'SearchTerm')
+    for tour in Tour.objects.iterator():
+        SearchTerm.objects.bulk_create([
+            SearchTerm(tour=tour, term=term, weight=weight)
+            for term, weight in tour_document(tour).items()
+        ])
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS tours_tour_search_gin')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tours', '0003_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64, verbose_name='Основа слова')),
+                ('weight', models.FloatField(default=1.0, verbose_name='Вес')),
+                ('tour', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='tours.tour', verbose_name='Тур')),
+            ],
+            options={
+                'verbose_name': 'Поисковый термин',
+                'verbose_name_plural': 'Поисковый индекс',
+                'indexes': [models.Index(fields=['term', 'tour'], name='tours_searc_term_c9dfc2_idx')],
+                'unique_together': {('tour', 'term')},
+            },
+        ),
+        migrations.RunPython(build_search_index, drop_search_index),
+    ]
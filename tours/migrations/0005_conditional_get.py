@@ -0,0 +1,44 @@
+# Generated by Django 6.0.1 on 2026-10-18 08:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tours', '0004_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='review',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Обновлен'),
+        ),
+        migrations.AddField(
+            model_name='tourdate',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Обновлена'),
+        ),
+        migrations.AddField(
+            model_name='tourphoto',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Обновлено'),
+        ),
+        migrations.AddIndex(
+            model_name='blogpost',
+            index=models.Index(fields=['updated_at'], name='tours_blogp_updated_b6eea3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tour',
+            index=models.Index(fields=['updated_at'], name='tours_tour_updated_6596a4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tourcard',
+            index=models.Index(fields=['updated_at'], name='tours_tourc_updated_8369ee_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tourdate',
+            index=models.Index(fields=['tour', 'updated_at'], name='tours_tourd_tour_id_54d3e7_idx'),
+        ),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 6.0.1 on 2026-10-18 08:03
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_review_stats(apps, schema_editor):
+    Tour = apps.get_model('tours', 'Tour')
+    Review = apps.get_model('tours', 'Review')
+    histograms = defaultdict(dict)
+    groups = Review.objects.filter(moderation_status='approved').order_by().values(
+        'tour_id', 'rating'
+    ).annotate(n=Count('pk'))
+    for group in groups:
+        histograms[group['tour_id']][group['rating']] = group['n']
+    for tour_id, histogram in histograms.items():
+        count = sum(histogram.values())
+        total = sum(star * n for star, n in histogram.items())
+        Tour.objects.filter(pk=tour_id).update(
+            rating=round(Decimal(total) / count, 2),
+            rating_count=count,
+            rating_sum=total,
+            **{f'rating_{star}': histogram.get(star, 0) for star in range(1, 6)},
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tours', '0005_conditional_get'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tour',
+            name='rating',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=3, verbose_name='Рейтинг'),
+        ),
+        migrations.AddField(
+            model_name='tour',
+            name='rating_1',
+            field=models.PositiveIntegerField(default=0, verbose_name='Оценок 1'),
+        ),
+        migrations.AddField(
+            model_name='tour',
+            name='rating_2',
+            field=models.PositiveIntegerField(default=0, verbose_name='Оценок 2'),
+        ),
+        migrations.AddField(
+            model_name='tour',
+            name='rating_3',
+            field=models.PositiveIntegerField(default=0, verbose_name='Оценок 3'),
+        ),
+        migrations.AddField(
+            model_name='tour',
+            name='rating_4',
+            field=models.PositiveIntegerField(default=0, verbose_name='Оценок 4'),
+        ),
+        migrations.AddField(
+            model_name='tour',
+            name='rating_5',
+            field=models.PositiveIntegerField(default=0, verbose_name='Оценок 5'),
+        ),
+        migrations.AddField(
+            model_name='tour',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Количество оценок'),
+        ),
+        migrations.AddField(
+            model_name='tour',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, verbose_name='Сумма оценок'),
+        ),
+        migrations.AddIndex(
+            model_name='tour',
+            index=models.Index(fields=['rating'], name='tours_tour_rating_03944b_idx'),
+        ),
+        migrations.RunPython(fill_review_stats, migrations.RunPython.noop),
+    ]
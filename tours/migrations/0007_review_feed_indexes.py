@@ -0,0 +1,21 @@
+# Generated by Django 6.0.1 on 2026-10-18 08:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tours', '0006_review_stats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['tour', 'moderation_status', 'created_at'], name='tours_revie_tour_id_def270_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['moderation_status', 'created_at'], name='tours_revie_moderat_2311af_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0.1 on 2026-10-18 08:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tours', '0007_review_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blogpost',
+            name='cover_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Копии обложки'),
+        ),
+        migrations.AddField(
+            model_name='tourphoto',
+            name='variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Копии'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 6.0.1 on 2026-10-18 08:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tours', '0008_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='tourdate',
+            index=models.Index(condition=models.Q(('available_seats__gt', 0), ('status', 'available')), fields=['tour', 'start_date'], name='tourdate_bookable_idx'),
+        ),
+    ]
@@ -0,0 +1,120 @@
+# Generated by Django 6.0.1 on 2026-10-18 08:27
+
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils.text import slugify
+
+
+# Копия tours/regions.py на момент миграции: история миграций не должна
+# зависеть от последующих правок кода приложения
+TRANSLIT = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'e',
+    'ж': 'zh', 'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm',
+    'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u',
+    'ф': 'f', 'х': 'kh', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'shch',
+    'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
+}
+SEPARATORS_RE = re.compile(r'[\s\-_]+')
+LIST_RE = re.compile(r'\s*[,;/+]\s*')
+
+
+def normalize(text):
+    text = (text or '').lower().replace('ё', 'е')
+    return SEPARATORS_RE.sub(' ', text).strip()
+
+
+def transliterate(text):
+    return ''.join(TRANSLIT.get(char, char) for char in normalize(text))
+
+
+def aliases(*names):
+    result = set()
+    for name in names:
+        for variant in (normalize(name), transliterate(name)):
+            if variant:
+                result.add(variant)
+    return result
+
+
+def main_region_name(text):
+    parts = [part.strip() for part in LIST_RE.split(text or '') if part.strip()]
+    return parts[0] if parts else ''
+
+
+def fill_regions(apps, schema_editor):
+    """Справочник из текстовых регионов туров: написания, которые
+    совпадают после нормализации, становятся одним регионом"""
+    Tour = apps.get_model('tours', 'Tour')
+    Region = apps.get_model('tours', 'Region')
+    RegionAlias = apps.get_model('tours', 'RegionAlias')
+
+    texts = Tour.objects.exclude(region='').order_by().values_list('region', flat=True)
+    regions = {}
+    for text in sorted(set(texts)):
+        name = main_region_name(text)
+        key = normalize(name)
+        if not key:
+            continue
+        if key not in regions:
+            regions[key] = Region.objects.create(
+                name=name, slug=slugify(transliterate(name))
+            )
+        region = regions[key]
+        RegionAlias.objects.bulk_create(
+            [RegionAlias(region=region, alias=alias) for alias in aliases(name, region.slug)],
+            ignore_conflicts=True,
+        )
+        Tour.objects.filter(region=text).update(main_region=region)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tours', '0009_tourdate_bookable_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Region',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='Название')),
+                ('slug', models.SlugField(blank=True, max_length=100, unique=True, verbose_name='URL')),
+                ('display_order', models.PositiveIntegerField(default=0, verbose_name='Порядок отображения')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создан')),
+            ],
+            options={
+                'verbose_name': 'Регион',
+                'verbose_name_plural': 'Регионы',
+                'ordering': ['display_order', 'name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='RegionAlias',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('alias', models.CharField(max_length=100, unique=True, verbose_name='Вариант написания')),
+            ],
+            options={
+                'verbose_name': 'Вариант написания региона',
+                'verbose_name_plural': 'Варианты написания регионов',
+            },
+        ),
+        migrations.RemoveIndex(
+            model_name='tour',
+            name='tours_tour_region_d618d8_idx',
+        ),
+        migrations.AddField(
+            model_name='tour',
+            name='main_region',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='tours', to='tours.region', verbose_name='Основной регион'),
+        ),
+        migrations.AddField(
+            model_name='regionalias',
+            name='region',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='aliases', to='tours.region', verbose_name='Регион'),
+        ),
+        migrations.RunPython(fill_regions, migrations.RunPython.noop),
+    ]
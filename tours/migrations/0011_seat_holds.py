@@ -0,0 +1,31 @@
+# Generated by Django 6.0.1 on 2026-10-18 08:33
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tours', '0010_regions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SeatHold',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.UUIDField(default=uuid.uuid4, editable=False, unique=True, verbose_name='Токен')),
+                ('seats', models.PositiveIntegerField(verbose_name='Мест')),
+                ('expires_at', models.DateTimeField(db_index=True, verbose_name='Истекает')),
+                ('sweep_id', models.UUIDField(blank=True, db_index=True, editable=False, null=True, verbose_name='Метка снятия')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создано')),
+                ('tour_date', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='holds', to='tours.tourdate', verbose_name='Дата тура')),
+            ],
+            options={
+                'verbose_name': 'Удержание мест',
+                'verbose_name_plural': 'Удержания мест',
+            },
+        ),
+    ]
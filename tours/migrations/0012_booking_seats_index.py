@@ -0,0 +1,17 @@
+# Generated by Django 6.0.1 on 2026-10-18 08:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tours', '0011_seat_holds'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['tour_date', 'status', 'people_count'], name='booking_seats_idx'),
+        ),
+    ]
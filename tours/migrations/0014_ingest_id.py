@@ -0,0 +1,28 @@
+# Generated by Django 6.0.1 on 2026-10-18 08:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tours', '0013_admin_date_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='ingest_id',
+            field=models.UUIDField(blank=True, editable=False, null=True, unique=True, verbose_name='id в очереди'),
+        ),
+        migrations.AddField(
+            model_name='lead',
+            name='ingest_id',
+            field=models.UUIDField(blank=True, editable=False, null=True, unique=True, verbose_name='id в очереди'),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='ingest_id',
+            field=models.UUIDField(blank=True, editable=False, null=True, unique=True, verbose_name='id в очереди'),
+        ),
+    ]
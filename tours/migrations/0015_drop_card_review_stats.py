@@ -0,0 +1,25 @@
+# Generated by Django 6.0.1 on 2026-10-18 09:03
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tours', '0014_ingest_id'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='tourcard',
+            name='tours_tourc_rating__7253ac_idx',
+        ),
+        migrations.RemoveField(
+            model_name='tourcard',
+            name='rating_avg',
+        ),
+        migrations.RemoveField(
+            model_name='tourcard',
+            name='reviews_count',
+        ),
+    ]
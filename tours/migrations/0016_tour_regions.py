@@ -0,0 +1,93 @@
+# Generated by Django 6.0.1 on 2026-10-18 09:17
+
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils.text import slugify
+
+
+# Копия tours/regions.py на момент миграции: история миграций не должна
+# зависеть от последующих правок кода приложения
+TRANSLIT = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'e',
+    'ж': 'zh', 'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm',
+    'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u',
+    'ф': 'f', 'х': 'kh', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'shch',
+    'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
+}
+SEPARATORS_RE = re.compile(r'[\s\-_]+')
+LIST_RE = re.compile(r'\s*[,;/+]\s*')
+
+
+def normalize(text):
+    text = (text or '').lower().replace('ё', 'е')
+    return SEPARATORS_RE.sub(' ', text).strip()
+
+
+def transliterate(text):
+    return ''.join(TRANSLIT.get(char, char) for char in normalize(text))
+
+
+def aliases(*names):
+    result = set()
+    for name in names:
+        for variant in (normalize(name), transliterate(name)):
+            if variant:
+                result.add(variant)
+    return result
+
+
+def region_names(text):
+    return [part.strip() for part in LIST_RE.split(text or '') if part.strip()]
+
+
+def fill_tour_regions(apps, schema_editor):
+    """Дополнительные регионы из текста туров ("Тбилиси, Казбеги");
+    регионы, которых нет в справочнике, создаются"""
+    Tour = apps.get_model('tours', 'Tour')
+    Region = apps.get_model('tours', 'Region')
+    RegionAlias = apps.get_model('tours', 'RegionAlias')
+    TourRegion = apps.get_model('tours', 'TourRegion')
+
+    regions = dict(RegionAlias.objects.values_list('alias', 'region_id'))
+    links = []
+    for tour_id, main_region_id, text in Tour.objects.exclude(region='').values_list(
+            'pk', 'main_region_id', 'region'):
+        for name in region_names(text)[1:]:
+            key = normalize(name)
+            if key not in regions:
+                region = Region.objects.create(name=name, slug=slugify(transliterate(name)))
+                RegionAlias.objects.bulk_create(
+                    [RegionAlias(region=region, alias=alias)
+                     for alias in aliases(name, region.slug)],
+                    ignore_conflicts=True,
+                )
+                regions[key] = region.pk
+            if regions[key] != main_region_id:
+                links.append(TourRegion(tour_id=tour_id, region_id=regions[key]))
+    TourRegion.objects.bulk_create(links, batch_size=500, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tours', '0015_drop_card_review_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TourRegion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('region', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='extra_tours', to='tours.region', verbose_name='Регион')),
+                ('tour', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='extra_regions', to='tours.tour', verbose_name='Тур')),
+            ],
+            options={
+                'verbose_name': 'Дополнительный регион тура',
+                'verbose_name_plural': 'Дополнительные регионы туров',
+                'unique_together': {('region', 'tour')},
+            },
+        ),
+        migrations.RunPython(fill_tour_regions, migrations.RunPython.noop),
+    ]
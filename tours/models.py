@@ -1,4 +1,5 @@
 from django.db import models
+from django.dispatch import Signal
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils.text import slugify
 import uuid
@@ -22,6 +23,106 @@ class TourOperator(models.Model):
         return self.name
 
 
+class Region(models.Model):
+    """Регионы Грузии - справочник для фильтра каталога"""
+    name = models.CharField('Название', max_length=100, unique=True)
+    slug = models.SlugField('URL', max_length=100, unique=True, blank=True)
+    display_order = models.PositiveIntegerField('Порядок отображения', default=0)
+    created_at = models.DateTimeField('Создан', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Регион'
+        verbose_name_plural = 'Регионы'
+        ordering = ['display_order', 'name']
+
+    def __str__(self):
+        return self.name
+
+    def save(self, *args, **kwargs):
+        from .regions import transliterate
+        if not self.slug:
+            self.slug = slugify(transliterate(self.name))
+        super().save(*args, **kwargs)
+        self.add_aliases(self.name, self.slug)
+
+    def add_aliases(self, *names):
+        """Добавить варианты написания; занятые другим регионом пропускаются"""
+        from .regions import aliases
+        RegionAlias.objects.bulk_create(
+            [RegionAlias(region=self, alias=alias) for alias in aliases(*names)],
+            ignore_conflicts=True,
+        )
+
+    @staticmethod
+    def lookup(value):
+        """id региона по id, названию, slug или псевдониму.
+
+        Для filter(main_region_id=...): название разрешается подзапросом
+        по уникальному индексу псевдонимов, без отдельного обращения к базе.
+        """
+        from django.db.models import Subquery
+        from .regions import normalize
+        value = str(value).strip()
+        if value.isdigit():
+            return int(value)
+        return Subquery(
+            RegionAlias.objects.filter(alias=normalize(value)).values('region_id')[:1]
+        )
+
+    @classmethod
+    def tour_filter(cls, value):
+        """Условие фильтра туров по региону.
+
+        Основной регион - равенство по индексу main_region_id, остальные
+        регионы из текста тура ("Тбилиси, Казбеги") - по индексу TourRegion.
+        """
+        from django.db.models import Q
+        region_id = cls.lookup(value)
+        return Q(main_region_id=region_id) | Q(pk__in=TourRegion.objects.filter(
+            region_id=region_id
+        ).values('tour_id'))
+
+    @classmethod
+    def for_name(cls, name):
+        """Регион по названию; если оно не найдено среди псевдонимов, регион создается"""
+        from .regions import normalize
+        if not name:
+            return None
+        region = cls.objects.filter(aliases__alias=normalize(name)).first()
+        if region is None:
+            region = cls.objects.create(name=name)
+        return region
+
+    @classmethod
+    def for_text(cls, text):
+        """Регион для текстового поля тура (первый из перечисленных)"""
+        from .regions import main_region_name
+        return cls.for_name(main_region_name(text))
+
+
+class RegionAlias(models.Model):
+    """Варианты написания региона, нормализованные (см. regions.py)"""
+    region = models.ForeignKey(
+        Region,
+        on_delete=models.CASCADE,
+        related_name='aliases',
+        verbose_name='Регион'
+    )
+    alias = models.CharField('Вариант написания', max_length=100, unique=True)
+
+    class Meta:
+        verbose_name = 'Вариант написания региона'
+        verbose_name_plural = 'Варианты написания регионов'
+
+    def __str__(self):
+        return self.alias
+
+    def save(self, *args, **kwargs):
+        from .regions import normalize
+        self.alias = normalize(self.alias)
+        super().save(*args, **kwargs)
+
+
 class Tour(models.Model):
     """Основная модель тура"""
     TOUR_TYPE_CHOICES = [
@@ -47,11 +148,32 @@ class Tour(models.Model):
         related_name='tours'
     )
     
+    # Текст для описания и поиска (может перечислять несколько регионов),
+    # фильтр каталога - по main_region
     region = models.CharField('Регион Грузии', max_length=100, blank=True)
+    main_region = models.ForeignKey(
+        Region,
+        on_delete=models.PROTECT,
+        blank=True,
+        null=True,
+        related_name='tours',
+        verbose_name='Основной регион'
+    )
     included = models.TextField('Что включено')
     not_included = models.TextField('Что не включено')
     program_by_days = models.JSONField('Программа по дням', default=list)
     
+    # Статистика одобренных отзывов, обновляется инкрементально
+    # (см. Tour.apply_rating_changes и команду reconcile_review_stats)
+    rating = models.DecimalField('Рейтинг', max_digits=3, decimal_places=2, default=0)
+    rating_count = models.PositiveIntegerField('Количество оценок', default=0)
+    rating_sum = models.PositiveIntegerField('Сумма оценок', default=0)
+    rating_1 = models.PositiveIntegerField('Оценок 1', default=0)
+    rating_2 = models.PositiveIntegerField('Оценок 2', default=0)
+    rating_3 = models.PositiveIntegerField('Оценок 3', default=0)
+    rating_4 = models.PositiveIntegerField('Оценок 4', default=0)
+    rating_5 = models.PositiveIntegerField('Оценок 5', default=0)
+    
     is_active = models.BooleanField('Активен', default=True)
     created_at = models.DateTimeField('Создан', auto_now_add=True)
     updated_at = models.DateTimeField('Обновлен', auto_now=True)
@@ -62,18 +184,144 @@ class Tour(models.Model):
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['tour_type']),
-            models.Index(fields=['region']),
             models.Index(fields=['price_base']),
             models.Index(fields=['duration_days']),
+            models.Index(fields=['created_at']),
+            models.Index(fields=['updated_at']),
+            models.Index(fields=['rating']),
         ]
 
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_state()
+        return instance
+
+    def remember_state(self):
+        """Запомнить текст региона из базы: при его изменении main_region пересчитывается"""
+        self._saved_region = self.__dict__.get('region')
+
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.title) + '-' + str(uuid.uuid4())[:8]
+        if 'region' in self.get_deferred_fields():
+            changed = False
+        else:
+            changed = self.region != getattr(self, '_saved_region', '')
+        # Новый тур: main_region можно задать явно. Загруженный из базы:
+        # пересчитывается при каждом изменении текста региона
+        if changed and (hasattr(self, '_saved_region') or self.main_region_id is None):
+            self.main_region = Region.for_text(self.region)
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'region' in update_fields:
+                kwargs['update_fields'] = {*update_fields, 'main_region'}
         super().save(*args, **kwargs)
+        if changed:
+            self.set_extra_regions()
+        self.remember_state()
+
+    def set_extra_regions(self):
+        """Остальные регионы из текста region - в TourRegion (кроме основного)"""
+        from .cache import bump_generation
+        from .regions import region_names
+        region_ids = {
+            Region.for_name(name).pk for name in region_names(self.region)[1:]
+        } - {self.main_region_id}
+        TourRegion.objects.filter(tour=self).exclude(region_id__in=region_ids).delete()
+        TourRegion.objects.bulk_create(
+            [TourRegion(tour=self, region_id=region_id) for region_id in region_ids],
+            ignore_conflicts=True,
+        )
+        bump_generation(TourRegion)
+
+    @property
+    def average_rating(self):
+        return round(float(self.rating), 1) if self.rating_count else None
+
+    @property
+    def rating_histogram(self):
+        return {star: getattr(self, f'rating_{star}') for star in range(1, 6)}
+
+    @staticmethod
+    def rating_updates(changes):
+        """Выражения UPDATE для изменения статистики отзывов.
+
+        changes - {оценка: изменение числа одобренных отзывов}. Все
+        выражения ссылаются на старые значения строки, поэтому среднее
+        пересчитывается в том же запросе.
+        """
+        from django.db.models import F, Case, When, Value, FloatField
+        from django.db.models.functions import Cast, Round
+        from django.utils import timezone
+
+        count_delta = sum(changes.values())
+        sum_delta = sum(star * delta for star, delta in changes.items())
+        updates = {
+            f'rating_{star}': F(f'rating_{star}') + delta
+            for star, delta in changes.items() if delta
+        }
+        new_count = F('rating_count') + count_delta
+        new_sum = F('rating_sum') + sum_delta
+        updates.update(
+            # Меняет Last-Modified и ETag каталога и страницы тура
+            updated_at=timezone.now(),
+            rating_count=new_count,
+            rating_sum=new_sum,
+            rating=Case(
+                When(rating_count=-count_delta, then=Value(0.0)),
+                default=Round(Cast(new_sum, FloatField()) / new_count, 2),
+                output_field=FloatField(),
+            ),
+        )
+        return updates
+
+    @classmethod
+    def reconcile_ratings(cls, batch_size=1000):
+        """Пересчитать статистику отзывов с нуля и исправить расхождения.
+
+        Возвращает список pk туров, статистика которых разошлась.
+        """
+        from collections import defaultdict
+        from decimal import Decimal
+        from django.db.models import Count
+
+        histograms = defaultdict(dict)
+        groups = Review.objects.filter(moderation_status='approved').order_by().values(
+            'tour_id', 'rating'
+        ).annotate(n=Count('pk'))
+        for group in groups:
+            histograms[group['tour_id']][group['rating']] = group['n']
+
+        stars = [f'rating_{star}' for star in range(1, 6)]
+        fields = ['rating', 'rating_count', 'rating_sum', *stars]
+        fixed = []
+        for tour in cls.objects.only(*fields).iterator(chunk_size=batch_size):
+            histogram = histograms.get(tour.pk, {})
+            count = sum(histogram.values())
+            total = sum(star * n for star, n in histogram.items())
+            expected = {
+                'rating_count': count,
+                'rating_sum': total,
+                'rating': round(Decimal(total) / count, 2) if count else Decimal(0),
+                **{f'rating_{star}': histogram.get(star, 0) for star in range(1, 6)},
+            }
+            if any(getattr(tour, field) != value for field, value in expected.items()):
+                for field, value in expected.items():
+                    setattr(tour, field, value)
+                fixed.append(tour)
+
+        cls.objects.bulk_update(fixed, fields, batch_size=batch_size)
+        return [tour.pk for tour in fixed]
+
+    @staticmethod
+    def apply_rating_changes(tour_id, changes):
+        """Одним UPDATE применить {оценка: изменение} к статистике тура"""
+        changes = {star: delta for star, delta in changes.items() if delta}
+        if changes:
+            Tour.objects.filter(pk=tour_id).update(**Tour.rating_updates(changes))
 
 
 class TourPhoto(models.Model):
@@ -85,9 +333,12 @@ class TourPhoto(models.Model):
         verbose_name='Тур'
     )
     photo = models.ImageField('Фото', upload_to='tours/')
+    # Уменьшенные WebP-копии, см. images.py
+    variants = models.JSONField('Копии', default=dict, blank=True, editable=False)
     display_order = models.PositiveIntegerField('Порядок отображения', default=0)
     is_cover = models.BooleanField('Главное фото', default=False)
     created_at = models.DateTimeField('Загружено', auto_now_add=True)
+    updated_at = models.DateTimeField('Обновлено', auto_now=True)
 
     class Meta:
         verbose_name = 'Фото тура'
@@ -98,6 +349,39 @@ class TourPhoto(models.Model):
         return f"Фото для {self.tour.title}"
 
 
+class SeatsUnavailable(Exception):
+    """Недостаточно свободных мест на дату тура"""
+
+
+class TourRegion(models.Model):
+    """Дополнительные регионы тура из текста region ("Тбилиси, Казбеги").
+
+    Основной регион - Tour.main_region, здесь он не повторяется, поэтому
+    счетчики по двум связям не пересекаются.
+    """
+    tour = models.ForeignKey(
+        Tour,
+        on_delete=models.CASCADE,
+        related_name='extra_regions',
+        verbose_name='Тур'
+    )
+    region = models.ForeignKey(
+        Region,
+        on_delete=models.CASCADE,
+        related_name='extra_tours',
+        verbose_name='Регион'
+    )
+
+    class Meta:
+        verbose_name = 'Дополнительный регион тура'
+        verbose_name_plural = 'Дополнительные регионы туров'
+        # Уникальный индекс (region, tour) - поиск туров региона
+        unique_together = [('region', 'tour')]
+
+    def __str__(self):
+        return f'{self.tour_id}: {self.region_id}'
+
+
 class TourDate(models.Model):
     """Даты проведения туров"""
     STATUS_CHOICES = [
@@ -120,6 +404,7 @@ class TourDate(models.Model):
     
     status = models.CharField('Статус', max_length=20, choices=STATUS_CHOICES, default='available')
     created_at = models.DateTimeField('Создана', auto_now_add=True)
+    updated_at = models.DateTimeField('Обновлена', auto_now=True)
 
     class Meta:
         verbose_name = 'Дата тура'
@@ -128,11 +413,49 @@ class TourDate(models.Model):
         unique_together = ['tour', 'start_date']
         indexes = [
             models.Index(fields=['start_date', 'status']),
+            models.Index(fields=['tour', 'updated_at']),
+            # Только даты, на которые можно записаться (см. bookable)
+            models.Index(
+                fields=['tour', 'start_date'], name='tourdate_bookable_idx',
+                condition=models.Q(status='available', available_seats__gt=0),
+            ),
         ]
 
     def __str__(self):
         return f"{self.tour.title} - {self.start_date}"
 
+    @staticmethod
+    def bookable(start=None, end=None):
+        """Доступные даты с местами, начало в [start, end].
+
+        Условия совпадают с частичным индексом tourdate_bookable_idx:
+        в подзапросе EXISTS по туру база читает только этот индекс.
+        """
+        dates = TourDate.objects.filter(status='available', available_seats__gt=0)
+        if start:
+            dates = dates.filter(start_date__gte=start)
+        if end:
+            dates = dates.filter(start_date__lte=end)
+        return dates
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_state()
+        return instance
+
+    def remember_state(self):
+        """Запомнить тур и день из базы: перенос даты меняет два месяца календаря"""
+        self._saved_state = (self.__dict__.get('tour_id'), self.__dict__.get('start_date'))
+
+    def calendar_days(self):
+        """Пары (tour_id, день) календаря до и после изменения"""
+        days = {(self.tour_id, self.start_date)}
+        saved = getattr(self, '_saved_state', None)
+        if saved:
+            days.add(saved)
+        return days
+
     def save(self, *args, **kwargs):
         # Автоматически вычисляем end_date
         if not self.end_date and self.tour:
@@ -147,6 +470,294 @@ class TourDate(models.Model):
             
         super().save(*args, **kwargs)
 
+    @staticmethod
+    def reserve_seats(tour_date_id, count):
+        """Списывает места одним условным UPDATE.
+
+        Места списываются, только если дата доступна и мест хватает;
+        статус 'full' выставляется в том же запросе. Возвращает True,
+        если места списаны. Гонку между проверкой и списанием решает база.
+        """
+        from django.db.models import F, Case, When, Value
+        from django.db.models.functions import Now
+        updated = TourDate.objects.filter(
+            pk=tour_date_id,
+            status='available',
+            available_seats__gte=count
+        ).update(
+            available_seats=F('available_seats') - count,
+            status=Case(
+                When(available_seats=count, then=Value('full')),
+                default=F('status')
+            ),
+            updated_at=Now()
+        )
+        return updated == 1
+
+    @staticmethod
+    def release_seats(tour_date_id, count):
+        """Возвращает места одним UPDATE; дата 'full' снова становится доступной"""
+        from django.db.models import F, Case, When, Value
+        from django.db.models.functions import Now
+        TourDate.objects.filter(pk=tour_date_id).update(
+            available_seats=F('available_seats') + count,
+            status=Case(
+                When(status='full', then=Value('available')),
+                default=F('status')
+            ),
+            updated_at=Now()
+        )
+
+    @staticmethod
+    def reserve_many(seats):
+        """Списать места {id даты: мест} одним условным UPDATE.
+
+        Условия те же, что в reserve_seats. Возвращает True, если мест
+        хватило на всех датах; иначе часть дат уже списана - вызывать
+        внутри транзакции и откатывать ее.
+        """
+        from django.db.models import F, Case, When, Value, IntegerField
+        from django.db.models.functions import Now
+        needed = Case(
+            *[When(pk=pk, then=Value(count)) for pk, count in seats.items()],
+            output_field=IntegerField()
+        )
+        updated = TourDate.objects.filter(
+            pk__in=list(seats),
+            status='available',
+            available_seats__gte=needed
+        ).update(
+            available_seats=F('available_seats') - needed,
+            status=Case(
+                When(available_seats=needed, then=Value('full')),
+                default=F('status')
+            ),
+            updated_at=Now()
+        )
+        return updated == len(seats)
+
+    @staticmethod
+    def release_many(seats):
+        """Вернуть места {id даты: мест} одним UPDATE"""
+        from django.db.models import F, Case, When, Value, IntegerField
+        from django.db.models.functions import Now
+        TourDate.objects.filter(pk__in=list(seats)).update(
+            available_seats=F('available_seats') + Case(
+                *[When(pk=pk, then=Value(count)) for pk, count in seats.items()],
+                output_field=IntegerField()
+            ),
+            status=Case(
+                When(status='full', then=Value('available')),
+                default=F('status')
+            ),
+            updated_at=Now()
+        )
+
+    @classmethod
+    def reconcile_seats(cls):
+        """Пересчитать свободные места и статус дат по заявкам и удержаниям.
+
+        Места считаются одним проходом: подзапросы по индексу
+        booking_seats_idx и удержаниям для каждой даты. Обновляются только
+        разошедшиеся даты (updated_at остальных не меняется). Возвращает
+        список pk исправленных дат.
+        """
+        from django.db import transaction
+        from django.db.models import Case, F, OuterRef, Q, Subquery, Sum, Value, When
+        from django.db.models.functions import Coalesce, Greatest, Now
+
+        def taken(queryset):
+            total = queryset.filter(tour_date=OuterRef('pk')).order_by().values(
+                'tour_date'
+            ).annotate(total=Sum('people_count' if queryset.model is Booking else 'seats'))
+            return Coalesce(Subquery(total.values('total')), 0)
+
+        expected = Greatest(
+            F('total_seats')
+            - taken(Booking.objects.exclude(status='cancelled'))
+            - taken(SeatHold.objects.filter(sweep_id__isnull=True)),
+            0
+        )
+        expected_status = Case(
+            When(status='cancelled', then=Value('cancelled')),
+            When(expected_seats=0, then=Value('full')),
+            default=Value('available')
+        )
+        with transaction.atomic():
+            # Статус сверяется с уже записанными местами: подзапросы
+            # выполняются один раз на дату, а не в каждом условии
+            drifted = cls.objects.order_by().annotate(expected_seats=expected).filter(
+                ~Q(available_seats=F('expected_seats'))
+                | Q(status='full', available_seats__gt=0)
+                | Q(status='available', available_seats=0)
+            )
+            fixed = list(drifted.values_list('pk', flat=True))
+            if fixed:
+                cls.objects.filter(pk__in=fixed).annotate(
+                    expected_seats=expected
+                ).update(
+                    available_seats=F('expected_seats'),
+                    status=expected_status,
+                    updated_at=Now()
+                )
+        if fixed:
+            seats_changed.send(sender=cls, tour_date_ids=fixed)
+        return fixed
+
+
+# Места дат изменились в обход сигналов TourDate (удержания мест, массовая
+# смена статуса заявок, сверка мест). Аргумент tour_date_ids - id дат
+seats_changed = Signal()
+
+
+class SeatHoldQuerySet(models.QuerySet):
+    def hold(self, tour_date_id, seats):
+        """Удержать места на дате, вернуть удержание или None, если мест нет.
+
+        Места списываются тем же условным UPDATE, что и при бронировании
+        (reserve_seats), поэтому параллельные покупатели не блокируют друг
+        друга проверками; вставка удержания - в той же транзакции.
+        """
+        from datetime import timedelta
+        from django.conf import settings
+        from django.db import transaction
+        from django.utils import timezone
+
+        with transaction.atomic():
+            if not TourDate.reserve_seats(tour_date_id, seats):
+                return None
+            hold = self.create(
+                tour_date_id=tour_date_id,
+                seats=seats,
+                expires_at=timezone.now() + timedelta(minutes=settings.SEAT_HOLD_MINUTES),
+            )
+        seats_changed.send(sender=SeatHold, tour_date_ids=[tour_date_id])
+        return hold
+
+    def expired(self):
+        from django.utils import timezone
+        return self.filter(expires_at__lte=timezone.now())
+
+    def redeem(self, token, tour_date_id):
+        """Погасить действующее удержание при бронировании.
+
+        Возвращает число удержанных мест или None, если удержания нет
+        или оно истекло. Вызывается внутри транзакции бронирования.
+        """
+        from django.utils import timezone
+
+        active = self.filter(
+            token=token, tour_date_id=tour_date_id,
+            expires_at__gt=timezone.now(), sweep_id__isnull=True,
+        )
+        row = active.values_list('pk', 'seats').first()
+        if row is None:
+            return None
+        pk, seats = row
+        # Удаление условное: удержание могли снять между чтением и удалением
+        deleted, _ = active.filter(pk=pk).delete()
+        return seats if deleted else None
+
+    def release(self):
+        """Вернуть места удержаний выборки на даты и удалить удержания.
+
+        Работает множествами, а не по строкам: удержания помечаются меткой
+        прохода одним UPDATE (параллельный проход или бронирование уже
+        помеченную строку не возьмут), затем один UPDATE дат прибавляет
+        сумму мест по подзапросу и один DELETE удаляет помеченные
+        удержания. Возвращает число снятых удержаний.
+        """
+        from django.db import transaction
+        from django.db.models import Case, F, OuterRef, Subquery, Sum, Value, When
+        from django.db.models.functions import Now
+
+        sweep = uuid.uuid4()
+        with transaction.atomic():
+            released = self.filter(sweep_id__isnull=True).update(sweep_id=sweep)
+            if not released:
+                return 0
+            holds = SeatHold.objects.filter(sweep_id=sweep)
+            seats = holds.filter(tour_date=OuterRef('pk')).order_by().values(
+                'tour_date'
+            ).annotate(total=Sum('seats')).values('total')
+            tour_date_ids = list(holds.order_by().values_list(
+                'tour_date_id', flat=True
+            ).distinct())
+            TourDate.objects.filter(pk__in=tour_date_ids).update(
+                available_seats=F('available_seats') + Subquery(seats),
+                status=Case(
+                    When(status='full', then=Value('available')),
+                    default=F('status')
+                ),
+                updated_at=Now()
+            )
+            holds.delete()
+        seats_changed.send(sender=SeatHold, tour_date_ids=tour_date_ids)
+        return released
+
+
+class SeatHold(models.Model):
+    """Временное удержание мест на время оформления заявки.
+
+    Места списываются при открытии оформления и переходят в заявку по
+    токену удержания. Истекшие удержания снимает release_expired_holds.
+    """
+    tour_date = models.ForeignKey(
+        TourDate,
+        on_delete=models.CASCADE,
+        related_name='holds',
+        verbose_name='Дата тура'
+    )
+    token = models.UUIDField('Токен', default=uuid.uuid4, unique=True, editable=False)
+    seats = models.PositiveIntegerField('Мест')
+    expires_at = models.DateTimeField('Истекает', db_index=True)
+    # Метка прохода release(), который снимает удержание
+    sweep_id = models.UUIDField('Метка снятия', blank=True, null=True, db_index=True, editable=False)
+    created_at = models.DateTimeField('Создано', auto_now_add=True)
+
+    objects = SeatHoldQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Удержание мест'
+        verbose_name_plural = 'Удержания мест'
+
+    def __str__(self):
+        return f"Удержание {self.seats} мест - {self.tour_date_id}"
+
+
+class BookingQuerySet(models.QuerySet):
+    def set_status(self, status):
+        """Массово сменить статус заявок с возвратом или списанием мест.
+
+        Места отмененных заявок возвращаются на даты, места отмененных
+        заявок, которые снова стали активными, списываются заново. Места по
+        датам считаются одним GROUP BY до обновления и применяются одним
+        UPDATE дат, поэтому стоимость не зависит от числа заявок. Если на
+        какой-то дате мест не хватает, SeatsUnavailable и ничего не меняется.
+        Возвращает число заявок со сменившимся статусом.
+        """
+        from django.db import transaction
+        from django.db.models import Sum
+        from django.db.models.functions import Now
+
+        with transaction.atomic():
+            if status == 'cancelled':
+                changed = self.exclude(status='cancelled')
+            else:
+                changed = self.filter(status='cancelled')
+            seats = dict(changed.order_by().values_list('tour_date').annotate(
+                Sum('people_count')
+            ))
+            if status == 'cancelled':
+                if seats:
+                    TourDate.release_many(seats)
+            elif seats and not TourDate.reserve_many(seats):
+                raise SeatsUnavailable('Недостаточно мест, чтобы восстановить заявки')
+            updated = self.exclude(status=status).update(status=status, updated_at=Now())
+        if seats:
+            seats_changed.send(sender=Booking, tour_date_ids=list(seats))
+        return updated
+
 
 class Booking(models.Model):
     """Бронирования"""
@@ -183,6 +794,10 @@ class Booking(models.Model):
     
     created_at = models.DateTimeField('Создана', auto_now_add=True)
     updated_at = models.DateTimeField('Обновлена', auto_now=True)
+    # id из очереди заявок (tours/ingest.py): повторная доставка не создает дубль
+    ingest_id = models.UUIDField('id в очереди', blank=True, null=True, unique=True, editable=False)
+
+    objects = BookingQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Бронирование'
@@ -190,24 +805,147 @@ class Booking(models.Model):
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['status', 'created_at']),
+            # Сортировка и date_hierarchy списка заявок в админке
+            models.Index(fields=['created_at']),
+            # Покрывающий индекс для подсчета занятых мест по датам
+            # (TourDate.reconcile_seats) без чтения строк заявок
+            models.Index(
+                fields=['tour_date', 'status', 'people_count'], name='booking_seats_idx'
+            ),
         ]
 
+    # Токен удержания мест (SeatHold), из которого оформляется заявка
+    hold_token = None
+
     def __str__(self):
         return f"Заявка #{self.id} - {self.client_name}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_state()
+        return instance
+
+    def remember_state(self):
+        """Запомнить места, которые заявка держит в базе"""
+        self._saved_seats = self.seats_taken()
+
+    def seats_taken(self):
+        """(id даты, мест) занятые заявкой; None у отмененной"""
+        if self.__dict__.get('status') == 'cancelled':
+            return None
+        return (self.__dict__.get('tour_date_id'), self.__dict__.get('people_count'))
+
+    def clean(self):
+        # Форма админки: нехватку мест показываем ошибкой поля, а не
+        # исключением SeatsUnavailable из save()
+        from django.core.exceptions import ValidationError
+
+        saved = getattr(self, '_saved_seats', None) if self.pk else None
+        current = self.seats_taken()
+        if not current or None in current or saved == current:
+            return
+        tour_date = TourDate.objects.filter(pk=current[0]).values(
+            'available_seats', 'status'
+        ).first()
+        if tour_date is None:
+            return
+        available = tour_date['available_seats']
+        if saved and saved[0] == current[0]:
+            available += saved[1]
+        if tour_date['status'] == 'cancelled' or available < current[1]:
+            raise ValidationError({
+                'people_count': f'Недостаточно мест. Доступно: {available}'
+            })
+
     def save(self, *args, **kwargs):
-        # При создании вычисляем total_price и уменьшаем available_seats
+        # При создании вычисляем total_price и списываем места
         is_new = self.pk is None
         
-        if is_new:
-            self.total_price = self.tour_date.tour.price_base * self.people_count
-            
-        super().save(*args, **kwargs)
+        from django.db import transaction
+
+        if not is_new:
+            # Отмена возвращает места, восстановление или перенос на другую
+            # дату списывают заново. Объект не из базы места не трогает
+            saved = getattr(self, '_saved_seats', None)
+            current = self.seats_taken()
+            if not hasattr(self, '_saved_seats') or saved == current:
+                super().save(*args, **kwargs)
+                return
+            with transaction.atomic():
+                if saved:
+                    TourDate.release_seats(*saved)
+                if current and not TourDate.reserve_seats(*current):
+                    raise SeatsUnavailable(
+                        f'Недостаточно мест на {self.tour_date.start_date}'
+                    )
+                super().save(*args, **kwargs)
+            if saved and saved[0] != self.tour_date_id:
+                seats_changed.send(sender=Booking, tour_date_ids=[saved[0]])
+            self.remember_state()
+            return
         
-        if is_new:
-            # Уменьшаем количество доступных мест
-            self.tour_date.available_seats -= self.people_count
-            self.tour_date.save()
+        self.total_price = self.tour_date.tour.price_base * self.people_count
+        
+        with transaction.atomic():
+            # Места списываются до вставки заявки: при нехватке мест
+            # заявка не создается, а транзакция откатывается целиком
+            if not self.take_seats():
+                raise SeatsUnavailable(
+                    f'Недостаточно мест на {self.tour_date.start_date}'
+                )
+            super().save(*args, **kwargs)
+        self.remember_state()
+
+    def take_seats(self):
+        """Списать места под новую заявку, с учетом удержания hold_token.
+
+        Места удержания уже списаны: удержание гасится, а разница с числом
+        человек в заявке досписывается или возвращается. Истекшее удержание
+        не мешает: места списываются заново, если они еще есть.
+        """
+        held = None
+        if self.hold_token:
+            held = SeatHold.objects.redeem(self.hold_token, self.tour_date_id)
+        if held is None:
+            return TourDate.reserve_seats(self.tour_date_id, self.people_count)
+        if self.people_count > held:
+            return TourDate.reserve_seats(self.tour_date_id, self.people_count - held)
+        if self.people_count < held:
+            TourDate.release_seats(self.tour_date_id, held - self.people_count)
+        return True
+
+
+class ReviewQuerySet(models.QuerySet):
+    def moderate(self, status):
+        """Массово сменить статус модерации с пересчетом статистики туров.
+
+        Изменения статистики считаются одним GROUP BY по (тур, оценка)
+        до обновления, поэтому стоимость не зависит от числа отзывов.
+        """
+        from collections import defaultdict
+        from django.db import transaction
+        from django.db.models import Count
+        from django.utils import timezone
+        from .cache import bump_generation
+
+        with transaction.atomic():
+            if status == 'approved':
+                changed, sign = self.exclude(moderation_status='approved'), 1
+            else:
+                changed, sign = self.filter(moderation_status='approved'), -1
+            changes = defaultdict(dict)
+            groups = changed.order_by().values('tour_id', 'rating').annotate(n=Count('pk'))
+            for group in groups:
+                changes[group['tour_id']][group['rating']] = sign * group['n']
+
+            updated = self.update(moderation_status=status, updated_at=timezone.now())
+            for tour_id, tour_changes in changes.items():
+                Tour.apply_rating_changes(tour_id, tour_changes)
+
+        # update() не вызывает сигналы - кэш API обновляем сами
+        bump_generation(Review, Tour)
+        return updated
 
 
 class Review(models.Model):
@@ -243,6 +981,10 @@ class Review(models.Model):
     )
     
     created_at = models.DateTimeField('Создан', auto_now_add=True)
+    updated_at = models.DateTimeField('Обновлен', auto_now=True)
+    ingest_id = models.UUIDField('id в очереди', blank=True, null=True, unique=True, editable=False)
+
+    objects = ReviewQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Отзыв'
@@ -250,11 +992,206 @@ class Review(models.Model):
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['moderation_status', 'rating']),
+            # Лента отзывов тура по курсору и превью (см. ReviewViewSet)
+            models.Index(fields=['tour', 'moderation_status', 'created_at']),
+            models.Index(fields=['moderation_status', 'created_at']),
         ]
 
     def __str__(self):
         return f"Отзыв от {self.client_name} - {self.tour.title}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_state()
+        return instance
+
+    def remember_state(self):
+        """Запомнить состояние из базы, чтобы при сохранении знать изменения"""
+        self._saved_state = (self.tour_id, self.moderation_status, self.rating)
+
+    def is_public_change(self, deleted=False):
+        """Отзыв был или стал одобренным: меняются рейтинг и страница тура"""
+        saved = getattr(self, '_saved_state', None)
+        if saved and saved[1] == 'approved':
+            return True
+        return not deleted and self.moderation_status == 'approved'
+
+    def rating_changes(self, deleted=False):
+        """{tour_id: {оценка: изменение}} относительно сохраненного состояния"""
+        from collections import defaultdict
+        changes = defaultdict(lambda: defaultdict(int))
+        saved = getattr(self, '_saved_state', None)
+        if saved and saved[1] == 'approved':
+            changes[saved[0]][saved[2]] -= 1
+        if not deleted and self.moderation_status == 'approved':
+            changes[self.tour_id][self.rating] += 1
+        return changes
+
+
+class SearchTerm(models.Model):
+    """Инвертированный индекс поиска по турам (см. tours/search.py)"""
+    tour = models.ForeignKey(
+        Tour,
+        on_delete=models.CASCADE,
+        related_name='search_terms',
+        verbose_name='Тур'
+    )
+    term = models.CharField('Основа слова', max_length=64)
+    weight = models.FloatField('Вес', default=1.0)
+
+    class Meta:
+        verbose_name = 'Поисковый термин'
+        verbose_name_plural = 'Поисковый индекс'
+        unique_together = ['tour', 'term']
+        indexes = [
+            models.Index(fields=['term', 'tour']),
+        ]
+
+    def __str__(self):
+        return f"{self.term} ({self.tour_id})"
+
+
+class TourCard(models.Model):
+    """Сводка для карточки тура в каталоге.
+
+    Денормализованная копия данных из TourPhoto и TourDate, обновляется
+    сигналами (см. tours/signals.py) и командой rebuild_tour_cards.
+    Каталог читает карточку одним JOIN. Статистика отзывов - в Tour.
+    """
+    tour = models.OneToOneField(
+        Tour,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='card',
+        verbose_name='Тур'
+    )
+    cover_photo = models.ForeignKey(
+        TourPhoto,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='Обложка'
+    )
+    nearest_date = models.ForeignKey(
+        TourDate,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='Ближайшая дата'
+    )
+    seats_left = models.PositiveIntegerField('Свободных мест', default=0)
+    updated_at = models.DateTimeField('Обновлена', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Карточка тура'
+        verbose_name_plural = 'Карточки туров'
+        indexes = [
+            models.Index(fields=['updated_at']),
+        ]
+
+    def __str__(self):
+        return f"Карточка: {self.tour_id}"
+
+    @staticmethod
+    def summary_queryset():
+        """Туры с вычисленными полями карточки (по подзапросу на поле)"""
+        from django.db.models import OuterRef, Subquery
+        from django.utils import timezone
+
+        cover = TourPhoto.objects.filter(
+            tour=OuterRef('pk'), is_cover=True
+        ).order_by('display_order', '-created_at')
+        nearest = TourDate.objects.filter(
+            tour=OuterRef('pk'),
+            start_date__gte=timezone.now().date(),
+            status='available',
+            available_seats__gt=0
+        ).order_by('start_date')
+        return Tour.objects.order_by().annotate(
+            card_cover_id=Subquery(cover.values('pk')[:1]),
+            card_date_id=Subquery(nearest.values('pk')[:1]),
+            card_seats=Subquery(nearest.values('available_seats')[:1]),
+        ).values_list('pk', 'card_cover_id', 'card_date_id', 'card_seats')
+
+    @classmethod
+    def refresh(cls, tour_ids=None, batch_size=1000):
+        """Пересчитывает карточки указанных туров (или всех, если None)"""
+        queryset = cls.summary_queryset()
+        if tour_ids is not None:
+            queryset = queryset.filter(pk__in=list(tour_ids))
+
+        cards = []
+        refreshed = 0
+        for tour_id, cover_id, date_id, seats in queryset.iterator():
+            cards.append(cls(
+                tour_id=tour_id,
+                cover_photo_id=cover_id,
+                nearest_date_id=date_id,
+                seats_left=seats or 0,
+            ))
+            if len(cards) >= batch_size:
+                refreshed += cls._upsert(cards)
+                cards = []
+        if cards:
+            refreshed += cls._upsert(cards)
+        # bulk_create не вызывает сигналы - сбрасываем кэш каталога сами
+        from .cache import bump_generation
+        bump_generation(cls)
+        return refreshed
+
+    @staticmethod
+    def is_stale(tour, today):
+        """Карточки нет или ее ближайшая дата уже прошла"""
+        try:
+            card = tour.card
+        except TourCard.DoesNotExist:
+            return True
+        return bool(card.nearest_date and card.nearest_date.start_date < today)
+
+    @classmethod
+    def stale_tour_ids(cls):
+        from django.utils import timezone
+
+        today = timezone.now().date()
+        return Tour.objects.filter(
+            models.Q(card__isnull=True) | models.Q(card__nearest_date__start_date__lt=today)
+        ).values_list('pk', flat=True)
+
+    @classmethod
+    def ensure_fresh(cls, tours):
+        """Пересчитать устаревшие карточки страницы каталога одной пачкой.
+
+        Карточка устаревает со временем, без записи в базу: ближайшая дата
+        проходит. Туры страницы должны быть загружены с card__nearest_date.
+        """
+        from django.db import DEFAULT_DB_ALIAS
+        from django.utils import timezone
+
+        today = timezone.now().date()
+        stale = {tour.pk: tour for tour in tours if cls.is_stale(tour, today)}
+        if not stale:
+            return
+        cls.refresh(stale)
+        # Только что записанные карточки - из основной базы, не из реплики
+        cards = cls.objects.using(DEFAULT_DB_ALIAS).select_related(
+            'cover_photo', 'nearest_date'
+        ).in_bulk(list(stale))
+        for tour_id, tour in stale.items():
+            tour.card = cards[tour_id]
+
+    @classmethod
+    def _upsert(cls, cards):
+        cls.objects.bulk_create(
+            cards,
+            update_conflicts=True,
+            unique_fields=['tour'],
+            update_fields=['cover_photo', 'nearest_date', 'seats_left', 'updated_at'],
+        )
+        return len(cards)
+
 
 class FAQ(models.Model):
     """Часто задаваемые вопросы"""
@@ -299,6 +1236,8 @@ class BlogPost(models.Model):
     excerpt = models.TextField('Краткое описание', max_length=300)
     category = models.CharField('Категория', max_length=50, choices=CATEGORY_CHOICES)
     cover_image = models.ImageField('Обложка', upload_to='blog/', blank=True, null=True)
+    cover_variants = models.JSONField('Копии обложки', default=dict, blank=True,
+                                      editable=False)
     
     is_published = models.BooleanField('Опубликована', default=False)
     published_at = models.DateTimeField('Дата публикации', blank=True, null=True)
@@ -311,6 +1250,8 @@ class BlogPost(models.Model):
         ordering = ['-published_at', '-created_at']
         indexes = [
             models.Index(fields=['category', 'is_published']),
+            models.Index(fields=['is_published', 'published_at']),
+            models.Index(fields=['updated_at']),
         ]
 
     def __str__(self):
@@ -346,11 +1287,15 @@ class Lead(models.Model):
     status = models.CharField('Статус', max_length=20, choices=STATUS_CHOICES, default='new')
     
     created_at = models.DateTimeField('Создан', auto_now_add=True)
+    ingest_id = models.UUIDField('id в очереди', blank=True, null=True, unique=True, editable=False)
 
     class Meta:
         verbose_name = 'Лид'
         verbose_name_plural = 'Лиды'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at']),
+        ]
 
     def __str__(self):
         return f"Лид #{self.id} - {self.name}"
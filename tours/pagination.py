@@ -0,0 +1,261 @@
+import base64
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import InvalidPage, Paginator
+from django.db import connections
+from django.db.models import F, Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
+from rest_framework import pagination
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def _encode_value(value):
+    # DjangoJSONEncoder обрезает микросекунды, а курсору нужна точность
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+def estimate_count(queryset):
+    """Оценка числа строк по плану запроса (только PostgreSQL)"""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator для списков админки по большим таблицам.
+
+    Точный COUNT(*) считается не дальше exact_limit строк (подзапрос с
+    LIMIT), поэтому его стоимость не растет с таблицей. Если строк больше,
+    число - оценка по плану запроса (PostgreSQL), а без нее - exact_limit:
+    дальние страницы доступны через фильтры и date_hierarchy.
+    """
+    exact_limit = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list.order_by()
+        count = queryset[:self.exact_limit + 1].count()
+        if count <= self.exact_limit:
+            return count
+        estimate = estimate_count(queryset)
+        return max(estimate or 0, self.exact_limit)
+
+
+class PageNumberPagination(pagination.PageNumberPagination):
+    """Постраничная пагинация DRF с асинхронным вариантом для ASGI-вьюх"""
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        paginator = self.django_paginator_class(queryset, page_size)
+        # count - cached_property: считаем асинхронно и подставляем заранее
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(
+                page_number=page_number, message=str(exc)
+            ))
+        self.page.object_list = [row async for row in self.page.object_list]
+
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        self.request = request
+        return list(self.page)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Пагинация по ключу (keyset) без COUNT(*) и OFFSET.
+
+    Курсор хранит значение поля сортировки и pk последней строки страницы,
+    следующая страница выбирается условием
+    (field, pk) > (value, id) по индексу - стоимость не растет с номером
+    страницы. pk разрешает равные значения поля сортировки.
+
+    ?count=exact - добавить точное число результатов,
+    ?count=estimate - оценку по плану запроса (PostgreSQL).
+    """
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    invalid_cursor_message = 'Неверный курсор'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = self.get_count(queryset, request)
+        return self.set_page(list(self.page_queryset(queryset, request, view)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        self.count = await self.aget_count(queryset, request)
+        rows = [row async for row in self.page_queryset(queryset, request, view)]
+        return self.set_page(rows)
+
+    def page_queryset(self, queryset, request, view):
+        """Запрос страницы: на одну строку больше, чтобы узнать о следующей"""
+        self.request = request
+        self.field, self.descending = self.get_ordering(request, queryset, view)
+
+        position = self.decode_cursor(request, queryset.model)
+        if position is not None:
+            queryset = queryset.filter(self.after(*position))
+        return queryset.order_by(*self.order_by())[:self.page_size + 1]
+
+    def set_page(self, rows):
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        payload = {'next': self.get_next_link(), 'results': data}
+        if self.count is not None:
+            payload['count'] = self.count
+        return Response(payload)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'count': {'type': 'integer', 'nullable': True},
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_ordering(self, request, queryset, view):
+        """Поле сортировки - из OrderingFilter вьюхи или Meta.ordering"""
+        ordering = None
+        for backend in getattr(view, 'filter_backends', []):
+            if issubclass(backend, OrderingFilter):
+                ordering = backend().get_ordering(request, queryset, view)
+                break
+        if not ordering:
+            ordering = getattr(view, 'ordering', None) or queryset.model._meta.ordering
+        if isinstance(ordering, str):
+            ordering = [ordering]
+        field = ordering[0]
+        return field.lstrip('-'), field.startswith('-')
+
+    def order_by(self):
+        if self.descending:
+            return [F(self.field).desc(nulls_last=True), '-pk']
+        return [F(self.field).asc(nulls_last=True), 'pk']
+
+    def after(self, value, pk):
+        """Условие "строго после (value, pk)" при NULL в конце выдачи"""
+        tail = 'lt' if self.descending else 'gt'
+        if value is None:
+            return Q(**{f'{self.field}__isnull': True, f'pk__{tail}': pk})
+        return (
+            Q(**{f'{self.field}__{tail}': value})
+            | Q(**{self.field: value, f'pk__{tail}': pk})
+            | Q(**{f'{self.field}__isnull': True})
+        )
+
+    def get_count(self, queryset, request):
+        mode = request.query_params.get(self.count_query_param)
+        if mode == 'exact':
+            return queryset.count()
+        if mode == 'estimate':
+            return estimate_count(queryset)
+        return None
+
+    async def aget_count(self, queryset, request):
+        mode = request.query_params.get(self.count_query_param)
+        if mode == 'exact':
+            return await queryset.acount()
+        if mode == 'estimate':
+            return await sync_to_async(estimate_count)(queryset)
+        return None
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        position = [getattr(last, self.field), last.pk]
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.count_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(position))
+
+    def encode_cursor(self, position):
+        raw = json.dumps(position, default=_encode_value, separators=(',', ':'))
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4))
+            value, pk = json.loads(raw)
+            return self.clean_position(model, value, pk)
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def clean_position(self, model, value, pk):
+        """Значения курсора через поля модели: подделанный курсор - 404, а не 500"""
+        if pk is None:
+            raise ValueError('pk')
+        pk = self.clean_value(model._meta.pk, pk)
+        if value is None:
+            return value, pk
+        try:
+            field = model._meta.get_field(self.field)
+        except FieldDoesNotExist:
+            # Сортировка по аннотации: годится любое скалярное значение
+            field = None
+        if field is None:
+            if not isinstance(value, (str, int, float)):
+                raise ValueError(self.field)
+            return value, pk
+        return self.clean_value(field, value), pk
+
+    @staticmethod
+    def clean_value(field, value):
+        if isinstance(value, (list, dict)):
+            raise ValueError(field.name)
+        value = field.to_python(value)
+        # Диапазон целых полей: иначе переполнение в драйвере базы
+        field.run_validators(value)
+        return value
+
+
+class OptionalKeysetPaginationMixin:
+    """
+    Включает KeysetPagination по запросу клиента:
+    ?pagination=cursor или наличие параметра cursor.
+    Без них работает обычная постраничная пагинация из настроек.
+    """
+    keyset_pagination_class = KeysetPagination
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params
+            if params.get('pagination') == 'cursor' or 'cursor' in params:
+                self._paginator = self.keyset_pagination_class()
+            elif self.pagination_class is None:
+                self._paginator = None
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
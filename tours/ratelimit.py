@@ -0,0 +1,132 @@
+"""
+Ограничение частоты публичных POST-запросов (token bucket).
+
+У каждого маршрута из RATE_LIMITS два ведра: на клиента (IP) и общее.
+Ведра хранятся в отдельном файле SQLite (RATE_LIMIT_DB), общем для всех
+процессов gunicorn на машине: пополнение и списание токена - один UPSERT
+с RETURNING, гонку между процессами решает блокировка записи SQLite.
+Основная база при этом не трогается.
+
+При ошибке хранилища (файл занят дольше BUSY_TIMEOUT_MS) запрос
+пропускается: ограничитель не должен ронять сайт.
+"""
+import logging
+import math
+import os
+import random
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+BUSY_TIMEOUT_MS = 50
+# Ведра, не менявшиеся дольше, удаляются (примерно раз на CLEANUP_EVERY вызовов)
+IDLE_SECONDS = 3600
+CLEANUP_EVERY = 1000
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS buckets (
+    key TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL,
+    ok INTEGER NOT NULL
+) WITHOUT ROWID
+'''
+
+# Пополнение на прошедшее время (не больше емкости), затем списание
+# токена, если после пополнения есть целый токен. Выражения SET видят
+# значения строки до обновления
+TAKE = '''
+INSERT INTO buckets (key, tokens, updated, ok) VALUES (:key, :capacity - 1, :now, 1)
+ON CONFLICT (key) DO UPDATE SET
+    tokens = CASE
+        WHEN min(:capacity, tokens + max(:now - updated, 0) * :rate) >= 1
+        THEN min(:capacity, tokens + max(:now - updated, 0) * :rate) - 1
+        ELSE min(:capacity, tokens + max(:now - updated, 0) * :rate)
+    END,
+    ok = min(:capacity, tokens + max(:now - updated, 0) * :rate) >= 1,
+    updated = :now
+RETURNING tokens, ok
+'''
+
+# Возврат токена, если запрос отклонило следующее ведро
+REFUND = 'UPDATE buckets SET tokens = min(:capacity, tokens + 1) WHERE key = :key'
+
+_local = threading.local()
+
+
+def get_connection():
+    """Соединение на поток; после fork воркера gunicorn - новое"""
+    connection = getattr(_local, 'connection', None)
+    if connection is None or _local.pid != os.getpid():
+        # Создание файла и схемы при старте воркеров ждет дольше запросов
+        connection = sqlite3.connect(
+            settings.RATE_LIMIT_DB, timeout=5,
+            isolation_level=None, check_same_thread=False,
+        )
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=OFF')
+        connection.execute(SCHEMA)
+        connection.execute(f'PRAGMA busy_timeout={BUSY_TIMEOUT_MS}')
+        _local.connection, _local.pid = connection, os.getpid()
+    return connection
+
+
+def take(key, capacity, rate, now=None):
+    """Взять токен из ведра; (True, 0) или (False, секунд до токена)"""
+    now = time.time() if now is None else now
+    connection = get_connection()
+    tokens, ok = connection.execute(
+        TAKE, {'key': key, 'capacity': capacity, 'rate': rate, 'now': now}
+    ).fetchone()
+    if random.randrange(CLEANUP_EVERY) == 0:
+        connection.execute('DELETE FROM buckets WHERE updated < ?', (now - IDLE_SECONDS,))
+    if ok:
+        return True, 0
+    return False, max(1, math.ceil((1 - tokens) / rate))
+
+
+def refund(key, capacity):
+    get_connection().execute(REFUND, {'key': key, 'capacity': capacity})
+
+
+def client_ip(request):
+    """IP клиента; за RATE_LIMIT_PROXY_COUNT прокси - из X-Forwarded-For"""
+    proxies = settings.RATE_LIMIT_PROXY_COUNT
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
+    if proxies and forwarded:
+        # Адреса слева клиент может подделать, доверяем добавленным прокси
+        hops = [hop.strip() for hop in forwarded.split(',')]
+        return hops[max(len(hops) - proxies, 0)]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def check(request):
+    """None, если запрос можно выполнить, иначе секунды для Retry-After"""
+    route = f'{request.method} {request.path_info}'
+    limits = settings.RATE_LIMITS.get(route)
+    if not limits:
+        return None
+    buckets = []
+    if 'client' in limits:
+        buckets.append((f'{route} {client_ip(request)}', *limits['client']))
+    if 'global' in limits:
+        buckets.append((route, *limits['global']))
+    try:
+        # Отказ по ведру клиента не тратит общий токен, отказ по общему
+        # ведру возвращает токен клиента: отклоненный запрос не расходует лимит
+        taken = []
+        for key, capacity, rate in buckets:
+            ok, retry_after = take(key, capacity, rate)
+            if not ok:
+                for key, capacity in taken:
+                    refund(key, capacity)
+                return retry_after
+            taken.append((key, capacity))
+    except sqlite3.Error as exc:
+        logger.warning('Ограничитель запросов недоступен: %s', exc)
+    return None
@@ -0,0 +1,52 @@
+"""
+Нормализация названий регионов для справочника Region.
+
+Псевдонимы региона (RegionAlias) хранятся в нормализованном виде:
+нижний регистр, 'ё' -> 'е', дефисы и повторные пробелы - в один пробел.
+Поэтому 'Самцхе-Джавахети', 'самцхе  джавахети' и транслитерация
+'samtskhe-dzhavakheti' находят один регион одним запросом по индексу.
+"""
+import re
+
+
+TRANSLIT = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'e',
+    'ж': 'zh', 'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm',
+    'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u',
+    'ф': 'f', 'х': 'kh', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'shch',
+    'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
+}
+
+SEPARATORS_RE = re.compile(r'[\s\-_]+')
+# Несколько регионов в одной строке: 'Тбилиси, Казбеги', 'Тбилиси + Мцхета'
+LIST_RE = re.compile(r'\s*[,;/+]\s*')
+
+
+def normalize(text):
+    text = (text or '').lower().replace('ё', 'е')
+    return SEPARATORS_RE.sub(' ', text).strip()
+
+
+def transliterate(text):
+    return ''.join(TRANSLIT.get(char, char) for char in normalize(text))
+
+
+def aliases(*names):
+    """Нормализованные псевдонимы для названий: как есть и латиницей"""
+    result = set()
+    for name in names:
+        for variant in (normalize(name), transliterate(name)):
+            if variant:
+                result.add(variant)
+    return result
+
+
+def region_names(text):
+    """Регионы, перечисленные в строке, по порядку"""
+    return [part.strip() for part in LIST_RE.split(text or '') if part.strip()]
+
+
+def main_region_name(text):
+    """Первый регион из строки, где их может быть перечислено несколько"""
+    names = region_names(text)
+    return names[0] if names else ''
@@ -0,0 +1,83 @@
+"""
+Маршрутизация запросов к базам: чтение в GET - на READ_DATABASES.
+
+ReadOnlyRequestMiddleware помечает GET/HEAD-запросы, и чтения в них идут
+на READ_DATABASES: реплики Postgres (DATABASE_REPLICA_URLS) или
+соединения только для чтения к тому же файлу SQLite (см.
+config/settings.py). Запись и чтение внутри транзакции всегда идут в
+default: транзакция должна видеть свои записи.
+
+Реплики отстают от основной базы. Чтобы клиент сразу видел свою заявку
+или отзыв, после успешного POST/PUT/PATCH/DELETE ему ставится cookie
+STICKY_COOKIE, и READ_YOUR_WRITES_SECONDS секунд все его запросы
+читают из default. Фронтенд открыт с другого сайта (GitHub Pages),
+поэтому cookie - SameSite=None; Secure и доходит только в fetch с
+credentials: 'include'. Браузеры, блокирующие сторонние cookie, срок
+берут из заголовка ответа STICKY_HEADER и присылают его обратно.
+"""
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+read_only_request = ContextVar('read_only_request', default=False)
+
+STICKY_COOKIE = 'db_primary_until'
+STICKY_HEADER = 'X-Primary-Until'
+SAFE_METHODS = ('GET', 'HEAD')
+
+
+def reads_from_replica(request):
+    """Можно ли читать в этом запросе из READ_DATABASES"""
+    if request.method not in SAFE_METHODS:
+        return False
+    until = request.COOKIES.get(STICKY_COOKIE) or request.headers.get(STICKY_HEADER, 0)
+    try:
+        return float(until) < time.time()
+    except ValueError:
+        return True
+
+
+def stick_to_primary(request, response):
+    """После успешной записи клиент читает из default (отставание реплик)"""
+    seconds = settings.READ_YOUR_WRITES_SECONDS
+    if (request.method in SAFE_METHODS or response.status_code >= 400
+            or not seconds or not settings.READ_DATABASES):
+        return
+    until = str(int(time.time() + seconds))
+    response.set_cookie(
+        STICKY_COOKIE, until,
+        max_age=seconds, httponly=True, samesite='None', secure=True,
+    )
+    response[STICKY_HEADER] = until
+
+
+def replica_lag_possible():
+    """Читает ли текущий запрос из реплик, которые могут отставать"""
+    return bool(
+        read_only_request.get() and settings.READ_DATABASES
+        and settings.READ_YOUR_WRITES_SECONDS
+    )
+
+
+class ReadRouter:
+    def db_for_read(self, model, **hints):
+        if not settings.READ_DATABASES or not read_only_request.get():
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(settings.READ_DATABASES)
+
+    def db_for_write(self, model, **hints):
+        # Явно: иначе Django пишет объект в базу, из которой его прочитали
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Во всех алиасах одни и те же данные
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
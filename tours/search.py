@@ -0,0 +1,254 @@
+"""
+Полнотекстовый поиск по турам.
+
+На SQLite используется собственный инвертированный индекс (SearchTerm):
+слова из названия, региона и описаний приводятся к основе стеммером
+Snowball для русского языка и хранятся по одной строке на пару
+(тур, основа). Запрос ищет основы по диапазону индекса, поэтому время
+поиска не зависит от длины описаний.
+
+На PostgreSQL используется встроенный полнотекстовый поиск с конфигурацией
+'russian' и GIN-индексом по тому же выражению (см. миграцию 0004).
+"""
+import re
+
+from django.db import connections, transaction
+from django.db.models import (
+    BooleanField, Case, F, FloatField, OuterRef, Q, Subquery, Sum, Value, When,
+)
+from django.db.models.expressions import RawSQL
+
+
+# Веса полей при ранжировании
+FIELD_WEIGHTS = {
+    'title': 4.0,
+    'region': 3.0,
+    'description_short': 2.0,
+    'description_full': 1.0,
+}
+
+MAX_QUERY_TERMS = 8
+MAX_TERM_LENGTH = 64
+
+STOP_WORDS = {
+    'и', 'в', 'во', 'не', 'на', 'с', 'со', 'по', 'к', 'ко', 'у', 'о', 'об',
+    'от', 'до', 'за', 'из', 'для', 'а', 'но', 'или', 'что', 'как', 'это',
+    'же', 'ли', 'бы', 'то', 'вы', 'мы', 'он', 'она', 'они', 'все', 'вас',
+}
+
+WORD_RE = re.compile(r'[0-9a-zа-я]+')
+
+# Стеммер Snowball для русского языка
+RV_RE = re.compile(r'^(.*?[аеиоуыэюя])(.*)$')
+PERFECTIVE_GERUND_RE = re.compile(
+    r'((ив|ивши|ившись|ыв|ывши|ывшись)|((?<=[ая])(в|вши|вшись)))$'
+)
+REFLEXIVE_RE = re.compile(r'(с[яь])$')
+ADJECTIVE_RE = re.compile(
+    r'(ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|их|ых|'
+    r'ую|юю|ая|яя|ою|ею)$'
+)
+PARTICIPLE_RE = re.compile(r'((ивш|ывш|ующ)|((?<=[ая])(ем|нн|вш|ющ|щ)))$')
+VERB_RE = re.compile(
+    r'((ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло|ено|'
+    r'ят|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю)|'
+    r'((?<=[ая])(ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно)))$'
+)
+NOUN_RE = re.compile(
+    r'(а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием|ем|'
+    r'ам|ом|о|у|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я)$'
+)
+DERIVATIONAL_RE = re.compile(r'.*[^аеиоуыэюя]+[аеиоуыэюя].*ость?$')
+DERIVATIONAL_SUFFIX_RE = re.compile(r'ость?$')
+SUPERLATIVE_RE = re.compile(r'(ейше|ейш)$')
+
+
+def stem(word):
+    """Основа русского слова (Snowball). Латиница возвращается как есть."""
+    match = RV_RE.match(word)
+    if not match:
+        return word
+    prefix, rv = match.groups()
+
+    result = PERFECTIVE_GERUND_RE.sub('', rv, 1)
+    if result == rv:
+        rv = REFLEXIVE_RE.sub('', rv, 1)
+        result = ADJECTIVE_RE.sub('', rv, 1)
+        if result != rv:
+            rv = PARTICIPLE_RE.sub('', result, 1)
+        else:
+            result = VERB_RE.sub('', rv, 1)
+            rv = NOUN_RE.sub('', rv, 1) if result == rv else result
+    else:
+        rv = result
+
+    if rv.endswith('и'):
+        rv = rv[:-1]
+    if DERIVATIONAL_RE.match(rv):
+        rv = DERIVATIONAL_SUFFIX_RE.sub('', rv, 1)
+
+    if rv.endswith('ь'):
+        rv = rv[:-1]
+    else:
+        rv = SUPERLATIVE_RE.sub('', rv, 1)
+        if rv.endswith('нн'):
+            rv = rv[:-1]
+    return prefix + rv
+
+
+def tokenize(text):
+    """Слова текста в нижнем регистре, без стоп-слов"""
+    text = (text or '').lower().replace('ё', 'е')
+    return [word for word in WORD_RE.findall(text) if word not in STOP_WORDS]
+
+
+def terms(text):
+    """Множество основ слов текста"""
+    return {stem(word)[:MAX_TERM_LENGTH] for word in tokenize(text)}
+
+
+def query_terms(query):
+    """Основы слов поискового запроса (не больше MAX_QUERY_TERMS)"""
+    result = []
+    for word in tokenize(query):
+        term = stem(word)[:MAX_TERM_LENGTH]
+        if term and term not in result:
+            result.append(term)
+    return result[:MAX_QUERY_TERMS]
+
+
+def tour_document(tour):
+    """Вес каждой основы в документе тура.
+
+    Учитывается только наличие слова в поле, а не частота, чтобы длинное
+    описание не вытесняло совпадения в названии.
+    """
+    weights = {}
+    for field, weight in FIELD_WEIGHTS.items():
+        for term in terms(getattr(tour, field)):
+            weights[term] = weights.get(term, 0.0) + weight
+    return weights
+
+
+def uses_postgres(queryset):
+    return connections[queryset.db].vendor == 'postgresql'
+
+
+def index_tour(tour):
+    """Перестраивает записи инвертированного индекса для тура"""
+    from .models import SearchTerm
+
+    if uses_postgres(SearchTerm.objects.all()):
+        # На PostgreSQL индекс поддерживает сама база
+        return
+    with transaction.atomic():
+        SearchTerm.objects.filter(tour=tour).delete()
+        SearchTerm.objects.bulk_create([
+            SearchTerm(tour=tour, term=term, weight=weight)
+            for term, weight in tour_document(tour).items()
+        ])
+
+
+def rebuild_index(batch_size=500):
+    """Полная перестройка индекса, возвращает число проиндексированных туров"""
+    from .models import Tour, SearchTerm
+
+    if uses_postgres(SearchTerm.objects.all()):
+        return 0
+    # Одной транзакцией: поиск до коммита видит старый индекс, а не пустой
+    with transaction.atomic():
+        SearchTerm.objects.all().delete()
+        count = 0
+        batch = []
+        fields = ['pk', *FIELD_WEIGHTS]
+        for tour in Tour.objects.only(*fields).iterator(chunk_size=batch_size):
+            batch.extend(
+                SearchTerm(tour_id=tour.pk, term=term, weight=weight)
+                for term, weight in tour_document(tour).items()
+            )
+            count += 1
+            if len(batch) >= batch_size:
+                SearchTerm.objects.bulk_create(batch)
+                batch = []
+        SearchTerm.objects.bulk_create(batch)
+    return count
+
+
+def _term_prefix(term):
+    """Совпадение по префиксу основы как диапазон индекса по term"""
+    return Q(term__gte=term, term__lt=term + '\uffff')
+
+
+def _empty(queryset):
+    return queryset.annotate(search_rank=Value(0.0, output_field=FloatField())).none()
+
+
+def search_index(queryset, query):
+    """Поиск по SearchTerm: все слова запроса должны найтись (по префиксу)"""
+    from .models import SearchTerm
+
+    stems = query_terms(query)
+    if not stems:
+        return _empty(queryset)
+
+    any_term = Q()
+    for term in stems:
+        queryset = queryset.filter(
+            pk__in=SearchTerm.objects.filter(_term_prefix(term)).values('tour_id')
+        )
+        any_term |= _term_prefix(term)
+
+    # Точное совпадение основы весит вдвое больше, чем совпадение по префиксу
+    rank = SearchTerm.objects.filter(any_term, tour=OuterRef('pk')).order_by().values(
+        'tour'
+    ).annotate(
+        rank=Sum(Case(
+            When(term__in=stems, then=F('weight')),
+            default=F('weight') / 2,
+        ))
+    ).values('rank')
+    return queryset.annotate(search_rank=Subquery(rank))
+
+
+# Выражение tsvector. Совпадает с выражением GIN-индекса в миграции,
+# иначе PostgreSQL не сможет его использовать.
+PG_SEARCH_VECTOR = (
+    "setweight(to_tsvector('russian'::regconfig, coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('russian'::regconfig, coalesce(region, '')), 'B') || "
+    "setweight(to_tsvector('russian'::regconfig, coalesce(description_short, '')), 'C') || "
+    "setweight(to_tsvector('russian'::regconfig, coalesce(description_full, '')), 'D')"
+)
+
+
+def pg_tsquery(query):
+    """Запрос для to_tsquery: все слова, каждое по префиксу"""
+    words = tokenize(query)[:MAX_QUERY_TERMS]
+    return ' & '.join(f'{word}:*' for word in words)
+
+
+def search_postgres(queryset, query):
+    tsquery = pg_tsquery(query)
+    if not tsquery:
+        return _empty(queryset)
+    table = queryset.model._meta.db_table
+    vector = PG_SEARCH_VECTOR
+    for field in FIELD_WEIGHTS:
+        vector = vector.replace(f'coalesce({field},', f'coalesce("{table}"."{field}",')
+    matches = RawSQL(
+        f"({vector}) @@ to_tsquery('russian'::regconfig, %s)", [tsquery],
+        output_field=BooleanField(),
+    )
+    return queryset.filter(matches).annotate(
+        search_rank=RawSQL(
+            f"ts_rank({vector}, to_tsquery('russian'::regconfig, %s))", [tsquery],
+            output_field=FloatField(),
+        )
+    )
+
+
+def search_tours(queryset, query):
+    """Отфильтровать туры по запросу и добавить аннотацию search_rank"""
+    if uses_postgres(queryset):
+        return search_postgres(queryset, query)
+    return search_index(queryset, query)
+
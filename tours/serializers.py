@@ -1,23 +1,40 @@
+from django.conf import settings
 from rest_framework import serializers
+from .images import best_url, build_srcset
+from .metrics import TimedSerializerMixin
 from .models import (
     TourOperator, Tour, TourPhoto, TourDate, 
-    Booking, Review, FAQ, BlogPost, Lead
+    Booking, Review, TourCard, FAQ, BlogPost, Lead, SeatsUnavailable, Region,
+    SeatHold
 )
 
 
-class TourOperatorSerializer(serializers.ModelSerializer):
+class TourOperatorSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = TourOperator
         fields = ['id', 'name', 'description', 'logo', 'phone', 'email']
 
 
-class TourPhotoSerializer(serializers.ModelSerializer):
+class RegionSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    tours_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Region
+        fields = ['id', 'name', 'slug', 'tours_count']
+
+
+class TourPhotoSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    srcset = serializers.SerializerMethodField()
+
     class Meta:
         model = TourPhoto
-        fields = ['id', 'photo', 'display_order', 'is_cover']
+        fields = ['id', 'photo', 'srcset', 'display_order', 'is_cover']
 
+    def get_srcset(self, obj):
+        return build_srcset(self.context.get('request'), obj.variants, obj.photo.name)
 
-class TourDateSerializer(serializers.ModelSerializer):
+
+class TourDateSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     is_available = serializers.SerializerMethodField()
     
     class Meta:
@@ -29,52 +46,94 @@ class TourDateSerializer(serializers.ModelSerializer):
         return obj.available_seats > 0 and obj.status == 'available'
 
 
-class TourListSerializer(serializers.ModelSerializer):
+class TourListSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Для списка туров в каталоге"""
     tour_operator = TourOperatorSerializer(read_only=True)
     cover_photo = serializers.SerializerMethodField()
+    cover_srcset = serializers.SerializerMethodField()
     nearest_date = serializers.SerializerMethodField()
+    average_rating = serializers.SerializerMethodField()
+    reviews_count = serializers.SerializerMethodField()
     
     class Meta:
         model = Tour
         fields = ['id', 'title', 'slug', 'description_short', 'price_base', 
-                  'duration_days', 'tour_type', 'region', 'cover_photo', 
-                  'nearest_date', 'tour_operator']
+                  'duration_days', 'tour_type', 'region', 'main_region', 'cover_photo', 
+                  'cover_srcset', 'nearest_date', 'average_rating', 'reviews_count',
+                  'tour_operator']
+    
+    def get_card(self, obj):
+        """Карточка тура, если она есть и не устарела"""
+        from django.utils import timezone
+        try:
+            card = obj.card
+        except TourCard.DoesNotExist:
+            return None
+        # Ближайшая дата могла уже пройти, если карточку давно не пересчитывали
+        if card.nearest_date and card.nearest_date.start_date < timezone.now().date():
+            return None
+        return card
+    
+    def get_cover(self, obj):
+        card = self.get_card(obj)
+        if card:
+            return card.cover_photo
+        return obj.photos.filter(is_cover=True).first()
     
     def get_cover_photo(self, obj):
-        cover = obj.photos.filter(is_cover=True).first()
+        cover = self.get_cover(obj)
         if cover:
             request = self.context.get('request')
             if request:
-                return request.build_absolute_uri(cover.photo.url)
+                # Для карточки хватает копии CARD_IMAGE_WIDTH, пока ее нет - оригинал
+                url = best_url(cover.variants, cover.photo.name, settings.CARD_IMAGE_WIDTH)
+                return request.build_absolute_uri(url or cover.photo.url)
         return None
     
+    def get_cover_srcset(self, obj):
+        cover = self.get_cover(obj)
+        if cover:
+            return build_srcset(self.context.get('request'), cover.variants, cover.photo.name)
+        return ''
+    
     def get_nearest_date(self, obj):
         from django.utils import timezone
-        nearest = obj.dates.filter(
-            start_date__gte=timezone.now().date(),
-            status='available',
-            available_seats__gt=0
-        ).first()
+        card = self.get_card(obj)
+        if card:
+            nearest = card.nearest_date
+        else:
+            nearest = obj.dates.filter(
+                start_date__gte=timezone.now().date(),
+                status='available',
+                available_seats__gt=0
+            ).first()
         if nearest:
             return TourDateSerializer(nearest).data
         return None
+    
+    def get_average_rating(self, obj):
+        return obj.average_rating
+    
+    def get_reviews_count(self, obj):
+        return obj.rating_count
 
 
-class TourDetailSerializer(serializers.ModelSerializer):
+class TourDetailSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Детальная страница тура"""
     tour_operator = TourOperatorSerializer(read_only=True)
     photos = TourPhotoSerializer(many=True, read_only=True)
     dates = serializers.SerializerMethodField()
     reviews = serializers.SerializerMethodField()
     average_rating = serializers.SerializerMethodField()
+    rating_histogram = serializers.SerializerMethodField()
     
     class Meta:
         model = Tour
         fields = ['id', 'title', 'slug', 'description_short', 'description_full',
                   'price_base', 'duration_days', 'tour_type', 'max_people', 
-                  'region', 'included', 'not_included', 'program_by_days',
-                  'tour_operator', 'photos', 'dates', 'reviews', 'average_rating']
+                  'region', 'main_region', 'included', 'not_included', 'program_by_days',
+                  'tour_operator', 'photos', 'dates', 'reviews', 'average_rating',
+                  'rating_count', 'rating_histogram']
     
     def get_dates(self, obj):
         from django.utils import timezone
@@ -89,16 +148,41 @@ class TourDetailSerializer(serializers.ModelSerializer):
         return ReviewSerializer(reviews, many=True).data
     
     def get_average_rating(self, obj):
-        from django.db.models import Avg
-        avg = obj.reviews.filter(moderation_status='approved').aggregate(Avg('rating'))
-        return round(avg['rating__avg'], 1) if avg['rating__avg'] else None
+        return obj.average_rating
+    
+    def get_rating_histogram(self, obj):
+        return obj.rating_histogram
+
 
+class SeatHoldSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    class Meta:
+        model = SeatHold
+        fields = ['token', 'tour_date', 'seats', 'expires_at']
+        read_only_fields = ['token', 'expires_at']
+        extra_kwargs = {'seats': {'min_value': 1}}
+
+    def validate_tour_date(self, value):
+        if value.status != 'available':
+            raise serializers.ValidationError('Этот тур недоступен для бронирования')
+        return value
+
+    def create(self, validated_data):
+        hold = SeatHold.objects.hold(validated_data['tour_date'].pk, validated_data['seats'])
+        if hold is None:
+            raise serializers.ValidationError({
+                'seats': 'Недостаточно мест. Доступно: '
+                         f'{validated_data["tour_date"].available_seats}'
+            })
+        return hold
+
+
+class BookingCreateSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    hold_token = serializers.UUIDField(required=False, write_only=True)
 
-class BookingCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Booking
         fields = ['tour_date', 'client_name', 'client_phone', 'client_email', 
-                  'people_count', 'comment', 'source']
+                  'people_count', 'comment', 'source', 'hold_token']
     
     def validate_client_phone(self, value):
         """Валидация телефона"""
@@ -125,6 +209,10 @@ class BookingCreateSerializer(serializers.ModelSerializer):
         tour_date = data.get('tour_date')
         people_count = data.get('people_count')
         
+        # Места удержания уже списаны с даты - проверит Booking.take_seats
+        if data.get('hold_token'):
+            return data
+
         if tour_date.available_seats < people_count:
             raise serializers.ValidationError({
                 'people_count': f'Недостаточно мест. Доступно: {tour_date.available_seats}'
@@ -136,43 +224,79 @@ class BookingCreateSerializer(serializers.ModelSerializer):
             })
         
         return data
+    
+    def create(self, validated_data):
+        # validate() проверяет места заранее, но окончательно их списывает
+        # Booking.save одним условным UPDATE - параллельная заявка могла успеть
+        hold_token = validated_data.pop('hold_token', None)
+        booking = Booking(**validated_data)
+        booking.hold_token = hold_token
+        try:
+            booking.save()
+            return booking
+        except SeatsUnavailable:
+            raise serializers.ValidationError({
+                'people_count': 'Недостаточно мест. Места только что забронировали'
+            })
 
 
-class ReviewSerializer(serializers.ModelSerializer):
+class ReviewSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Review
         fields = ['id', 'client_name', 'client_city', 'rating', 'text', 
                   'photos', 'video_url', 'created_at']
 
 
-class ReviewCreateSerializer(serializers.ModelSerializer):
+class ReviewCreateSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Review
         fields = ['tour', 'client_name', 'client_city', 'rating', 'text', 
                   'photos', 'video_url']
 
 
-class FAQSerializer(serializers.ModelSerializer):
+class FAQSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = FAQ
         fields = ['id', 'question', 'answer', 'category']
 
 
-class BlogPostListSerializer(serializers.ModelSerializer):
+class BlogPostListSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    cover_srcset = serializers.SerializerMethodField()
+
     class Meta:
         model = BlogPost
         fields = ['id', 'title', 'slug', 'excerpt', 'category', 'cover_image', 
-                  'published_at']
+                  'cover_srcset', 'published_at']
 
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # В списке статей обложка - копия для карточки, если она готова
+        url = best_url(instance.cover_variants, instance.cover_image.name,
+                       settings.CARD_IMAGE_WIDTH)
+        if url:
+            request = self.context.get('request')
+            data['cover_image'] = request.build_absolute_uri(url) if request else url
+        return data
+
+    def get_cover_srcset(self, obj):
+        return build_srcset(self.context.get('request'), obj.cover_variants,
+                            obj.cover_image.name)
+
+
+class BlogPostDetailSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    cover_srcset = serializers.SerializerMethodField()
 
-class BlogPostDetailSerializer(serializers.ModelSerializer):
     class Meta:
         model = BlogPost
         fields = ['id', 'title', 'slug', 'content', 'excerpt', 'category', 
-                  'cover_image', 'published_at', 'updated_at']
+                  'cover_image', 'cover_srcset', 'published_at', 'updated_at']
+
+    def get_cover_srcset(self, obj):
+        return build_srcset(self.context.get('request'), obj.cover_variants,
+                            obj.cover_image.name)
 
 
-class LeadCreateSerializer(serializers.ModelSerializer):
+class LeadCreateSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Lead
         fields = ['name', 'phone', 'email', 'message', 'source']
@@ -0,0 +1,115 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from . import availability
+from .cache import bump_generation
+from .models import (
+    TourOperator, Tour, TourPhoto, TourDate, Booking, Review, TourCard,
+    FAQ, BlogPost, Region, RegionAlias, seats_changed
+)
+from .images import schedule_variants
+from .search import index_tour
+
+
+def schedule_card_refresh(tour_ids):
+    """Пересчитать карточки туров после коммита транзакции.
+
+    После коммита, чтобы при каскадном удалении тура не создавать
+    карточку для строки, которая вот-вот исчезнет.
+    """
+    tour_ids = {tour_id for tour_id in tour_ids if tour_id is not None}
+    if tour_ids:
+        # robust: ошибка пересчета не должна ломать уже сохраненную запись
+        transaction.on_commit(lambda: TourCard.refresh(tour_ids), robust=True)
+
+
+@receiver(post_save, sender=Tour)
+def tour_saved(sender, instance, created, **kwargs):
+    index_tour(instance)
+    if created:
+        schedule_card_refresh([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=TourPhoto)
+@receiver([post_save, post_delete], sender=TourDate)
+def tour_related_changed(sender, instance, **kwargs):
+    schedule_card_refresh([instance.tour_id])
+
+
+@receiver(post_save, sender=Review)
+def review_saved(sender, instance, **kwargs):
+    review_changed(instance)
+    instance.remember_state()
+
+
+@receiver(post_delete, sender=Review)
+def review_deleted(sender, instance, **kwargs):
+    review_changed(instance, deleted=True)
+
+
+def review_changed(review, deleted=False):
+    """Статистика и кэш туров - только при изменении одобренных отзывов.
+
+    Новые отзывы с сайта ждут модерации и каталог не меняют.
+    """
+    if not review.is_public_change(deleted):
+        return
+    for tour_id, tour_changes in review.rating_changes(deleted).items():
+        Tour.apply_rating_changes(tour_id, tour_changes)
+    bump_generation(Review, Tour)
+
+
+@receiver(post_save, sender=TourPhoto)
+@receiver(post_save, sender=BlogPost)
+def image_saved(sender, instance, **kwargs):
+    schedule_variants(instance)
+
+
+@receiver(post_save, sender=TourDate)
+def tour_date_saved(sender, instance, **kwargs):
+    availability.invalidate(*instance.calendar_days())
+    instance.remember_state()
+
+
+@receiver(post_delete, sender=TourDate)
+def tour_date_deleted(sender, instance, **kwargs):
+    availability.invalidate(*instance.calendar_days())
+
+
+@receiver([post_save, post_delete], sender=Booking)
+def booking_changed(sender, instance, **kwargs):
+    tour_dates_changed([instance.tour_date_id])
+
+
+@receiver(seats_changed)
+def seats_held_or_released(sender, tour_date_ids, **kwargs):
+    tour_dates_changed(tour_date_ids)
+    bump_generation(TourDate)
+
+
+def tour_dates_changed(tour_date_ids):
+    """Карточки и календарь дат, места которых изменились через update()"""
+    tour_days = list(TourDate.objects.filter(
+        pk__in=tour_date_ids
+    ).values_list('tour_id', 'start_date'))
+    schedule_card_refresh([tour_id for tour_id, _day in tour_days])
+    availability.invalidate(*tour_days)
+
+
+@receiver([post_save, post_delete], sender=TourOperator)
+@receiver([post_save, post_delete], sender=Tour)
+@receiver([post_save, post_delete], sender=TourPhoto)
+@receiver([post_save, post_delete], sender=TourDate)
+@receiver([post_save, post_delete], sender=FAQ)
+@receiver([post_save, post_delete], sender=BlogPost)
+@receiver([post_save, post_delete], sender=Region)
+@receiver([post_save, post_delete], sender=RegionAlias)
+def content_changed(sender, instance, **kwargs):
+    bump_generation(sender)
+
+
+@receiver([post_save, post_delete], sender=Booking)
+def booking_seats_changed(sender, instance, **kwargs):
+    # Места на дате меняются через update() без сигналов TourDate
+    bump_generation(TourDate)
@@ -1,3 +1,2062 @@
-from django.test import TestCase
+import csv
+import json
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, OperationalError
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .models import (
+    TourOperator, Tour, TourPhoto, TourDate, Booking, Review, TourCard, BlogPost,
+    SearchTerm, SeatsUnavailable, Lead, FAQ, Region, SeatHold
+)
+from .metrics import normalize_sql
+from .pagination import KeysetPagination
+
+
+# Кэш в памяти процесса вместо файлового кэша рабочей копии
+TEST_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(IMAGE_WORKERS=0, RATE_LIMIT_ENABLED=False, CACHES=TEST_CACHES)
+class APITestCase(TestCase):
+    """Кэш ответов API живет между тестами - очищаем перед каждым.
+
+    Копии изображений генерируются в процессе: процессы пула не видят
+    тестовую базу. Ограничитель частоты выключен: тесты шлют много POST
+    с одного адреса (его проверяет RateLimitTest).
+    """
+
+    def setUp(self):
+        cache.clear()
+
+
+def create_operator(**kwargs):
+    data = {'name': 'Грузинские приключения', 'phone': '+7 928 123-45-67'}
+    data.update(kwargs)
+    return TourOperator.objects.create(**data)
+
+
+def create_tour(operator, **kwargs):
+    data = {
+        'title': 'Тбилиси - сердце Грузии',
+        'description_short': 'Знакомство со столицей',
+        'description_full': 'Старый город, крепость Нарикала и серные бани',
+        'price_base': 25000,
+        'duration_days': 3,
+        'tour_type': 'bus_group',
+        'region': 'Тбилиси',
+        'included': 'Проживание',
+        'not_included': 'Перелет',
+        'tour_operator': operator,
+    }
+    data.update(kwargs)
+    return Tour.objects.create(**data)
+
+
+def create_date(tour, days_ahead=30, seats=20, **kwargs):
+    data = {
+        'tour': tour,
+        'start_date': timezone.now().date() + timedelta(days=days_ahead),
+        'total_seats': seats,
+        'available_seats': seats,
+    }
+    data.update(kwargs)
+    return TourDate.objects.create(**data)
+
+
+def create_photo(tour, is_cover=True, **kwargs):
+    # Файл в MEDIA_ROOT не пишем, достаточно имени; копии - без файлов
+    data = {'tour': tour, 'photo': 'tours/cover.jpg', 'is_cover': is_cover,
+            'variants': {'source': 'tours/cover.jpg', 'widths': {}}}
+    data.update(kwargs)
+    return TourPhoto.objects.create(**data)
+
+
+class TourListQueriesTest(APITestCase):
+    """Каталог туров выполняет постоянное число запросов"""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.operator = create_operator()
+
+    def populate(self, count):
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(count):
+                tour = create_tour(self.operator, title=f'Тур {Tour.objects.count()}')
+                create_photo(tour, is_cover=False)
+                create_photo(tour)
+                create_date(tour, days_ahead=10 + i)
+                create_date(tour, days_ahead=40 + i)
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        self.populate(3)
+        # валидаторы ETag + count + туры с туроператорами и карточками
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/tours/')
+        self.assertEqual(response.status_code, 200)
+
+        self.populate(9)
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/tours/')
+        self.assertEqual(len(response.data['results']), 12)
+
+    def test_card_contains_cover_and_nearest_date(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            tour = create_tour(self.operator)
+            create_photo(tour, is_cover=False)
+            cover = create_photo(tour)
+            create_date(tour, days_ahead=-5)
+            create_date(tour, days_ahead=20, seats=0)
+            nearest = create_date(tour, days_ahead=25)
+            create_date(tour, days_ahead=50)
+
+        card = self.client.get('/api/tours/').data['results'][0]
+        self.assertTrue(card['cover_photo'].endswith(cover.photo.url))
+        self.assertEqual(card['nearest_date']['id'], nearest.id)
+
+    def test_stale_cards_are_refreshed_in_one_batch(self):
+        self.populate(12)
+        # Ближайшие даты прошли без записи через модели (время идет)
+        TourDate.objects.filter(start_date__lt=timezone.now().date() + timedelta(days=30)) \
+            .update(start_date=timezone.now().date() - timedelta(days=1))
+        TourCard.objects.filter(tour__title='Тур 0').delete()
+
+        # + пересчет сводки, UPSERT карточек и их чтение - для всей страницы
+        with self.assertNumQueries(6):
+            response = self.client.get('/api/tours/')
+        for card in response.data['results']:
+            self.assertGreaterEqual(card['nearest_date']['start_date'],
+                                    str(timezone.now().date()))
+        # Следующий запрос снова читает только карточки
+        cache.clear()
+        with self.assertNumQueries(3):
+            self.client.get('/api/tours/')
+        self.assertEqual(list(TourCard.stale_tour_ids()), [])
+
+
+class TourCardTest(APITestCase):
+    """Карточка тура синхронизируется с фото и датами"""
+
+    def setUp(self):
+        super().setUp()
+        self.operator = create_operator()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tour = create_tour(self.operator)
+
+    def card(self):
+        return TourCard.objects.get(tour=self.tour)
+
+    def test_card_created_with_tour(self):
+        card = self.card()
+        self.assertIsNone(card.nearest_date)
+
+    def test_card_follows_dates(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            date = create_date(self.tour, seats=8)
+        card = self.card()
+        self.assertEqual(card.nearest_date, date)
+        self.assertEqual(card.seats_left, 8)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            date.delete()
+        self.assertIsNone(self.card().nearest_date)
+
+    def test_stale_card_falls_back_to_live_data(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            date = create_date(self.tour, days_ahead=5)
+        upcoming = create_date(self.tour, days_ahead=15)
+        # Дата прошла, а карточку еще не пересчитали
+        TourDate.objects.filter(pk=date.pk).update(
+            start_date=timezone.now().date() - timedelta(days=1)
+        )
+        card = APIClient().get('/api/tours/').data['results'][0]
+        self.assertEqual(card['nearest_date']['id'], upcoming.id)
+
+    def test_rebuild_command(self):
+        create_date(self.tour)
+        TourCard.objects.all().delete()
+        call_command('rebuild_tour_cards', stdout=StringIO())
+        self.assertIsNotNone(self.card().nearest_date)
+
+    def test_filters_read_card(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            other = create_tour(self.operator, title='Батуми')
+            create_date(other)
+            Review.objects.create(tour=other, client_name='Анна', rating=5,
+                                  text='Отлично', moderation_status='approved')
+        client = APIClient()
+        results = client.get('/api/tours/', {'has_dates': 'true'}).data['results']
+        self.assertEqual([t['id'] for t in results], [other.id])
+        results = client.get('/api/tours/', {'min_rating': 4}).data['results']
+        self.assertEqual([t['id'] for t in results], [other.id])
+
+
+class ReviewStatsTest(APITestCase):
+    """Статистика отзывов тура обновляется инкрементально"""
+
+    def setUp(self):
+        super().setUp()
+        self.tour = create_tour(create_operator())
+
+    def review(self, rating, status='approved'):
+        return Review.objects.create(tour=self.tour, client_name='Анна', rating=rating,
+                                     text='Текст', moderation_status=status)
+
+    def stats(self):
+        self.tour.refresh_from_db()
+        return (float(self.tour.rating), self.tour.rating_count,
+                self.tour.rating_histogram)
+
+    def test_save_and_delete(self):
+        five = self.review(5)
+        self.review(4)
+        pending = self.review(1, status='pending')
+        self.assertEqual(self.stats(), (4.5, 2, {1: 0, 2: 0, 3: 0, 4: 1, 5: 1}))
+
+        pending.moderation_status = 'approved'
+        pending.save()
+        self.assertEqual(self.stats()[:2], (3.33, 3))
+
+        five = Review.objects.get(pk=five.pk)
+        five.rating = 3
+        five.save()
+        self.assertEqual(self.stats(), (2.67, 3, {1: 1, 2: 0, 3: 1, 4: 1, 5: 0}))
+
+        five.delete()
+        pending.delete()
+        self.assertEqual(self.stats(), (4.0, 1, {1: 0, 2: 0, 3: 0, 4: 1, 5: 0}))
+
+    def test_moderate_queryset(self):
+        self.review(5, status='pending')
+        self.review(2, status='pending')
+        self.review(4)
+        with self.assertNumQueries(5):
+            # savepoint + изменения по (тур, оценка) + UPDATE отзывов
+            # + UPDATE тура + release
+            Review.objects.filter(rating__gte=4).moderate('approved')
+        self.assertEqual(self.stats()[:2], (4.5, 2))
+
+        Review.objects.all().moderate('rejected')
+        self.assertEqual(self.stats(), (0.0, 0, {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}))
+
+    def test_reconcile_command(self):
+        self.review(5)
+        Tour.objects.filter(pk=self.tour.pk).update(rating_count=7, rating_5=0)
+        out = StringIO()
+        call_command('reconcile_review_stats', stdout=out)
+        self.assertIn('1', out.getvalue())
+        self.assertEqual(self.stats(), (5.0, 1, {1: 0, 2: 0, 3: 0, 4: 0, 5: 1}))
+
+    def test_api_reads_stats_and_orders_by_rating(self):
+        self.review(3)
+        best = create_tour(self.tour.tour_operator, title='Батуми')
+        Review.objects.create(tour=best, client_name='Иван', rating=5,
+                              text='Отлично', moderation_status='approved')
+        client = APIClient()
+        results = client.get('/api/tours/', {'ordering': '-rating'}).data['results']
+        self.assertEqual([t['id'] for t in results], [best.id, self.tour.id])
+
+        with self.assertNumQueries(5):
+            # валидаторы + тур + фото + даты + отзывы, без AVG()
+            detail = client.get(f'/api/tours/{best.slug}/').data
+        self.assertEqual(detail['average_rating'], 5.0)
+        self.assertEqual(detail['rating_count'], 1)
+        self.assertEqual(detail['rating_histogram'][5], 1)
+
+
+class ReviewFeedTest(APITestCase):
+    """Лента отзывов постраничная, превью нескольких туров - одним запросом"""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        operator = create_operator()
+        self.tours = [create_tour(operator, title=f'Тур {i}') for i in range(3)]
+        for tour in self.tours[:2]:
+            for i in range(5):
+                Review.objects.create(tour=tour, client_name=f'Клиент {i}', rating=5,
+                                      text='Отлично', moderation_status='approved')
+        Review.objects.create(tour=self.tours[0], client_name='Спам', rating=1,
+                              text='Спам', moderation_status='rejected')
+
+    def test_tour_feed_is_paginated_by_cursor(self):
+        tour = self.tours[0]
+        seen = []
+        url = f'/api/reviews/?tour_id={tour.id}'
+        with mock.patch.object(KeysetPagination, 'page_size', 2):
+            while url:
+                with self.assertNumQueries(1):
+                    data = self.client.get(url).data
+                self.assertLessEqual(len(data['results']), 2)
+                seen.extend(review['id'] for review in data['results'])
+                url = data['next']
+        expected = Review.objects.filter(
+            tour=tour, moderation_status='approved'
+        ).order_by('-created_at', '-pk').values_list('pk', flat=True)
+        self.assertEqual(seen, list(expected))
+
+    def test_previews_for_several_tours(self):
+        ids = ','.join(str(tour.id) for tour in self.tours)
+        with self.assertNumQueries(1):
+            data = self.client.get('/api/reviews/', {'tour_ids': ids, 'limit': 2}).data
+        results = data['results']
+        self.assertEqual([len(results[str(t.id)]) for t in self.tours], [2, 2, 0])
+        latest = Review.objects.filter(tour=self.tours[1]).order_by('-created_at', '-pk')
+        self.assertEqual(
+            [review['id'] for review in results[str(self.tours[1].id)]],
+            [review.id for review in latest[:2]],
+        )
+
+    def test_previews_are_bounded(self):
+        ids = ','.join(str(i) for i in range(1, 60))
+        self.assertEqual(self.client.get('/api/reviews/', {'tour_ids': ids}).status_code, 400)
+        self.assertEqual(self.client.get('/api/reviews/', {'tour_ids': 'x'}).status_code, 400)
+        data = self.client.get(
+            '/api/reviews/', {'tour_ids': self.tours[0].id, 'limit': 1000}
+        ).data
+        self.assertEqual(len(data['results'][str(self.tours[0].id)]), 5)
+
+    def test_malformed_tour_ids_are_rejected(self):
+        for params in ({'tour_id': ','}, {'tour_id': ' , '}, {'tour_ids': ','},
+                       {'tour_id': str(2 ** 70)}, {'tour_id': '-1'}):
+            self.assertEqual(self.client.get('/api/reviews/', params).status_code, 400, params)
+        # Пустой параметр - лента без фильтра
+        self.assertEqual(self.client.get('/api/reviews/', {'tour_id': ''}).status_code, 200)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ExportTest(TestCase):
+    """Потоковая выгрузка бронирований и лидов"""
+
+    def setUp(self):
+        from django.contrib.auth.models import User
+        tour = create_tour(create_operator())
+        self.date = create_date(tour, seats=50)
+        for i in range(5):
+            Booking.objects.create(**booking_data(self.date), source='phone')
+        Lead.objects.create(name='Мария', phone='+79001112233', source='contact_form')
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pass')
+
+    def read(self, response):
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def test_admin_export_respects_changelist_filters(self):
+        Booking.objects.filter(pk=Booking.objects.first().pk).update(status='confirmed')
+        self.client.force_login(self.admin)
+        changelist = self.client.get('/secret-admin/tours/booking/', {'status__exact': 'new'})
+        self.assertContains(changelist, 'export/?status__exact=new&amp;format=csv')
+        self.assertContains(changelist, 'export_jsonl')
+        url = '/secret-admin/tours/booking/export/'
+        response = self.client.get(url, {'status__exact': 'new', 'format': 'csv'})
+        self.assertIn('attachment', response['Content-Disposition'])
+        rows = list(csv.reader(StringIO(self.read(response).lstrip('\ufeff'))))
+        self.assertEqual(rows[0][:3], ['Номер', 'Создана', 'Статус'])
+        self.assertEqual(len(rows), 1 + 4)
+        self.assertEqual({row[2] for row in rows[1:]}, {'Новая'})
+        self.assertEqual(rows[1][4], self.date.tour.title)
+
+        response = self.client.get('/secret-admin/tours/lead/export/', {'format': 'jsonl'})
+        lines = self.read(response).splitlines()
+        self.assertEqual(json.loads(lines[0])['name'], 'Мария')
+
+    def test_export_runs_one_query(self):
+        from .export import export_lines
+        for i in range(20):
+            Booking.objects.create(**booking_data(self.date, people_count=1))
+        with self.assertNumQueries(1):
+            lines = list(export_lines(Booking.objects.all(), 'jsonl', chunk_size=7))
+        self.assertEqual(len(lines), 25)
+        self.assertEqual(json.loads(lines[0])['tour_date__tour__title'], self.date.tour.title)
+
+    def test_csv_neutralizes_formulas(self):
+        from .export import export_lines
+        Lead.objects.all().delete()
+        Lead.objects.create(name='=HYPERLINK("http://evil")', phone='+79001112233',
+                            message='@SUM(1+1)', source='contact_form')
+        lines = ''.join(export_lines(Lead.objects.all(), 'csv')).lstrip('\ufeff')
+        row = list(csv.reader(StringIO(lines)))[1]
+        self.assertEqual(row[4], '\'=HYPERLINK("http://evil")')
+        self.assertEqual(row[7], "'@SUM(1+1)")
+        # Номер - число, не текст: без префикса
+        self.assertFalse(row[0].startswith("'"))
+
+    def test_csv_keeps_phones_unchanged(self):
+        from .export import export_lines
+        Lead.objects.all().delete()
+        phones = ['+79001112233', '+7 (900) 111-22-33', '-1+HYPERLINK("x")']
+        for phone in phones:
+            Lead.objects.create(name='Иван', phone=phone, source='contact_form')
+        lines = ''.join(export_lines(Lead.objects.order_by('pk'), 'csv')).lstrip('\ufeff')
+        exported = [row[5] for row in list(csv.reader(StringIO(lines)))[1:]]
+        # Телефон - как ввели; знак перед формулой по-прежнему экранируется
+        self.assertEqual(exported, [*phones[:2], "'" + phones[2]])
+
+    def test_command(self):
+        out = StringIO()
+        call_command('export_data', 'bookings', '--format', 'jsonl', stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 5)
+        out = StringIO()
+        call_command('export_data', 'leads', '--status', 'converted', stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 1)
+
+
+class KeysetPaginationTest(APITestCase):
+    """Курсорная пагинация каталога и блога"""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        operator = create_operator()
+        # Одинаковые цены проверяют разрешение равных значений по pk
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tours = [
+                create_tour(operator, title=f'Тур {i}', price_base=10000 + (i % 3) * 1000)
+                for i in range(30)
+            ]
+
+    def collect(self, url, params):
+        ids = []
+        response = self.client.get(url, params)
+        while True:
+            ids.extend(item['id'] for item in response.data['results'])
+            if not response.data['next']:
+                return ids
+            response = self.client.get(response.data['next'])
+
+    def test_walks_all_rows_once_for_each_ordering(self):
+        for ordering in ['price_base', '-price_base', 'duration_days', '-created_at']:
+            ids = self.collect('/api/tours/', {'pagination': 'cursor', 'ordering': ordering})
+            self.assertEqual(len(ids), 30, ordering)
+            self.assertEqual(set(ids), {tour.id for tour in self.tours}, ordering)
+
+        ids = self.collect('/api/tours/', {'pagination': 'cursor', 'ordering': 'price_base'})
+        prices = [Tour.objects.get(pk=pk).price_base for pk in ids]
+        self.assertEqual(prices, sorted(prices))
+
+    def test_no_count_query_by_default(self):
+        # валидаторы ETag + страница
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/tours/', {'pagination': 'cursor'})
+        self.assertNotIn('count', response.data)
+
+        response = self.client.get('/api/tours/', {'pagination': 'cursor', 'count': 'exact'})
+        self.assertEqual(response.data['count'], 30)
+        self.assertNotIn('count=', response.data['next'])
+
+    def test_page_mode_unchanged(self):
+        response = self.client.get('/api/tours/')
+        self.assertEqual(response.data['count'], 30)
+        self.assertIn('page=2', response.data['next'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/tours/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_tampered_cursor_is_not_found(self):
+        from .pagination import KeysetPagination
+
+        encode = KeysetPagination().encode_cursor
+        cases = [
+            ('/api/tours/', 'price_base', ['abc', 1]),
+            ('/api/tours/', 'price_base', [{'a': 1}, 1]),
+            ('/api/tours/', 'created_at', ['notadate', 1]),
+            ('/api/tours/', 'created_at', ['2026-01-01', 'x']),
+            ('/api/tours/', 'price_base', ['100', None]),
+            ('/api/tours/', 'price_base', ['100', 2 ** 70]),
+            ('/api/reviews/', None, ['notadate', 1]),
+        ]
+        for url, ordering, position in cases:
+            params = {'cursor': encode(position)}
+            if ordering:
+                params['ordering'] = ordering
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 404, (url, position))
+
+    def test_cursor_with_search_requires_ordering(self):
+        params = {'pagination': 'cursor', 'search': 'тур'}
+        self.assertEqual(self.client.get('/api/tours/', params).status_code, 400)
+        params['ordering'] = 'price_base'
+        self.assertEqual(self.client.get('/api/tours/', params).status_code, 200)
+
+    def test_blog_cursor(self):
+        now = timezone.now()
+        for i in range(15):
+            BlogPost.objects.create(
+                title=f'Статья {i}', content='Текст', excerpt='Кратко', category='tips',
+                is_published=True, published_at=now - timedelta(days=i % 4) if i % 5 else None
+            )
+        ids = self.collect('/api/blog/', {'pagination': 'cursor'})
+        self.assertEqual(len(ids), 15)
+        self.assertEqual(len(set(ids)), 15)
+
+
+class TourSearchTest(APITestCase):
+    """Поиск по турам с учетом словоформ"""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        operator = create_operator()
+        self.tbilisi = create_tour(
+            operator, title='Тбилисские дворики', region='Тбилиси',
+            description_full='Прогулка по старому городу'
+        )
+        self.kakheti = create_tour(
+            operator, title='Винные дороги Кахетии', region='Кахетия',
+            description_short='Дегустации в винодельнях',
+            description_full='Поездка из Тбилиси в Сигнахи и Телави'
+        )
+        create_tour(operator, title='Батуми и море', region='Аджария',
+                    description_full='Пляжи и ботанический сад')
+
+    def search(self, query, **params):
+        response = self.client.get('/api/tours/', {'search': query, **params})
+        return [tour['id'] for tour in response.data['results']]
+
+    def test_matches_word_forms(self):
+        self.assertEqual(self.search('Тбилиси'), [self.tbilisi.id, self.kakheti.id])
+        self.assertEqual(self.search('винодельни'), [self.kakheti.id])
+        self.assertEqual(self.search('Кахетия вина'), [self.kakheti.id])
+
+    def test_all_words_required(self):
+        self.assertEqual(self.search('тбилиси пляжи'), [])
+        self.assertEqual(self.search('и в на'), [])
+
+    def test_explicit_ordering_wins(self):
+        ids = self.search('тбилиси', ordering='created_at')
+        self.assertEqual(ids, [self.tbilisi.id, self.kakheti.id])
+        ids = self.search('тбилиси', ordering='-created_at')
+        self.assertEqual(ids, [self.kakheti.id, self.tbilisi.id])
+
+    def test_index_follows_tour_updates(self):
+        self.tbilisi.title = 'Мцхета и Джвари'
+        self.tbilisi.region = 'Мцхета'
+        self.tbilisi.description_full = 'Древняя столица'
+        self.tbilisi.save()
+        self.assertEqual(self.search('тбилисские'), [])
+        self.assertEqual(self.search('мцхете'), [self.tbilisi.id])
+
+    def test_rebuild_command(self):
+        SearchTerm.objects.all().delete()
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.search('батуми'), [Tour.objects.get(region='Аджария').id])
+
+    def test_failed_rebuild_keeps_old_index(self):
+        from .search import rebuild_index
+
+        with mock.patch.object(SearchTerm.objects, 'bulk_create', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                rebuild_index()
+        self.assertEqual(self.search('винодельни'), [self.kakheti.id])
+
+
+def booking_data(tour_date, people_count=1, **kwargs):
+    data = {
+        'tour_date': tour_date,
+        'client_name': 'Анна',
+        'client_phone': '+79001234567',
+        'client_email': 'anna@example.com',
+        'people_count': people_count,
+    }
+    data.update(kwargs)
+    return data
+
+
+class SeatReservationTest(APITestCase):
+    """Списание мест условным UPDATE"""
+
+    def setUp(self):
+        super().setUp()
+        self.tour = create_tour(create_operator())
+        self.date = create_date(self.tour, seats=5)
+
+    def test_reserves_and_marks_full(self):
+        Booking.objects.create(**booking_data(self.date, 3))
+        Booking.objects.create(**booking_data(self.date, 2))
+        self.date.refresh_from_db()
+        self.assertEqual(self.date.available_seats, 0)
+        self.assertEqual(self.date.status, 'full')
+
+    def test_refuses_overbooking(self):
+        Booking.objects.create(**booking_data(self.date, 4))
+        with self.assertRaises(SeatsUnavailable):
+            Booking.objects.create(**booking_data(self.date, 2))
+        self.date.refresh_from_db()
+        self.assertEqual(self.date.available_seats, 1)
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_lost_race_returns_400(self):
+        # Места ушли между validate() и save()
+        with mock.patch.object(TourDate, 'reserve_seats', return_value=False):
+            response = APIClient().post('/api/bookings/', {
+                **booking_data(self.date.pk, 2)
+            })
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('people_count', response.data)
+        self.assertEqual(Booking.objects.count(), 0)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ConcurrentBookingTest(TransactionTestCase):
+    """Параллельные бронирования не продают больше мест, чем есть"""
+
+    def test_no_oversell_under_threads(self):
+        tour = create_tour(create_operator())
+        date = create_date(tour, seats=10)
+        results = []
+        lock = threading.Lock()
+        barrier = threading.Barrier(8)
+
+        def worker():
+            barrier.wait()
+            try:
+                for _ in range(5):
+                    for retry in range(50):
+                        try:
+                            Booking.objects.create(**booking_data(date, 1))
+                            result = 'booked'
+                        except SeatsUnavailable:
+                            result = 'sold_out'
+                        except OperationalError:
+                            # SQLite в памяти отвечает "table is locked"
+                            time.sleep(0.005)
+                            continue
+                        break
+                    else:
+                        result = 'gave_up'
+                    with lock:
+                        results.append(result)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # 40 попыток на 10 мест: продано ровно 10, остальным отказано
+        self.assertEqual(results.count('gave_up'), 0)
+        self.assertEqual(results.count('booked'), 10)
+        self.assertEqual(results.count('sold_out'), 30)
+        date.refresh_from_db()
+        self.assertEqual(Booking.objects.filter(tour_date=date).count(), 10)
+        self.assertEqual(date.available_seats, 0)
+        self.assertEqual(date.status, 'full')
+
+
+class ResponseCacheTest(APITestCase):
+    """Кэш ответов с инвалидацией по поколениям моделей"""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.operator = create_operator()
+        # Карточка создается после коммита, как в работе сайта
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tour = create_tour(self.operator)
+
+    def test_second_request_served_from_cache(self):
+        first = self.client.get('/api/tours/')
+        self.assertEqual(first['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/tours/')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(first.data, second.data)
+
+    def test_pending_review_keeps_catalog_cache(self):
+        self.client.get('/api/tours/')
+        review = Review.objects.create(tour=self.tour, client_name='Анна', rating=5,
+                                       text='Отлично')
+        self.assertEqual(self.client.get('/api/tours/')['X-Cache'], 'HIT')
+
+        review.moderation_status = 'approved'
+        review.save()
+        response = self.client.get('/api/tours/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['results'][0]['reviews_count'], 1)
+
+    def test_catalog_cache_expires_at_midnight(self):
+        self.client.get('/api/tours/')
+        self.client.get('/api/faq/')
+        tomorrow = timezone.now() + timedelta(days=1)
+        with mock.patch('django.utils.timezone.now', return_value=tomorrow):
+            # Ближайшая дата могла пройти без записи в базу
+            self.assertEqual(self.client.get('/api/tours/')['X-Cache'], 'MISS')
+            self.assertEqual(self.client.get('/api/tours/facets/').status_code, 200)
+            self.assertEqual(self.client.get('/api/faq/')['X-Cache'], 'HIT')
+
+    def test_query_params_are_normalized(self):
+        self.client.get('/api/tours/?tour_type=bus_group&duration=3')
+        response = self.client.get('/api/tours/?duration=3&tour_type=bus_group')
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+    def test_save_invalidates(self):
+        self.client.get(f'/api/tours/{self.tour.slug}/')
+        self.tour.title = 'Новое название'
+        self.tour.save()
+        response = self.client.get(f'/api/tours/{self.tour.slug}/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['title'], 'Новое название')
+
+    def test_admin_bulk_actions_invalidate(self):
+        from django.contrib.admin.sites import site
+        self.client.get('/api/tours/')
+        site._registry[Tour].deactivate_tours(None, Tour.objects.all())
+        response = self.client.get('/api/tours/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['count'], 0)
+
+        review = Review.objects.create(tour=self.tour, client_name='Анна', rating=5,
+                                       text='Отлично')
+        self.client.get('/api/reviews/')
+        site._registry[Review].approve_reviews(None, Review.objects.filter(pk=review.pk))
+        Tour.objects.update(is_active=True)
+        site._registry[Tour].activate_tours(None, Tour.objects.none())
+        response = self.client.get(f'/api/tours/{self.tour.slug}/')
+        self.assertEqual(response.data['average_rating'], 5.0)
+
+    def test_unrelated_model_does_not_invalidate(self):
+        self.client.get('/api/faq/')
+        self.tour.save()
+        self.assertEqual(self.client.get('/api/faq/')['X-Cache'], 'HIT')
+
+    def test_stats_command(self):
+        from .cache import flush_stats
+        # Счетчики прошлых тестов копятся в процессе
+        flush_stats()
+        cache.clear()
+        self.client.get('/api/faq/')
+        self.client.get('/api/faq/')
+        flush_stats()
+        out = StringIO()
+        call_command('cache_stats', stdout=out)
+        self.assertIn('faq-list', out.getvalue())
+        self.assertIn('hit rate  50.0%', out.getvalue())
+
+
+class ConditionalGetTest(APITestCase):
+    """ETag / Last-Modified и ответ 304 без сериализации"""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tour = create_tour(create_operator())
+            self.date = create_date(self.tour)
+        self.url = f'/api/tours/{self.tour.slug}/'
+
+    def revalidate(self, url, response, **extra):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'], **extra)
+
+    def test_detail_not_modified(self):
+        with self.settings(RESPONSE_CACHE_TIMEOUT=0):
+            first = self.client.get(self.url)
+            self.assertIn('Last-Modified', first)
+            # Только запрос валидаторов, без выборки и сериализации тура
+            with self.assertNumQueries(1):
+                second = self.revalidate(self.url, first)
+        self.assertEqual(second.status_code, 304)
+
+    def test_detail_changes_with_related_rows(self):
+        first = self.client.get(self.url)
+        Booking.objects.create(**booking_data(self.date, 2))
+        self.assertEqual(self.revalidate(self.url, first).status_code, 200)
+
+        first = self.client.get(self.url)
+        review = Review.objects.create(tour=self.tour, client_name='Анна', rating=5,
+                                       text='Отлично')
+        # Отзыв на модерации страницу не меняет
+        self.assertEqual(self.revalidate(self.url, first).status_code, 304)
+        review.moderation_status = 'approved'
+        review.save()
+        second = self.revalidate(self.url, first)
+        self.assertEqual(second.status_code, 200)
+
+        first = second
+        review.delete()
+        self.assertEqual(self.revalidate(self.url, first).status_code, 200)
+
+    def test_cached_response_revalidates(self):
+        first = self.client.get(self.url)
+        with self.assertNumQueries(0):
+            second = self.revalidate(self.url, first)
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second['X-Cache'], 'HIT')
+
+    def test_list_etag_depends_on_query(self):
+        first = self.client.get('/api/tours/')
+        self.assertEqual(self.revalidate('/api/tours/', first).status_code, 304)
+        other = self.revalidate('/api/tours/?tour_type=individual', first)
+        self.assertEqual(other.status_code, 200)
+
+        self.tour.price_base = 1
+        self.tour.save()
+        self.assertEqual(self.revalidate('/api/tours/', first).status_code, 200)
+
+    def test_if_modified_since(self):
+        first = self.client.get('/api/tours/')
+        response = self.client.get(
+            '/api/tours/', HTTP_IF_MODIFIED_SINCE=first['Last-Modified']
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_blog(self):
+        post = BlogPost.objects.create(
+            title='Статья', content='Текст', excerpt='Кратко', category='tips',
+            is_published=True, published_at=timezone.now()
+        )
+        url = f'/api/blog/{post.slug}/'
+        first = self.client.get(url)
+        self.assertEqual(self.revalidate(url, first).status_code, 304)
+        post.content = 'Новый текст'
+        post.save()
+        self.assertEqual(self.revalidate(url, first).status_code, 200)
+
+        first = self.client.get('/api/blog/')
+        self.assertEqual(self.revalidate('/api/blog/', first).status_code, 304)
+
+    def test_missing_tour_is_404(self):
+        self.assertEqual(self.client.get('/api/tours/missing/').status_code, 404)
+
+
+class AsyncURLConf:
+    """Асинхронные вьюхи чтения перед роутером, как при ASYNC_READ_API=True"""
+    from django.urls import include, path
+    from .urls import async_urlpatterns, router
+    urlpatterns = [path('api/', include(async_urlpatterns + router.urls))]
+
+
+@override_settings(ROOT_URLCONF=AsyncURLConf)
+class AsyncReadAPITest(APITestCase):
+    """Асинхронные вьюхи отдают то же, что и вьюсеты"""
+
+    def setUp(self):
+        super().setUp()
+        operator = create_operator()
+        self.tour = create_tour(operator)
+        create_date(self.tour)
+        Review.objects.create(tour=self.tour, client_name='Анна', rating=5,
+                              text='Отлично', moderation_status='approved')
+        FAQ.objects.create(question='Нужна ли виза?', answer='Нет', category='documents')
+        self.urls = [
+            '/api/tours/', '/api/tours/?pagination=cursor&count=exact',
+            f'/api/tours/{self.tour.slug}/', '/api/faq/', '/api/blog/',
+            '/api/tour-operators/', f'/api/reviews/?tour_id={self.tour.id}',
+            f'/api/reviews/?tour_ids={self.tour.id}', '/api/tours/facets/',
+        ]
+
+    def expected(self, url):
+        with self.settings(ROOT_URLCONF='config.urls', RESPONSE_CACHE_TIMEOUT=0):
+            return APIClient().get(url).json()
+
+    async def test_responses_match_sync_views(self):
+        for url in self.urls:
+            expected = await sync_to_async(self.expected)(url)
+            response = await self.async_client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertEqual(response.json(), expected, url)
+
+    async def test_cache_and_conditional_get(self):
+        url = f'/api/tours/{self.tour.slug}/'
+        first = await self.async_client.get(url)
+        self.assertEqual(first['X-Cache'], 'MISS')
+        second = await self.async_client.get(url, headers={'If-None-Match': first['ETag']})
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second['X-Cache'], 'HIT')
+
+    def make_stale_cards(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for number in range(11):
+                tour = create_tour(self.tour.tour_operator, title=f'Тур {number}')
+                create_photo(tour)
+                create_date(tour, days_ahead=10)
+                create_date(tour, days_ahead=40)
+        # Ближайшие даты прошли без записи через модели, одной карточки нет
+        TourDate.objects.filter(start_date__lt=timezone.now().date() + timedelta(days=20)) \
+            .update(start_date=timezone.now().date() - timedelta(days=1))
+        TourCard.objects.filter(tour=self.tour).delete()
+
+    async def test_stale_cards_are_refreshed_in_one_batch(self):
+        await sync_to_async(self.make_stale_cards)()
+        response = await self.async_client.get('/api/tours/')
+        self.assertEqual(response.status_code, 200)
+        # Как у синхронного списка: пересчет сводки, UPSERT и чтение карточек
+        # пачкой, без запросов на каждый тур (счетчик - из Server-Timing)
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('desc="6 SQL"', response['Server-Timing'])
+        today = str(timezone.now().date())
+        for card in response.json()['results']:
+            self.assertGreaterEqual(card['nearest_date']['start_date'], today)
+        self.assertEqual(await sync_to_async(lambda: list(TourCard.stale_tour_ids()))(), [])
+
+    async def test_errors_and_writes(self):
+        response = await self.async_client.get('/api/tours/missing/')
+        self.assertEqual(response.status_code, 404)
+        response = await self.async_client.get('/api/reviews/', {'tour_ids': 'x'})
+        self.assertEqual(response.status_code, 400)
+        response = await self.async_client.post('/api/reviews/', {
+            'tour': self.tour.id, 'client_name': 'Иван', 'rating': 4, 'text': 'Хорошо',
+        })
+        self.assertEqual(response.status_code, 201)
+        response = await self.async_client.post('/api/tours/', {})
+        self.assertEqual(response.status_code, 405)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class GenerateDataTest(TestCase):
+    """Генератор данных и замер маршрутов API"""
+
+    def test_generated_data_is_consistent(self):
+        call_command('generate_data', scale=0.01, seed=1, chunk_size=4, stdout=StringIO())
+        self.assertEqual(Tour.objects.count(), 10)
+        self.assertEqual(TourCard.objects.count(), 10)
+        self.assertTrue(SearchTerm.objects.exists())
+        # Статистика отзывов, места и карточки согласованы без сигналов
+        self.assertEqual(Tour.reconcile_ratings(), [])
+        for tour_date in TourDate.objects.all():
+            booked = sum(tour_date.bookings.values_list('people_count', flat=True))
+            self.assertEqual(tour_date.available_seats, tour_date.total_seats - booked)
+
+    def test_same_seed_same_data(self):
+        call_command('generate_data', scale=0.003, seed=7, stdout=StringIO())
+        first = list(Tour.objects.order_by('pk').values_list('title', 'price_base'))
+        call_command('generate_data', scale=0.003, seed=7, clear=True, stdout=StringIO())
+        second = list(Tour.objects.order_by('pk').values_list('title', 'price_base'))
+        self.assertEqual(first, second)
+
+    def test_bench_api_covers_routes(self):
+        import os
+        import tempfile
+        # Второй страницы списка туров (по 12) хватает 30 турам
+        call_command('generate_data', scale=0.03, stdout=StringIO())
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'bench.json')
+            call_command('bench_api', requests=1, warmup=0, output=path, stdout=StringIO())
+            with open(path, encoding='utf-8') as source:
+                report = json.load(source)
+        names = {result['name'] for result in report['results']}
+        self.assertTrue({'tour-list', 'tour-retrieve', 'booking-create', 'review-list',
+                         'faq-list', 'lead-create', 'touroperator-list'} <= names)
+        for result in report['results']:
+            self.assertLess(result['status'], 400, result['name'])
+        # Запись выполнялась в откатываемой транзакции
+        self.assertFalse(Lead.objects.exists())
+
+
+class RequestMetricsTest(APITestCase):
+    """Server-Timing и журнал медленных запросов"""
+
+    def setUp(self):
+        super().setUp()
+        self.tour = create_tour(create_operator())
+        create_date(self.tour)
+
+    def timings(self, response):
+        parts = [part.strip() for part in response['Server-Timing'].split(',')]
+        return {part.split(';')[0]: part for part in parts}
+
+    def test_server_timing_counts_queries(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            TourCard.refresh([self.tour.pk])
+        with self.assertNumQueries(3) as captured:
+            response = self.client.get('/api/tours/')
+        timings = self.timings(response)
+        self.assertIn(f'desc="{len(captured)} SQL"', timings['db'])
+        self.assertIn('serialize', timings)
+        self.assertIn('cache-miss', timings)
+        self.assertIn('total', timings)
+
+        response = self.client.get('/api/tours/')
+        timings = self.timings(response)
+        self.assertIn('cache-hit', timings)
+        self.assertNotIn('serialize', timings)
+
+    async def test_async_request_counts_queries(self):
+        with self.settings(ROOT_URLCONF=AsyncURLConf, RESPONSE_CACHE_TIMEOUT=0):
+            response = await self.async_client.get('/api/faq/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('desc="1 SQL"', self.timings(response)['db'])
+
+    @override_settings(SLOW_REQUEST_MS=0, SLOW_REQUEST_TOP_SQL=2)
+    def test_slow_request_log(self):
+        with self.assertLogs('tours.slow_requests', 'WARNING') as logs:
+            self.client.get(f'/api/tours/{self.tour.slug}/')
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertEqual(entry['path'], f'/api/tours/{self.tour.slug}/')
+        self.assertEqual(entry['status'], 200)
+        self.assertGreater(entry['queries'], 0)
+        self.assertEqual(len(entry['top_sql']), 2)
+        self.assertGreaterEqual(entry['top_sql'][0]['ms'], entry['top_sql'][1]['ms'])
+
+    @override_settings(REQUEST_METRICS=False)
+    def test_disabled(self):
+        self.assertNotIn('Server-Timing', self.client.get('/api/faq/'))
+
+    def test_normalize_sql(self):
+        self.assertEqual(
+            normalize_sql("SELECT * FROM t WHERE a IN (%s, %s, %s) AND b = 'x' LIMIT 21"),
+            normalize_sql("SELECT *  FROM t WHERE a IN (%s) AND b = 'y' LIMIT 5"),
+        )
+
+
+class ImageVariantsTest(APITestCase):
+    """WebP-копии фотографий туров и обложек блога"""
+
+    def setUp(self):
+        import shutil
+        import tempfile
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = self.settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.tour = create_tour(create_operator())
+
+    def upload(self, name, size=(800, 600), mode='RGB'):
+        from io import BytesIO
+        from django.core.files.base import ContentFile
+        from django.core.files.storage import default_storage
+        from PIL import Image
+        buffer = BytesIO()
+        Image.new(mode, size, 'red').save(buffer, 'PNG')
+        return default_storage.save(name, ContentFile(buffer.getvalue()))
+
+    def create_photo(self, name):
+        with self.captureOnCommitCallbacks(execute=True):
+            photo = TourPhoto.objects.create(tour=self.tour, photo=name, is_cover=True)
+        photo.refresh_from_db()
+        return photo
+
+    def test_variants_generated_after_commit(self):
+        photo = self.create_photo(self.upload('tours/photo.png'))
+        # Копии не шире оригинала (800)
+        self.assertEqual(photo.variants['source'], photo.photo.name)
+        self.assertEqual(set(photo.variants['widths']), {'320', '640'})
+
+        card = self.client.get('/api/tours/').data['results'][0]
+        self.assertTrue(card['cover_photo'].endswith('photo-640.webp'))
+        self.assertEqual(
+            [item.split()[1] for item in card['cover_srcset'].split(', ')],
+            ['320w', '640w'],
+        )
+        detail = self.client.get(f'/api/tours/{self.tour.slug}/').data
+        self.assertIn('photo-320.webp 320w', detail['photos'][0]['srcset'])
+
+    def test_small_and_transparent_image(self):
+        photo = self.create_photo(self.upload('tours/icon.png', (100, 50), 'RGBA'))
+        self.assertEqual(set(photo.variants['widths']), {'100'})
+
+    def test_replaced_image_is_regenerated(self):
+        photo = self.create_photo(self.upload('tours/old.png'))
+        photo.photo = self.upload('tours/new.png')
+        with self.captureOnCommitCallbacks(execute=True):
+            photo.save()
+        photo.refresh_from_db()
+        self.assertEqual(photo.variants['source'], 'tours/new.png')
+
+    def test_stale_variants_not_served(self):
+        photo = self.create_photo(self.upload('tours/photo.png'))
+        # Оригинал заменен без генерации копий
+        TourPhoto.objects.filter(pk=photo.pk).update(photo=self.upload('tours/other.png'))
+        detail = self.client.get(f'/api/tours/{self.tour.slug}/').data
+        self.assertEqual(detail['photos'][0]['srcset'], '')
+
+    def test_command_is_idempotent(self):
+        name = self.upload('blog/cover.png', (2000, 1000))
+        post = BlogPost.objects.create(title='Статья', content='Текст', excerpt='Кратко',
+                                       category='tips', cover_image=name, is_published=True,
+                                       published_at=timezone.now())
+        out = StringIO()
+        call_command('generate_image_variants', stdout=out)
+        self.assertIn('Создано копий для 1', out.getvalue())
+        post.refresh_from_db()
+        self.assertEqual(set(post.cover_variants['widths']), {'320', '640', '1024', '1600'})
+
+        out = StringIO()
+        call_command('generate_image_variants', stdout=out)
+        self.assertIn('Все копии актуальны', out.getvalue())
+
+        item = self.client.get('/api/blog/').data['results'][0]
+        self.assertTrue(item['cover_image'].endswith('cover-640.webp'))
+        self.assertIn('cover-1600.webp 1600w', item['cover_srcset'])
+
+
+class TourCalendarTest(APITestCase):
+    """Календарь доступности тура по месяцам"""
+
+    def setUp(self):
+        super().setUp()
+        self.tour = create_tour(create_operator())
+        today = timezone.now().date()
+        self.month = today.replace(day=1) + timedelta(days=40)
+        self.month = self.month.replace(day=1)
+        self.first = TourDate.objects.create(
+            tour=self.tour, start_date=self.month.replace(day=5),
+            total_seats=10, available_seats=4,
+        )
+        TourDate.objects.create(
+            tour=self.tour, start_date=self.month.replace(day=12),
+            total_seats=10, available_seats=0,
+        )
+        TourDate.objects.create(
+            tour=self.tour, start_date=self.month.replace(day=20),
+            total_seats=10, available_seats=10, status='cancelled',
+        )
+        self.url = f'/api/tours/{self.tour.slug}/calendar/'
+
+    def get(self, **params):
+        return self.client.get(self.url, params)
+
+    def days(self, response, index=0):
+        return {day['date'][-2:]: day for day in response.data['months'][index]['days']}
+
+    def test_month(self):
+        response = self.get(month=f'{self.month:%Y-%m}')
+        self.assertEqual(response.status_code, 200)
+        days = self.days(response)
+        self.assertEqual(sorted(days), ['05', '12', '20'])
+        self.assertEqual(days['05']['status'], 'available')
+        self.assertEqual(days['05']['seats_left'], 4)
+        self.assertEqual(days['05']['tour_date'], self.first.pk)
+        self.assertEqual(days['12']['status'], 'full')
+        self.assertEqual(days['20']['status'], 'cancelled')
+
+    def test_range_in_one_query_then_cached(self):
+        params = {'from': f'{self.month:%Y-%m}',
+                  'to': f'{self.month + timedelta(days=70):%Y-%m}'}
+        # тур по slug + один сгруппированный запрос по датам
+        with self.assertNumQueries(2):
+            response = self.get(**params)
+        self.assertEqual(len(response.data['months']), 3)
+        self.assertEqual(len(response.data['months'][0]['days']), 3)
+        self.assertEqual(response.data['months'][1]['days'], [])
+        with self.assertNumQueries(1):
+            self.assertEqual(self.get(**params).data, response.data)
+
+    def test_booking_invalidates_month(self):
+        month = f'{self.month:%Y-%m}'
+        self.get(month=month)
+        response = self.client.post('/api/bookings/', booking_data(self.first.pk, 3))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.days(self.get(month=month))['05']['seats_left'], 1)
+
+    def test_moved_date_invalidates_both_months(self):
+        this, later = f'{self.month:%Y-%m}', f'{self.month + timedelta(days=40):%Y-%m}'
+        self.get(**{'from': this, 'to': later})
+        tour_date = TourDate.objects.get(pk=self.first.pk)
+        tour_date.start_date = self.month + timedelta(days=40)
+        tour_date.end_date = None
+        tour_date.save()
+        response = self.get(**{'from': this, 'to': later})
+        self.assertNotIn('05', self.days(response, 0))
+        self.assertEqual(len(response.data['months'][1]['days']), 1)
+
+    def test_invalid_params(self):
+        self.assertEqual(self.get(month='2026-13').status_code, 400)
+        self.assertEqual(self.get(month='октябрь').status_code, 400)
+        self.assertEqual(self.get(**{'from': '2026-05', 'to': '2026-01'}).status_code, 400)
+        self.assertEqual(self.get(**{'from': '2026-01', 'to': '2027-06'}).status_code, 400)
+        response = self.client.get('/api/tours/unknown/calendar/')
+        self.assertEqual(response.status_code, 404)
+
+
+
+class DateRangeFilterTest(APITestCase):
+    """Фильтр ?start_date=&end_date= - EXISTS по доступным датам"""
+
+    def setUp(self):
+        super().setUp()
+        operator = create_operator()
+        self.today = timezone.now().date()
+        self.twice = create_tour(operator, title='Две даты')
+        create_date(self.twice, days_ahead=10)
+        create_date(self.twice, days_ahead=12)
+        self.full = create_tour(operator, title='Мест нет')
+        create_date(self.full, days_ahead=10, seats=0)
+        self.cancelled = create_tour(operator, title='Отменен')
+        create_date(self.cancelled, days_ahead=11, status='cancelled')
+        self.split = create_tour(operator, title='Даты по краям')
+        create_date(self.split, days_ahead=2)
+        create_date(self.split, days_ahead=30)
+
+    def ids(self, **params):
+        params = {key: f'{self.today + timedelta(days=days)}' for key, days in params.items()}
+        response = self.client.get('/api/tours/', params)
+        return [tour['id'] for tour in response.data['results']]
+
+    def test_only_bookable_dates_without_duplicates(self):
+        self.assertEqual(self.ids(start_date=5, end_date=15), [self.twice.id])
+
+    def test_both_bounds_apply_to_same_date(self):
+        # У тура есть дата до начала и дата после конца, но не внутри
+        self.assertNotIn(self.split.id, self.ids(start_date=5, end_date=15))
+        self.assertIn(self.split.id, self.ids(start_date=5))
+        self.assertIn(self.split.id, self.ids(end_date=5))
+
+    def explain(self, **params):
+        from .filters import TourFilter
+        data = {key: f'{self.today + timedelta(days=days)}' for key, days in params.items()}
+        queryset = TourFilter(data, queryset=Tour.objects.filter(is_active=True)).qs
+        return queryset.explain()
+
+    def test_explain_uses_bookable_index(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('План проверяется для SQLite')
+        for params in ({'start_date': 5, 'end_date': 15}, {'start_date': 5}, {'end_date': 5}):
+            with self.subTest(params=params):
+                plan = self.explain(**params)
+                self.assertIn('tourdate_bookable_idx', plan)
+                self.assertNotIn('TEMP B-TREE FOR DISTINCT', plan)
+
+
+
+class RegionTest(APITestCase):
+    """Справочник регионов и фильтр каталога по региону"""
+
+    def setUp(self):
+        super().setUp()
+        operator = create_operator()
+        self.tbilisi = create_tour(operator, title='Тбилиси', region='Тбилиси, Казбеги')
+        self.kakheti = create_tour(operator, title='Кахетия', region='Кахетия')
+        self.samtskhe = create_tour(operator, title='Вардзия', region='Самцхе-Джавахети')
+        create_tour(operator, title='Архив', region='кахетия', is_active=False)
+
+    def test_tours_reference_normalized_regions(self):
+        self.assertEqual(self.tbilisi.main_region.name, 'Тбилиси')
+        # Другое написание - тот же регион
+        self.assertEqual(
+            Tour.objects.get(title='Архив').main_region_id, self.kakheti.main_region_id
+        )
+        # Дополнительный регион из текста тоже попадает в справочник
+        self.assertEqual(Region.objects.count(), 4)
+        self.assertEqual(
+            list(self.tbilisi.extra_regions.values_list('region__name', flat=True)), ['Казбеги']
+        )
+        self.assertEqual(self.samtskhe.main_region.slug, 'samtskhe-dzhavakheti')
+
+    def ids(self, region):
+        response = self.client.get('/api/tours/', {'region': region})
+        return [tour['id'] for tour in response.data['results']]
+
+    def test_filter_by_id_slug_name_and_alias(self):
+        region = self.samtskhe.main_region
+        for value in (region.id, 'samtskhe-dzhavakheti', 'Самцхе-Джавахети',
+                      'самцхе джавахети', 'Samtskhe Dzhavakheti'):
+            with self.subTest(value=value):
+                self.assertEqual(self.ids(value), [self.samtskhe.id])
+        region.add_aliases('Samtskhe-Javakheti')
+        self.assertEqual(self.ids('samtskhe-javakheti'), [self.samtskhe.id])
+        self.assertEqual(self.ids('Атлантида'), [])
+
+    def test_filter_is_equality_on_index(self):
+        from .filters import TourFilter
+        for value in ('Кахетия', self.kakheti.main_region_id):
+            with self.subTest(value=value):
+                queryset = TourFilter({'region': value}, queryset=Tour.objects.all()).qs
+                sql = str(queryset.query)
+                self.assertIn('"main_region_id" = ', sql)
+                self.assertNotIn('LIKE', sql)
+                if connection.vendor == 'sqlite':
+                    plan = queryset.explain()
+                    self.assertNotIn('SCAN tours_tour', plan)
+                    self.assertIn('USING INDEX tours_tour_main_region_id', plan)
+                    self.assertIn('tours_tourregion_region_id_tour_id', plan)
+                    if isinstance(value, str):
+                        self.assertIn('(alias=?)', plan)
+
+    def test_filter_matches_secondary_region(self):
+        self.assertEqual(self.ids('Казбеги'), [self.tbilisi.id])
+        self.assertEqual(self.ids('kazbegi'), [self.tbilisi.id])
+        self.assertEqual(self.ids('Тбилиси'), [self.tbilisi.id])
+
+    def test_main_region_follows_region_text(self):
+        tour = Tour.objects.get(pk=self.kakheti.pk)
+        tour.region = 'Самцхе-Джавахети, Кахетия'
+        tour.save()
+        self.assertEqual(tour.main_region_id, self.samtskhe.main_region_id)
+        tour = Tour.objects.get(pk=tour.pk)
+        self.assertEqual(tour.main_region_id, self.samtskhe.main_region_id)
+        # Кахетия стала дополнительным регионом
+        self.assertEqual(self.ids('Кахетия'), [tour.id])
+
+        tour.region = 'Аджария'
+        tour.save(update_fields=['region'])
+        tour.refresh_from_db()
+        self.assertEqual(tour.main_region.name, 'Аджария')
+
+        tour.region = ''
+        tour.save()
+        self.assertIsNone(Tour.objects.get(pk=tour.pk).main_region_id)
+        self.assertEqual(self.ids('Кахетия'), [])
+
+    def test_regions_endpoint(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/regions/')
+        counts = {row['name']: row['tours_count'] for row in response.data}
+        self.assertEqual(counts, {'Кахетия': 1, 'Казбеги': 1, 'Самцхе-Джавахети': 1,
+                                  'Тбилиси': 1})
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/regions/')['X-Cache'], 'HIT')
+
+        self.kakheti.is_active = False
+        self.kakheti.save()
+        counts = {row['name']: row['tours_count'] for row in self.client.get('/api/regions/').data}
+        self.assertEqual(counts['Кахетия'], 0)
+
+
+class FacetsTest(APITestCase):
+    """Счетчики панели фильтров /api/tours/facets/"""
+
+    def setUp(self):
+        super().setUp()
+        operator = create_operator()
+        create_tour(operator, title='A', tour_type='bus_group', region='Кахетия',
+                    price_base=15000, duration_days=3)
+        create_tour(operator, title='B', tour_type='bus_group', region='Тбилиси',
+                    price_base=30000, duration_days=5)
+        create_tour(operator, title='C', tour_type='individual', region='Кахетия',
+                    price_base=120000, duration_days=5)
+        create_tour(operator, title='D', tour_type='individual', region='Кахетия',
+                    price_base=30000, duration_days=3, is_active=False)
+
+    def facets(self, **params):
+        response = self.client.get('/api/tours/facets/', params)
+        self.assertEqual(response.status_code, 200)
+        data = response.data
+        return data['total'], {
+            name: {str(row.get('label', row.get('value'))) if name != 'price'
+                   else row['min_price']: row['count'] for row in rows}
+            for name, rows in data['facets'].items()
+        }
+
+    def test_counts_without_filters(self):
+        total, facets = self.facets()
+        self.assertEqual(total, 3)
+        self.assertEqual(facets['tour_type'], {
+            'Автобусный групповой': 2, 'Автобусный малая группа': 0, 'Индивидуальный': 1,
+        })
+        self.assertEqual(facets['region'], {'Кахетия': 2, 'Тбилиси': 1})
+        self.assertEqual(facets['duration'], {'3': 1, '5': 2})
+        self.assertEqual(facets['price'], {None: 1, 30000: 1, 50000: 0, 70000: 1})
+
+    def test_facet_ignores_own_filter(self):
+        total, facets = self.facets(tour_type='bus_group', region='кахетия')
+        self.assertEqual(total, 1)
+        # Тип считается при выбранном регионе, регион - при выбранном типе
+        self.assertEqual(facets['tour_type']['Индивидуальный'], 1)
+        self.assertEqual(facets['region'], {'Кахетия': 1, 'Тбилиси': 1})
+        self.assertEqual(facets['duration'], {'3': 1})
+
+    def test_price_bucket_matches_list_filter(self):
+        response = self.client.get('/api/tours/facets/')
+        bucket = response.data['facets']['price'][1]
+        listed = self.client.get('/api/tours/', {
+            'min_price': bucket['min_price'], 'max_price': bucket['max_price'],
+        })
+        self.assertEqual(listed.data['count'], bucket['count'])
+
+    def test_region_count_matches_list_with_secondary_region(self):
+        create_tour(Tour.objects.get(title='A').tour_operator, title='E',
+                    region='Тбилиси, Кахетия', price_base=20000, duration_days=2)
+        total, facets = self.facets()
+        self.assertEqual(facets['region'], {'Кахетия': 3, 'Тбилиси': 2})
+        for row in self.client.get('/api/tours/facets/').data['facets']['region']:
+            with self.subTest(region=row['label']):
+                listed = self.client.get('/api/tours/', {'region': row['value']})
+                self.assertEqual(listed.data['count'], row['count'])
+
+    def test_fixed_queries_and_normalized_cache(self):
+        # четыре фасета (регион - два запроса) + список регионов
+        with self.assertNumQueries(6):
+            self.facets(region='Кахетия', ordering='price_base')
+        with self.assertNumQueries(0):
+            self.facets(region=' кахетия ', page=2, search='')
+        with self.assertNumQueries(6):
+            self.facets(region='Тбилиси')
+
+    def test_cache_invalidated_by_tour_changes(self):
+        self.assertEqual(self.facets()[0], 3)
+        tour = Tour.objects.get(title='D')
+        tour.is_active = True
+        tour.save()
+        self.assertEqual(self.facets()[0], 4)
+
+    def test_invalid_params(self):
+        response = self.client.get('/api/tours/facets/', {'tour_type': 'plane'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/api/tours/facets/', {'min_price': 'дорого'})
+        self.assertEqual(response.status_code, 400)
+
+
+class SeatHoldTest(APITestCase):
+    """Удержание мест на время оформления и снятие истекших удержаний"""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.tour = create_tour(create_operator())
+        self.date = create_date(self.tour, seats=5)
+
+    def hold(self, seats):
+        response = self.client.post('/api/holds/', {'tour_date': self.date.pk, 'seats': seats})
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data['token']
+
+    def expire(self):
+        SeatHold.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+    def test_hold_takes_seats_and_last_seats_are_refused(self):
+        self.hold(3)
+        self.hold(2)
+        self.date.refresh_from_db()
+        self.assertEqual((self.date.available_seats, self.date.status), (0, 'full'))
+
+        response = self.client.post('/api/holds/', {'tour_date': self.date.pk, 'seats': 1})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(SeatHold.objects.count(), 2)
+
+    def test_booking_with_hold_uses_held_seats(self):
+        token = self.hold(5)
+        # Все места удержаны, но заявка по токену проходит
+        response = self.client.post('/api/bookings/', booking_data(
+            self.date.pk, 5, hold_token=token
+        ))
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertFalse(SeatHold.objects.exists())
+        self.date.refresh_from_db()
+        self.assertEqual(self.date.available_seats, 0)
+
+        # Токен погашен: повторная заявка мест уже не получит
+        response = self.client.post('/api/bookings/', booking_data(
+            self.date.pk, 1, hold_token=token
+        ))
+        self.assertEqual(response.status_code, 400)
+
+    def test_booking_adjusts_difference_with_hold(self):
+        token = self.hold(3)
+        self.client.post('/api/bookings/', booking_data(self.date.pk, 1, hold_token=token))
+        self.date.refresh_from_db()
+        self.assertEqual(self.date.available_seats, 4)
+
+        token = self.hold(2)
+        self.client.post('/api/bookings/', booking_data(self.date.pk, 4, hold_token=token))
+        self.date.refresh_from_db()
+        self.assertEqual((self.date.available_seats, self.date.status), (0, 'full'))
+
+    def test_expired_hold_is_not_redeemed(self):
+        token = self.hold(5)
+        self.expire()
+        with self.assertRaises(SeatsUnavailable):
+            booking = Booking(**booking_data(self.date, 5))
+            booking.hold_token = token
+            booking.save()
+        self.assertEqual(SeatHold.objects.count(), 1)
+
+    def test_sweeper_releases_expired_holds_in_bulk(self):
+        other = create_date(self.tour, days_ahead=40, seats=4)
+        self.hold(3)
+        self.hold(2)
+        SeatHold.objects.hold(other.pk, 3)
+        self.expire()
+        # Это удержание еще действует
+        fresh = SeatHold.objects.hold(other.pk, 1)
+
+        out = StringIO()
+        # Пометка, даты удержаний, UPDATE дат, DELETE, чтение дат для сброса
+        # карточек и календаря и savepoint; от числа удержаний не зависит
+        with self.assertNumQueries(7):
+            call_command('release_expired_holds', stdout=out)
+        self.assertIn('Снято удержаний: 3', out.getvalue())
+        self.assertEqual(list(SeatHold.objects.all()), [fresh])
+        self.date.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((self.date.available_seats, self.date.status), (5, 'available'))
+        self.assertEqual((other.available_seats, other.status), (3, 'available'))
+
+    def test_release_invalidates_calendar(self):
+        self.hold(5)
+        month = f'{self.date.start_date:%Y-%m}'
+        url = f'/api/tours/{self.tour.slug}/calendar/?month={month}'
+        day = self.client.get(url).data['months'][0]['days'][0]
+        self.assertEqual(day['status'], 'full')
+
+        self.expire()
+        SeatHold.objects.expired().release()
+        day = self.client.get(url).data['months'][0]['days'][0]
+        self.assertEqual((day['status'], day['seats_left']), ('available', 5))
+
+    def test_cancel_hold(self):
+        token = self.hold(2)
+        self.assertEqual(self.client.delete(f'/api/holds/{token}/').status_code, 204)
+        self.date.refresh_from_db()
+        self.assertEqual(self.date.available_seats, 5)
+        self.assertEqual(self.client.delete(f'/api/holds/{token}/').status_code, 404)
+        self.assertEqual(self.client.delete('/api/holds/not-a-token/').status_code, 404)
+
+
+class BookingSeatsTest(APITestCase):
+    """Возврат и списание мест при смене статуса заявок"""
+
+    def setUp(self):
+        super().setUp()
+        self.tour = create_tour(create_operator())
+        self.date = create_date(self.tour, seats=5)
+        self.other = create_date(self.tour, days_ahead=40, seats=4)
+
+    def seats(self, tour_date):
+        tour_date.refresh_from_db()
+        return tour_date.available_seats, tour_date.status
+
+    def test_bulk_cancel_returns_seats_with_constant_queries(self):
+        for people in (2, 3):
+            Booking.objects.create(**booking_data(self.date, people))
+        Booking.objects.create(**booking_data(self.other, 1))
+        self.assertEqual(self.seats(self.date), (0, 'full'))
+
+        # GROUP BY, UPDATE дат, UPDATE заявок, даты для сброса кэша и savepoint
+        with self.assertNumQueries(6):
+            updated = Booking.objects.all().set_status('cancelled')
+        self.assertEqual(updated, 3)
+        self.assertEqual(self.seats(self.date), (5, 'available'))
+        self.assertEqual(self.seats(self.other), (4, 'available'))
+
+        # Повторная отмена мест не добавляет
+        Booking.objects.all().set_status('cancelled')
+        self.assertEqual(self.seats(self.date), (5, 'available'))
+
+    def test_restoring_cancelled_bookings_takes_seats_again(self):
+        first = Booking.objects.create(**booking_data(self.date, 3))
+        Booking.objects.create(**booking_data(self.other, 4))
+        Booking.objects.all().set_status('cancelled')
+        Booking.objects.create(**booking_data(self.other, 2))
+
+        # На other осталось 2 места, а восстановить нужно 4 - не меняется ничего
+        with self.assertRaises(SeatsUnavailable):
+            Booking.objects.filter(status='cancelled').set_status('confirmed')
+        self.assertEqual(Booking.objects.filter(status='cancelled').count(), 2)
+        self.assertEqual(self.seats(self.date), (5, 'available'))
+
+        Booking.objects.filter(pk=first.pk).set_status('confirmed')
+        self.assertEqual(self.seats(self.date), (2, 'available'))
+
+    def test_admin_cancel_action_releases_seats(self):
+        from django.contrib.admin.sites import site
+        from django.test import RequestFactory
+
+        booking = Booking.objects.create(**booking_data(self.date, 5))
+        request = RequestFactory().post('/')
+        site._registry[Booking].cancel_bookings(request, Booking.objects.filter(pk=booking.pk))
+        self.assertEqual(self.seats(self.date), (5, 'available'))
+
+    def test_save_moves_seats_on_status_and_date_change(self):
+        booking = Booking.objects.create(**booking_data(self.date, 2))
+        booking = Booking.objects.get(pk=booking.pk)
+        booking.status = 'cancelled'
+        booking.save()
+        self.assertEqual(self.seats(self.date), (5, 'available'))
+
+        booking.status = 'confirmed'
+        booking.tour_date = self.other
+        booking.people_count = 4
+        booking.save()
+        self.assertEqual(self.seats(self.date), (5, 'available'))
+        self.assertEqual(self.seats(self.other), (0, 'full'))
+
+        booking.tour_date = self.date
+        booking.save()
+        self.assertEqual(self.seats(self.date), (1, 'available'))
+        self.assertEqual(self.seats(self.other), (4, 'available'))
+
+    def test_clean_reports_missing_seats(self):
+        from django.core.exceptions import ValidationError
+
+        booking = Booking.objects.create(**booking_data(self.date, 2))
+        booking = Booking.objects.get(pk=booking.pk)
+        booking.people_count = 5
+        booking.clean()
+        booking.people_count = 6
+        with self.assertRaises(ValidationError):
+            booking.clean()
+
+    def test_reconcile_fixes_drift(self):
+        Booking.objects.create(**booking_data(self.date, 2))
+        SeatHold.objects.hold(self.date.pk, 1)
+        Booking.objects.create(**booking_data(self.other, 4))
+        # Отмена в обход set_status: места не вернулись
+        Booking.objects.filter(tour_date=self.other).update(status='cancelled')
+        TourDate.objects.filter(pk=self.date.pk).update(available_seats=5)
+
+        out = StringIO()
+        call_command('reconcile_seats', stdout=out)
+        self.assertIn('Исправлено дат: 2', out.getvalue())
+        self.assertEqual(self.seats(self.date), (2, 'available'))
+        self.assertEqual(self.seats(self.other), (4, 'available'))
+
+        self.assertEqual(TourDate.reconcile_seats(), [])
+
+
+class AdminChangelistQueriesTest(APITestCase):
+    """Число запросов списков админки не зависит от числа строк"""
+
+    # Сессия и пользователь - 2 запроса; у больших таблиц COUNT ограничен
+    # LIMIT (EstimatedCountPaginator) и нет "показать все"
+    EXPECTED = {
+        'touroperator': 5, 'tour': 7, 'region': 5, 'tourphoto': 6, 'tourdate': 6,
+        'booking': 6, 'review': 5, 'faq': 5, 'blogpost': 7, 'lead': 6,
+    }
+
+    def setUp(self):
+        from django.contrib.auth.models import User
+
+        super().setUp()
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        self.rows = 0
+        self.fill(2)
+
+    def fill(self, count):
+        for _ in range(count):
+            self.rows += 1
+            number = self.rows
+            tour = create_tour(create_operator(name=f'Оператор {number}'),
+                               title=f'Тур {number}', region=f'Регион {number}')
+            create_photo(tour)
+            tour_date = create_date(tour, days_ahead=30 + number)
+            Booking.objects.create(**booking_data(tour_date, 1))
+            Review.objects.create(tour=tour, client_name='Анна', rating=5, text='Отлично')
+            FAQ.objects.create(question=f'Вопрос {number}', answer='Ответ', category='general')
+            BlogPost.objects.create(title=f'Статья {number}', content='Текст', excerpt='Кратко',
+                                    category='news', published_at=timezone.now())
+            Lead.objects.create(name='Иван', phone='+79001234567', source='contact_form')
+
+    def changelist_queries(self):
+        from django.contrib import admin
+        from django.test.utils import CaptureQueriesContext
+
+        counts = {}
+        for model in admin.site._registry:
+            if model._meta.app_label != 'tours':
+                continue
+            url = f'/secret-admin/tours/{model._meta.model_name}/'
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            counts[model._meta.model_name] = len(queries)
+        return counts
+
+    def test_query_counts_are_pinned_and_constant(self):
+        counts = self.changelist_queries()
+        self.assertEqual(counts, self.EXPECTED)
+        self.fill(3)
+        self.assertEqual(self.changelist_queries(), counts)
+
+    def test_paginator_count_is_bounded(self):
+        from .pagination import EstimatedCountPaginator
+
+        self.fill(3)
+        paginator = EstimatedCountPaginator(Booking.objects.all(), 2)
+        paginator.exact_limit = 3
+        with self.assertNumQueries(1):
+            # Больше лимита: на SQLite оценки нет, число - сам лимит
+            self.assertEqual(paginator.count, 3)
+        self.assertEqual(EstimatedCountPaginator(Booking.objects.all(), 2).count, 5)
+
+
+class IngestQueueTest(APITestCase):
+    """Очередь заявок: ответ сразу, запись пачками командой drain_ingest_queue"""
+
+    def setUp(self):
+        import tempfile
+
+        super().setUp()
+        spool = tempfile.TemporaryDirectory()
+        self.addCleanup(spool.cleanup)
+        settings = override_settings(INGEST_QUEUE=True, INGEST_SPOOL_DIR=spool.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.client = APIClient()
+        self.tour = create_tour(create_operator())
+        self.date = create_date(self.tour, seats=3)
+
+    def drain(self):
+        out = StringIO()
+        call_command('drain_ingest_queue', stdout=out)
+        return out.getvalue()
+
+    def book(self, people):
+        response = self.client.post('/api/bookings/', booking_data(self.date.pk, people))
+        self.assertEqual(response.status_code, 202, response.data)
+        return response.data
+
+    def test_submissions_are_written_by_drain(self):
+        queued = self.book(2)
+        self.client.post('/api/leads/', {'name': 'Иван', 'phone': '+79001234567',
+                                         'source': 'contact_form'})
+        self.client.post('/api/reviews/', {'tour': self.tour.pk, 'client_name': 'Анна',
+                                           'rating': 5, 'text': 'Отлично'})
+        self.assertEqual(Booking.objects.count() + Lead.objects.count()
+                         + Review.objects.count(), 0)
+        status = self.client.get(queued['status_url']).data
+        self.assertEqual(status['status'], 'queued')
+
+        self.assertIn('Записано: 3', self.drain())
+        booking = Booking.objects.get()
+        self.assertEqual(booking.ingest_id.hex, queued['ingest_id'])
+        self.assertEqual(Lead.objects.count(), 1)
+        self.assertEqual(Review.objects.get().moderation_status, 'pending')
+        self.date.refresh_from_db()
+        self.assertEqual(self.date.available_seats, 1)
+
+        status = self.client.get(queued['status_url']).data
+        self.assertEqual((status['status'], status['booking_id']), ('accepted', booking.pk))
+
+    def test_redelivery_does_not_duplicate(self):
+        import shutil
+        import tempfile
+        from pathlib import Path
+        from . import ingest
+
+        self.book(1)
+        self.client.post('/api/leads/', {'name': 'Иван', 'phone': '+79001234567',
+                                         'source': 'contact_form'})
+        incoming = ingest.spool_dir(ingest.INCOMING)
+        backup = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        for path in incoming.glob('*.json'):
+            shutil.copy(path, backup / path.name)
+        self.drain()
+
+        # Воркер упал после коммита, не удалив файлы: они приходят снова
+        for path in backup.glob('*.json'):
+            shutil.copy(path, incoming / path.name)
+        self.drain()
+        self.assertEqual(Booking.objects.count(), 1)
+        self.assertEqual(Lead.objects.count(), 1)
+        self.date.refresh_from_db()
+        self.assertEqual(self.date.available_seats, 2)
+
+    def test_booking_without_seats_is_rejected(self):
+        first = self.book(3)
+        second = self.book(2)
+        self.assertIn('отклонено: 1', self.drain())
+        self.assertEqual(self.client.get(first['status_url']).data['status'], 'accepted')
+        status = self.client.get(second['status_url']).data
+        self.assertEqual(status['status'], 'rejected')
+        self.assertIn('people_count', status['errors'])
+
+    def test_stale_processing_files_are_recovered(self):
+        import os
+        from . import ingest
+
+        self.book(1)
+        [path] = ingest.claim(10)
+        ingest.recover()
+        self.assertTrue(path.exists())
+        old = time.time() - ingest.STALE_SECONDS - 1
+        os.utime(path, (old, old))
+        self.drain()
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_unknown_status_is_404(self):
+        self.assertEqual(
+            self.client.get(f'/api/bookings/status/{"0" * 32}/').status_code, 404
+        )
+
+
+@override_settings(CACHES=TEST_CACHES, IMAGE_WORKERS=0, RATE_LIMIT_ENABLED=False,
+                   READ_DATABASES=[])
+class IngestItemErrorsTest(TransactionTestCase):
+    """Запись, сломанная после постановки в очередь, не блокирует пачку"""
+
+    def setUp(self):
+        import tempfile
+
+        spool = tempfile.TemporaryDirectory()
+        self.addCleanup(spool.cleanup)
+        settings = override_settings(INGEST_QUEUE=True, INGEST_SPOOL_DIR=spool.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_broken_items_are_rejected(self):
+        from . import ingest
+
+        operator = create_operator()
+        kept = create_tour(operator)
+        date = create_date(kept, seats=3)
+        gone_date = create_date(kept, days_ahead=40, seats=3)
+        gone_tour = create_tour(operator)
+        client = APIClient()
+        booked = client.post('/api/bookings/', booking_data(date.pk, 1)).data
+        orphan = client.post('/api/bookings/', booking_data(gone_date.pk, 1)).data
+        client.post('/api/reviews/', {'tour': gone_tour.pk, 'client_name': 'Анна',
+                                      'rating': 5, 'text': 'Отлично'})
+        client.post('/api/leads/', {'name': 'Иван', 'phone': '+79001234567',
+                                    'source': 'contact_form'})
+        # Пока записи ждали в очереди, дату и тур удалили
+        gone_date.delete()
+        gone_tour.delete()
+
+        self.assertEqual(ingest.drain(), (2, 2))
+        self.assertEqual(Booking.objects.get().ingest_id.hex, booked['ingest_id'])
+        self.assertEqual(Lead.objects.count(), 1)
+        self.assertFalse(Review.objects.exists())
+        status = client.get(orphan['status_url']).data
+        self.assertEqual(status['status'], 'rejected')
+        self.assertEqual(len(list(ingest.spool_dir(ingest.REJECTED).glob('*.json'))), 2)
+        self.assertFalse(any(ingest.spool_dir(ingest.PROCESSING).iterdir()))
+
+
+class RateLimitTest(APITestCase):
+    """Token bucket для POST-запросов: 429 с Retry-After до разбора запроса"""
+
+    def setUp(self):
+        import tempfile
+        from . import ratelimit
+
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        limits = override_settings(
+            RATE_LIMIT_ENABLED=True,
+            RATE_LIMIT_DB=f'{directory.name}/buckets.sqlite3',
+            RATE_LIMITS={'POST /api/leads/': {'client': (2, 0.5), 'global': (3, 0.1)}},
+        )
+        limits.enable()
+        self.addCleanup(limits.disable)
+        # Соединение с файлом ведер - на поток, а файл у каждого теста свой
+        self.addCleanup(lambda: ratelimit._local.__dict__.clear())
+        self.client = APIClient()
+        self.now = 1000.0
+        clock = mock.patch('tours.ratelimit.time.time', side_effect=lambda: self.now)
+        clock.start()
+        self.addCleanup(clock.stop)
+
+    def post(self, ip='10.0.0.1'):
+        return self.client.post('/api/leads/', {
+            'name': 'Иван', 'phone': '+79001234567', 'source': 'contact_form',
+        }, REMOTE_ADDR=ip)
+
+    def test_client_bucket_rejects_before_view(self):
+        self.assertEqual(self.post().status_code, 201)
+        self.assertEqual(self.post().status_code, 201)
+        with self.assertNumQueries(0):
+            response = self.post()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '2')
+        self.assertEqual(Lead.objects.count(), 2)
+
+        # Токен восполняется со временем
+        self.now += 2
+        self.assertEqual(self.post().status_code, 201)
+
+    def test_global_bucket_limits_all_clients(self):
+        statuses = [self.post(f'10.0.0.{number}').status_code for number in range(5)]
+        self.assertEqual(statuses, [201, 201, 201, 429, 429])
+        self.assertEqual(self.post('10.0.0.9')['Retry-After'], '10')
+
+    def test_global_rejection_refunds_client_token(self):
+        from . import ratelimit
+
+        for number in range(3):
+            self.post(f'10.0.0.{number + 2}')
+        self.assertEqual([self.post().status_code for _ in range(3)], [429] * 3)
+        [(tokens,)] = ratelimit.get_connection().execute(
+            'SELECT tokens FROM buckets WHERE key = ?', ('POST /api/leads/ 10.0.0.1',)
+        ).fetchall()
+        self.assertEqual(tokens, 2)
+
+    def test_other_routes_are_not_limited(self):
+        for _ in range(5):
+            self.post()
+        self.assertEqual(self.client.get('/api/faq/', REMOTE_ADDR='10.0.0.1').status_code, 200)
+
+    @override_settings(RATE_LIMIT_PROXY_COUNT=1)
+    def test_client_ip_from_trusted_proxy(self):
+        from .ratelimit import client_ip
+
+        request = mock.Mock(META={
+            'REMOTE_ADDR': '10.1.1.1', 'HTTP_X_FORWARDED_FOR': '1.2.3.4, 5.6.7.8',
+        })
+        self.assertEqual(client_ip(request), '5.6.7.8')
+
+    def test_storage_errors_fail_open(self):
+        import sqlite3
+
+        with mock.patch('tours.ratelimit.take', side_effect=sqlite3.OperationalError('locked')), \
+                self.assertLogs('tours.ratelimit', 'WARNING'):
+            statuses = [self.post().status_code for _ in range(4)]
+        self.assertEqual(statuses, [201] * 4)
+
+
+@override_settings(IMAGE_WORKERS=0, RATE_LIMIT_ENABLED=False, RESPONSE_CACHE_TIMEOUT=0,
+                   CACHES=TEST_CACHES, READ_DATABASES=['readonly'])
+class ReadRouterTest(TransactionTestCase):
+    """GET читает через соединения только для чтения, запись - в default"""
+    databases = {'default', 'readonly'}
+
+    def setUp(self):
+        from django.db import connections
+
+        self.readonly = connections['readonly']
+        self.date = create_date(create_tour(create_operator()), seats=10)
+
+    def test_get_reads_from_readonly_alias(self):
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as written, \
+                CaptureQueriesContext(self.readonly) as read:
+            response = self.client.get('/api/tours/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['id'], self.date.tour_id)
+        self.assertTrue(read.captured_queries)
+        self.assertFalse(written.captured_queries)
+
+    def test_bench_api_counts_replica_queries(self):
+        import os
+        import tempfile
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'bench.json')
+            call_command('bench_api', requests=1, warmup=0, only=['tour', 'faq'],
+                         output=path, stdout=StringIO())
+            with open(path, encoding='utf-8') as source:
+                results = {row['name']: row for row in json.load(source)['results']}
+        # GET читает через readonly: счетчик должен видеть и эти запросы
+        self.assertGreater(results['tour-list']['queries'], 0)
+        self.assertGreater(results['faq-list']['queries'], 0)
+
+    def test_post_stays_on_default(self):
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(self.readonly) as read:
+            response = self.client.post('/api/bookings/', booking_data(self.date.pk, 2))
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(read.captured_queries)
+        self.date.refresh_from_db()
+        self.assertEqual(self.date.available_seats, 8)
+
+    def test_transaction_reads_from_default(self):
+        from django.db import transaction
+        from .routers import ReadRouter, read_only_request
+
+        token = read_only_request.set(True)
+        try:
+            self.assertEqual(ReadRouter().db_for_read(Tour), 'readonly')
+            with transaction.atomic():
+                self.assertEqual(ReadRouter().db_for_read(Tour), 'default')
+            self.assertEqual(ReadRouter().db_for_write(Tour), 'default')
+        finally:
+            read_only_request.reset(token)
+
+    def test_readonly_connection_rejects_writes(self):
+        import sqlite3
+        import tempfile
+        from django.conf import settings
+
+        # В тестах зеркало берет настройки default, поэтому прагмы
+        # проверяются на отдельном файле
+        init_command = settings.DATABASES['readonly']['OPTIONS']['init_command']
+        with tempfile.TemporaryDirectory() as directory:
+            path = f'{directory}/db.sqlite3'
+            with sqlite3.connect(path) as writer:
+                writer.execute('CREATE TABLE t (x)')
+            reader = sqlite3.connect(path)
+            reader.executescript(init_command)
+            with self.assertRaisesRegex(sqlite3.OperationalError, 'readonly'):
+                reader.execute('INSERT INTO t VALUES (1)')
+            reader.close()
+
+
+@override_settings(IMAGE_WORKERS=0, RATE_LIMIT_ENABLED=False, RESPONSE_CACHE_TIMEOUT=600,
+                   CACHES=TEST_CACHES, READ_DATABASES=['readonly'], READ_YOUR_WRITES_SECONDS=5)
+class ReadYourWritesTest(TransactionTestCase):
+    """После записи клиент читает из default; алиас readonly играет роль реплики"""
+    databases = {'default', 'readonly'}
+
+    def setUp(self):
+        from django.db import connections
+
+        cache.clear()
+        self.readonly = connections['readonly']
+        self.date = create_date(create_tour(create_operator()), seats=10)
+
+    def reads(self, path, client=None):
+        """Запросы GET к (default, readonly)"""
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as written, \
+                CaptureQueriesContext(self.readonly) as read:
+            response = (client or self.client).get(path)
+        self.assertEqual(response.status_code, 200)
+        return len(written.captured_queries), len(read.captured_queries)
+
+    def test_booking_sticks_client_to_primary(self):
+        from .routers import STICKY_COOKIE
+
+        response = self.client.post('/api/bookings/', booking_data(self.date.pk, 2))
+        self.assertEqual(response.status_code, 201)
+        cookie = response.cookies[STICKY_COOKIE]
+        self.assertEqual(cookie['max-age'], 5)
+        # Фронтенд на другом сайте: cookie уходит только с SameSite=None; Secure
+        self.assertEqual((cookie['samesite'], cookie['secure']), ('None', True))
+
+        on_default, on_readonly = self.reads('/api/reviews/')
+        self.assertGreater(on_default, 0)
+        self.assertEqual(on_readonly, 0)
+
+        # Другие клиенты по-прежнему читают из реплики
+        on_default, on_readonly = self.reads('/api/reviews/', APIClient())
+        self.assertEqual(on_default, 0)
+        self.assertGreater(on_readonly, 0)
+
+    def test_echoed_header_sticks_without_cookie(self):
+        from .routers import STICKY_HEADER
+
+        response = self.client.post('/api/bookings/', booking_data(self.date.pk, 2),
+                                    HTTP_ORIGIN='https://example.github.io')
+        until = response[STICKY_HEADER]
+        self.assertIn(STICKY_HEADER, response['Access-Control-Expose-Headers'])
+
+        client = APIClient(headers={STICKY_HEADER: until})
+        self.assertEqual(self.reads('/api/reviews/', client)[1], 0)
+
+    def test_failed_write_does_not_stick(self):
+        from .routers import STICKY_COOKIE
+
+        response = self.client.post('/api/bookings/', booking_data(self.date.pk, 50))
+        self.assertEqual(response.status_code, 400)
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+
+    def test_expired_or_broken_cookie_reads_from_replica(self):
+        from .routers import STICKY_COOKIE
+
+        for value in (str(int(time.time()) - 1), 'junk'):
+            self.client.cookies[STICKY_COOKIE] = value
+            self.assertEqual(self.reads('/api/reviews/')[0], 0)
+
+    def test_replica_reads_are_not_cached_right_after_write(self):
+        from .cache import RECENT_WRITE_KEY
+
+        tour = self.date.tour
+        tour.title = 'Новое название'
+        tour.save()
+        self.assertEqual(self.client.get('/api/tours/')['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get('/api/tours/')['X-Cache'], 'MISS')
+
+        # Окно отставания реплик прошло
+        cache.delete(RECENT_WRITE_KEY)
+        self.assertEqual(self.client.get('/api/tours/')['X-Cache'], 'MISS')
+        response = self.client.get('/api/tours/')
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(response.json()['results'][0]['title'], 'Новое название')
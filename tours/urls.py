@@ -1,19 +1,44 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
     TourViewSet, BookingViewSet, ReviewViewSet, 
-    FAQViewSet, BlogPostViewSet, LeadViewSet, TourOperatorViewSet
+    FAQViewSet, BlogPostViewSet, LeadViewSet, TourOperatorViewSet, RegionViewSet,
+    SeatHoldViewSet
 )
+from .async_views import AsyncReviewListView, async_view
 
 router = DefaultRouter()
 router.register(r'tours', TourViewSet, basename='tour')
 router.register(r'bookings', BookingViewSet, basename='booking')
+router.register(r'holds', SeatHoldViewSet, basename='hold')
 router.register(r'reviews', ReviewViewSet, basename='review')
 router.register(r'faq', FAQViewSet, basename='faq')
 router.register(r'blog', BlogPostViewSet, basename='blog')
 router.register(r'leads', LeadViewSet, basename='lead')
 router.register(r'tour-operators', TourOperatorViewSet, basename='touroperator')
+router.register(r'regions', RegionViewSet, basename='region')
 
 urlpatterns = [
     path('', include(router.urls)),
 ]
+
+# Под ASGI чтение обслуживают асинхронные вьюхи (см. async_views.py)
+async_urlpatterns = [
+    path('tours/', async_view(TourViewSet, 'tour', 'list')),
+    # Действия списка не должны попасть под tours/<slug>/
+    path('tours/facets/', TourViewSet.as_view({'get': 'facets'})),
+    path('tours/<str:slug>/', async_view(TourViewSet, 'tour', 'retrieve')),
+    path('reviews/', async_view(ReviewViewSet, 'review', 'list', AsyncReviewListView)),
+    path('faq/', async_view(FAQViewSet, 'faq', 'list')),
+    path('faq/<str:pk>/', async_view(FAQViewSet, 'faq', 'retrieve')),
+    path('blog/', async_view(BlogPostViewSet, 'blog', 'list')),
+    path('blog/<str:slug>/', async_view(BlogPostViewSet, 'blog', 'retrieve')),
+    path('tour-operators/', async_view(TourOperatorViewSet, 'touroperator', 'list')),
+    path('tour-operators/<str:pk>/',
+         async_view(TourOperatorViewSet, 'touroperator', 'retrieve')),
+    path('regions/', async_view(RegionViewSet, 'region', 'list')),
+]
+
+if settings.ASYNC_READ_API:
+    urlpatterns = async_urlpatterns + urlpatterns
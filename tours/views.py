@@ -1,41 +1,177 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework.filters import SearchFilter, OrderingFilter
+from rest_framework.filters import OrderingFilter
+from django.db.models import Count, F, Max, OuterRef, Q, Subquery, Window
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.conf import settings
+from django.http import Http404
+from django.db.models.functions import RowNumber
 from django.utils import timezone
 
 from .models import (
-    Tour, Booking, Review, FAQ, BlogPost, Lead, TourOperator
+    Tour, TourPhoto, TourDate, TourCard, Booking, Review, FAQ, BlogPost, Lead,
+    TourOperator, Region, RegionAlias, SeatHold, TourRegion
 )
 from .serializers import (
     TourListSerializer, TourDetailSerializer,
     BookingCreateSerializer, ReviewSerializer, ReviewCreateSerializer,
     FAQSerializer, BlogPostListSerializer, BlogPostDetailSerializer,
-    LeadCreateSerializer, TourOperatorSerializer
+    LeadCreateSerializer, TourOperatorSerializer, RegionSerializer,
+    SeatHoldSerializer
 )
-from .filters import TourFilter
+from .filters import TourFilter, TourSearchFilter
+from .pagination import KeysetPagination, OptionalKeysetPaginationMixin
+from . import availability
+from .cache import CachedResponseMixin, get_generations
+from .facets import get_facets
+from . import ingest
+from .conditional import ConditionalGetMixin, latest
 
 
-class TourViewSet(viewsets.ReadOnlyModelViewSet):
+class TourViewSet(CachedResponseMixin, ConditionalGetMixin,
+                  OptionalKeysetPaginationMixin, viewsets.ReadOnlyModelViewSet):
     """
     API для туров
     list: каталог туров с фильтрами
+          (?pagination=cursor - бесконечная лента без COUNT(*))
     retrieve: детальная страница тура
+    calendar: дни с датами тура по месяцам для выбора даты
+    facets: счетчики туров для панели фильтров (параметры как у list)
     """
     queryset = Tour.objects.filter(is_active=True).select_related('tour_operator')
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    filter_backends = [DjangoFilterBackend, OrderingFilter, TourSearchFilter]
     filterset_class = TourFilter
-    search_fields = ['title', 'description_short', 'description_full', 'region']
-    ordering_fields = ['price_base', 'duration_days', 'created_at']
+    ordering_fields = ['price_base', 'duration_days', 'created_at', 'rating']
     ordering = ['-created_at']
     lookup_field = 'slug'
+    # Одобренные отзывы меняют статистику Tour (см. signals.review_changed)
+    cache_models = [Tour, TourOperator, TourPhoto, TourDate, TourCard, TourRegion]
+    cache_by_day = True
+    
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'list':
+            # Карточка каталога читается из TourCard одним JOIN
+            queryset = queryset.select_related(
+                'card__cover_photo', 'card__nearest_date'
+            )
+        return queryset
     
     def get_serializer_class(self):
         if self.action == 'retrieve':
             return TourDetailSerializer
         return TourListSerializer
 
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        if page is not None and self.action == 'list':
+            self.prepare_page(page)
+        return page
+
+    def prepare_page(self, page):
+        """Устаревшие карточки страницы - одной пачкой (и в async_views.py)"""
+        TourCard.ensure_fresh(page)
+    
+    def get_list_validators(self, request):
+        # По всем турам, а не только активным: снятие с публикации тоже
+        # меняет updated_at, как и оценки. Карточки отражают фото и даты
+        stats = Tour.objects.aggregate(
+            modified=Max('updated_at'),
+            count=Count('pk'),
+            cards_modified=Max('card__updated_at'),
+        )
+        parts = [
+            stats['modified'], stats['count'], stats['cards_modified'],
+            *get_generations([TourOperator]),
+        ]
+        return parts, latest(stats['modified'], stats['cards_modified'])
+    
+    def get_detail_validators(self, request):
+        def related(model, field='tour', **filters):
+            rows = model.objects.filter(**{field: OuterRef('pk')}, **filters).order_by()
+            rows = rows.values(field)
+            return (
+                Subquery(rows.annotate(v=Max('updated_at')).values('v')),
+                Subquery(rows.annotate(v=Count('pk')).values('v')),
+            )
+        
+        dates_modified, dates_count = related(TourDate)
+        photos_modified, photos_count = related(TourPhoto)
+        # Отзывы на модерации страницу тура не меняют
+        reviews_modified, reviews_count = related(Review, moderation_status='approved')
+        row = self.get_queryset().filter(
+            **{self.lookup_field: self.kwargs[self.lookup_field]}
+        ).annotate(
+            dates_modified=dates_modified, dates_count=dates_count,
+            photos_modified=photos_modified, photos_count=photos_count,
+            reviews_modified=reviews_modified, reviews_count=reviews_count,
+        ).values(
+            'pk', 'updated_at', 'tour_operator_id',
+            'dates_modified', 'dates_count', 'photos_modified', 'photos_count',
+            'reviews_modified', 'reviews_count',
+        ).first()
+        if row is None:
+            return None
+        parts = [*row.values(), *get_generations([TourOperator])]
+        return parts, latest(
+            row['updated_at'], row['dates_modified'],
+            row['photos_modified'], row['reviews_modified'],
+        )
+
+    
+    @action(detail=False)
+    def facets(self, request):
+        """Число туров по типу, региону, длительности и цене при текущих фильтрах"""
+        return Response(get_facets(
+            self.get_queryset(), request.query_params,
+            [*self.cache_models, Region, RegionAlias],
+        ))
+    
+    @action(detail=True)
+    def calendar(self, request, slug=None):
+        """
+        Дни с датами тура по месяцам:
+        ?month=YYYY-MM или ?from=YYYY-MM&to=YYYY-MM (до 12 месяцев),
+        по умолчанию - текущий месяц
+        """
+        months = self.get_calendar_months(request)
+        tour_id = self.get_queryset().filter(slug=slug).values_list('pk', flat=True).first()
+        if tour_id is None:
+            raise Http404
+        return Response({
+            'tour': slug,
+            'months': availability.get_calendar(tour_id, months),
+        })
+    
+    def get_calendar_months(self, request):
+        params = request.query_params
+        current = availability.month_start(timezone.now().date())
+        values = {
+            'from': params.get('month') or params.get('from'),
+            'to': params.get('month') or params.get('to'),
+        }
+        bounds = {}
+        for param, value in values.items():
+            if not value:
+                continue
+            try:
+                bounds[param] = availability.parse_month(value)
+            except ValueError:
+                raise ValidationError({param: 'Ожидается месяц в формате YYYY-MM'})
+        first = bounds.get('from', current)
+        last = bounds.get('to', first)
+        count = (last.year - first.year) * 12 + last.month - first.month + 1
+        if count < 1:
+            raise ValidationError({'to': 'Конец периода раньше начала'})
+        if count > availability.MAX_MONTHS:
+            raise ValidationError(
+                {'to': f'Не больше {availability.MAX_MONTHS} месяцев за запрос'}
+            )
+        return availability.month_range(first, last)
 
 class BookingViewSet(viewsets.GenericViewSet):
     """
@@ -48,6 +184,16 @@ class BookingViewSet(viewsets.GenericViewSet):
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
+        if settings.INGEST_QUEUE:
+            ingest_id = ingest.enqueue('booking', serializer.validated_data)
+            return Response({
+                'success': True,
+                'ingest_id': ingest_id,
+                'status_url': reverse(
+                    'booking-ingest-status', kwargs={'ingest_id': ingest_id}, request=request
+                ),
+                'message': 'Ваша заявка принята! Мы свяжемся с вами в течение часа.'
+            }, status=status.HTTP_202_ACCEPTED)
         booking = serializer.save()
         
         return Response({
@@ -56,71 +202,193 @@ class BookingViewSet(viewsets.GenericViewSet):
             'message': 'Ваша заявка принята! Мы свяжемся с вами в течение часа.'
         }, status=status.HTTP_201_CREATED)
 
+    @action(detail=False, url_path=r'status/(?P<ingest_id>[0-9a-f]{32})')
+    def ingest_status(self, request, ingest_id=None):
+        """Состояние заявки из очереди: queued, accepted или rejected"""
+        booking_id = Booking.objects.filter(
+            ingest_id=ingest_id
+        ).values_list('pk', flat=True).first()
+        if booking_id is not None:
+            return Response({'ingest_id': ingest_id, 'status': 'accepted',
+                             'booking_id': booking_id})
+        found = ingest.find(ingest_id)
+        if found is None:
+            raise Http404
+        state, errors = found
+        data = {'ingest_id': ingest_id, 'status': state}
+        if errors:
+            data['errors'] = errors
+        return Response(data)
+
+
+class SeatHoldViewSet(viewsets.GenericViewSet):
+    """
+    API для удержания мест на время оформления заявки
+    create: удержать места, в ответе токен для заявки (hold_token)
+    destroy: отпустить места, если клиент закрыл оформление
+    """
+    queryset = SeatHold.objects.all()
+    serializer_class = SeatHoldSerializer
+    lookup_field = 'token'
+
+    def create(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    def destroy(self, request, token=None):
+        try:
+            released = SeatHold.objects.filter(token=token).release()
+        except DjangoValidationError:
+            released = 0
+        if not released:
+            raise Http404
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
 
 class ReviewViewSet(viewsets.GenericViewSet):
     """
     API для отзывов
-    list: получить одобренные отзывы
+    list: одобренные отзывы, постранично по курсору (?tour_id=1 - одного тура);
+          ?tour_ids=1,2,3 - по limit последних отзывов каждого тура
+          одним запросом (превью в каталоге)
     create: добавить отзыв (с модерацией)
     """
     queryset = Review.objects.filter(moderation_status='approved')
+    pagination_class = KeysetPagination
+    ordering = ['-created_at']
+    max_preview_tours = 50
+    preview_limit = 3
+    max_preview_limit = 10
     
     def get_serializer_class(self):
         if self.action == 'create':
             return ReviewCreateSerializer
         return ReviewSerializer
     
-    def list(self, request):
-        tour_id = request.query_params.get('tour_id')
-        queryset = self.get_queryset()
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        tour_id = self.request.query_params.get('tour_id')
         
         if tour_id:
-            queryset = queryset.filter(tour_id=tour_id)
+            queryset = queryset.filter(tour_id=self.parse_ids('tour_id', tour_id)[0])
+        
+        return queryset
+    
+    def parse_ids(self, param, value):
+        """Непустой список id из 'id1,id2'; иначе 400"""
+        try:
+            ids = [int(part) for part in value.split(',') if part.strip()]
+        except ValueError:
+            ids = None
+        # Пустой список (',') и id вне диапазона ключа - тоже ошибка клиента
+        if not ids or not all(0 < pk < 2 ** 63 for pk in ids):
+            raise ValidationError({param: 'Ожидаются числовые id через запятую'})
+        return ids
+    
+    def list(self, request):
+        tour_ids = request.query_params.get('tour_ids')
+        if tour_ids:
+            return self.previews(request, self.parse_ids('tour_ids', tour_ids))
         
-        queryset = queryset.order_by('-created_at')
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        page = self.paginate_queryset(self.get_queryset())
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+    
+    def previews(self, request, tour_ids):
+        reviews = list(self.get_preview_queryset(request, tour_ids))
+        return Response(self.get_preview_data(reviews))
+    
+    def get_preview_queryset(self, request, tour_ids):
+        """Последние отзывы нескольких туров: ROW_NUMBER() по каждому туру"""
+        self.preview_tour_ids = list(dict.fromkeys(tour_ids))
+        if len(self.preview_tour_ids) > self.max_preview_tours:
+            raise ValidationError(
+                {'tour_ids': f'Не больше {self.max_preview_tours} туров за запрос'}
+            )
+        try:
+            limit = int(request.query_params.get('limit', self.preview_limit))
+        except ValueError:
+            raise ValidationError({'limit': 'Ожидается число'})
+        limit = min(max(limit, 1), self.max_preview_limit)
+        
+        return self.get_queryset().filter(tour_id__in=self.preview_tour_ids).annotate(
+            position=Window(
+                RowNumber(),
+                partition_by=[F('tour_id')],
+                order_by=[F('created_at').desc(), F('pk').desc()],
+            )
+        ).filter(position__lte=limit).order_by('tour_id', 'position')
+    
+    def get_preview_data(self, reviews):
+        data = self.get_serializer(reviews, many=True).data
+        results = {str(tour_id): [] for tour_id in self.preview_tour_ids}
+        for review, item in zip(reviews, data):
+            results[str(review.tour_id)].append(item)
+        return {'results': results}
     
     def create(self, request):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        if settings.INGEST_QUEUE:
+            ingest.enqueue('review', serializer.validated_data)
+            code = status.HTTP_202_ACCEPTED
+        else:
+            serializer.save()
+            code = status.HTTP_201_CREATED
         
         return Response({
             'success': True,
             'message': 'Спасибо за отзыв! Он будет опубликован после модерации.'
-        }, status=status.HTTP_201_CREATED)
+        }, status=code)
 
 
-class FAQViewSet(viewsets.ReadOnlyModelViewSet):
+class FAQViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
     """
     API для FAQ
     """
     queryset = FAQ.objects.filter(is_active=True).order_by('category', 'display_order')
     serializer_class = FAQSerializer
+    pagination_class = None
+    cache_models = [FAQ]
     
-    def list(self, request):
-        category = request.query_params.get('category')
-        queryset = self.get_queryset()
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        category = self.request.query_params.get('category')
         
         if category:
             queryset = queryset.filter(category=category)
         
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        return queryset
 
 
-class BlogPostViewSet(viewsets.ReadOnlyModelViewSet):
+class BlogPostViewSet(CachedResponseMixin, ConditionalGetMixin,
+                      OptionalKeysetPaginationMixin, viewsets.ReadOnlyModelViewSet):
     """
     API для блога
+    list поддерживает ?pagination=cursor
     """
     queryset = BlogPost.objects.filter(is_published=True).order_by('-published_at')
     lookup_field = 'slug'
+    cache_models = [BlogPost]
     
     def get_serializer_class(self):
         if self.action == 'retrieve':
             return BlogPostDetailSerializer
         return BlogPostListSerializer
+    
+    def get_list_validators(self, request):
+        stats = BlogPost.objects.aggregate(modified=Max('updated_at'), count=Count('pk'))
+        return [stats['modified'], stats['count']], stats['modified']
+    
+    def get_detail_validators(self, request):
+        row = self.get_queryset().filter(
+            slug=self.kwargs[self.lookup_field]
+        ).values_list('pk', 'updated_at').first()
+        if row is None:
+            return None
+        return list(row), row[1]
 
 
 class LeadViewSet(viewsets.GenericViewSet):
@@ -132,17 +400,38 @@ class LeadViewSet(viewsets.GenericViewSet):
     def create(self, request):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        if settings.INGEST_QUEUE:
+            ingest.enqueue('lead', serializer.validated_data)
+            code = status.HTTP_202_ACCEPTED
+        else:
+            serializer.save()
+            code = status.HTTP_201_CREATED
         
         return Response({
             'success': True,
             'message': 'Спасибо! Мы свяжемся с вами в ближайшее время.'
-        }, status=status.HTTP_201_CREATED)
+        }, status=code)
 
 
-class TourOperatorViewSet(viewsets.ReadOnlyModelViewSet):
+class TourOperatorViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
     """
     API для туроператоров
     """
     queryset = TourOperator.objects.filter(is_active=True)
     serializer_class = TourOperatorSerializer
+    cache_models = [TourOperator]
+
+
+class RegionViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    API для регионов: справочник для фильтра каталога (?region=id или slug)
+    с числом активных туров
+    """
+    # Основной и дополнительные регионы не пересекаются (см. TourRegion)
+    queryset = Region.objects.annotate(
+        tours_count=Count('tours', filter=Q(tours__is_active=True), distinct=True)
+        + Count('extra_tours', filter=Q(extra_tours__tour__is_active=True), distinct=True)
+    )
+    serializer_class = RegionSerializer
+    pagination_class = None
+    cache_models = [Region, RegionAlias, Tour, TourRegion]